@@ -0,0 +1,112 @@
+"""
+Backends das agregações sobre as linhas brutas e o cubo.
+
+As rotas pedem somas e contagens de distintos por valor de uma coluna. A
+execução fica com o backend configurado:
+- `pandas` (padrão): groupby do pandas, no thread da requisição;
+- `duckdb`: as somas sobre as partições Parquet (SINESP_ARMAZENAMENTO=particionado,
+  ver particoes.py) são feitas pelo DuckDB, multi-thread, consumindo o scanner
+  do pyarrow em lotes: as linhas filtradas não viram um frame em memória.
+
+As tabelas do cubo já estão em memória e são pequenas; nelas os dois backends
+usam o groupby do pandas (registrá-las no DuckDB a cada consulta custa mais
+do que agregá-las). Os dois devolvem a mesma estrutura, então o formato das
+respostas não depende do backend. Sem o pacote `duckdb` instalado, o pandas
+é usado.
+
+Configuração por ambiente:
+    SINESP_BACKEND_AGREGACAO   pandas (padrão) ou duckdb
+    SINESP_DUCKDB_THREADS      threads do DuckDB (padrão: núcleos disponíveis)
+"""
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+BACKEND_AGREGACAO = os.environ.get("SINESP_BACKEND_AGREGACAO", "pandas").strip().lower()
+DUCKDB_THREADS = int(os.environ.get("SINESP_DUCKDB_THREADS", "0"))
+
+
+def _identificador(nome):
+    return '"' + str(nome).replace('"', '""') + '"'
+
+
+class BackendPandas:
+    """Agregações com o groupby do pandas"""
+
+    nome = "pandas"
+
+    def somar(self, tabela, coluna, medidas):
+        """Soma das medidas por valor (não nulo) da coluna"""
+        return tabela.groupby(coluna, observed=True)[list(medidas)].sum()
+
+    def distintos(self, tabela, coluna, colunas):
+        """Número de valores distintos (não nulos) das colunas por valor da coluna"""
+        return tabela.groupby(coluna, observed=True)[list(colunas)].nunique()
+
+    def somar_particoes(self, dataset, expressao, coluna, medida):
+        """Soma da medida por valor (não nulo) da coluna nas linhas do dataset que atendem à expressão"""
+        df = dataset.to_table(columns=[coluna, medida], filter=expressao).to_pandas()
+        return df[medida].groupby(df[coluna].to_numpy()).sum()
+
+
+class BackendDuckDB(BackendPandas):
+    """Somas das partições em SQL no DuckDB embutido (uma conexão, um cursor por consulta)"""
+
+    nome = "duckdb"
+
+    def __init__(self, threads=DUCKDB_THREADS):
+        self._conexao = duckdb.connect(":memory:")
+        if threads > 0:
+            self._conexao.execute(f"SET threads = {int(threads)}")
+
+    def somar_particoes(self, dataset, expressao, coluna, medida):
+        """Soma da medida por valor (não nulo) da coluna nas linhas do dataset que atendem à expressão"""
+        import pandas as pd
+
+        # Lotes lidos sob demanda: a poda de partições e a projeção ficam com o pyarrow
+        lotes = dataset.scanner(columns=[coluna, medida], filter=expressao).to_reader()
+        chave, valor = _identificador(coluna), _identificador(medida)
+        # Cursores são conexões independentes sobre o mesmo banco: seguros entre threads
+        cursor = self._conexao.cursor()
+        try:
+            cursor.register("linhas", lotes)
+            resultado = cursor.execute(
+                f"SELECT {chave} AS chave, COALESCE(SUM({valor}), 0) AS soma FROM linhas "
+                f"WHERE {chave} IS NOT NULL GROUP BY {chave} ORDER BY {chave}"
+            ).df()
+        finally:
+            cursor.close()
+        tipo = lotes.schema.field(medida).type.to_pandas_dtype()
+        return pd.Series(resultado["soma"].to_numpy(dtype=tipo), index=resultado["chave"].to_numpy(), name=medida)
+
+
+_backend = None
+_lock = threading.Lock()
+
+
+def backend_configurado():
+    """Backend escolhido por SINESP_BACKEND_AGREGACAO (compartilhado pelos handlers do processo)"""
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                _backend = _criar(BACKEND_AGREGACAO)
+                logger.info(f"Backend de agregação: {_backend.nome}")
+    return _backend
+
+
+def _criar(nome):
+    if nome == "duckdb":
+        if duckdb is not None:
+            return BackendDuckDB()
+        logger.warning("SINESP_BACKEND_AGREGACAO=duckdb, mas o pacote duckdb não está instalado; usando pandas")
+    elif nome != "pandas":
+        logger.warning(f"Backend de agregação desconhecido '{nome}'; usando pandas")
+    return BackendPandas()
@@ -18,7 +18,12 @@ from routes.downloads import router as downloads_router
 from routes.informacoes import router as informacoes_router
 from routes.metodologia import router as metodologia_router
 from routes.info_details import router as info_details_router
-from utils import logger, handler, get_handler, check_handler, safe_get_unique_values, safe_numeric_operation
+from routes.debug import router as debug_router
+from metricas import MiddlewareMetricas
+from cache_http import MiddlewareETag
+from compressao import MiddlewareCompressao
+from respostas import RespostaJSON
+from utils import logger, handler, get_handler, check_handler, iniciar_recarga, safe_get_unique_values, safe_numeric_operation
 
 # Comando para iniciar api: python -m uvicorn api:app --reload --host 0.0.0.0 --port 8000
 
@@ -55,7 +60,7 @@ app = FastAPI(
     
     ## 🔍 Endpoints Principais
     - **Metadados**: `/api/info`, `/status`, `/info`
-    - **Dimensões**: `/ufs`, `/municipios`, `/eventos`, `/agentes`, `/armas`, `/faixas-etarias`
+    - **Dimensões**: `/ufs`, `/municipios`, `/municipios/sugestoes`, `/eventos`, `/agentes`, `/armas`, `/faixas-etarias`
     - **Consultas**: `/ocorrencias`
     - **Resumos**: `/resumo/vitimas`, `/resumo/faixa-etaria`, `/resumo/armas`, `/resumo/agentes`
     - **Séries**: `/series/ocorrencias`
@@ -65,9 +70,18 @@ app = FastAPI(
     """,
     docs_url="/",  # Página principal será a documentação
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    # orjson, com numpy/pandas nativos; os routers usam RotaJSON (sem jsonable_encoder)
+    default_response_class=RespostaJSON
 )
 
+# ETag por versão dos dados + If-None-Match -> 304 antes de a rota rodar
+# (adicionado antes do CORS para que o 304 também receba os cabeçalhos CORS)
+app.add_middleware(MiddlewareETag)
+
+# gzip/br/zstd negociado; respostas com ETag ficam guardadas já comprimidas
+app.add_middleware(MiddlewareCompressao)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -77,6 +91,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Métricas por rota (GET /metrics); adicionado por último para medir a pilha inteira
+app.add_middleware(MiddlewareMetricas)
+
+
+@app.on_event("startup")
+def iniciar_monitor_dados():
+    # Recarga a quente quando um arquivo de 'dados' muda (SINESP_RECARGA_INTERVALO=0 desativa)
+    iniciar_recarga()
+
 app.include_router(home_router)
 app.include_router(info_router)
 app.include_router(status_router)
@@ -95,4 +118,5 @@ app.include_router(series_router)
 app.include_router(downloads_router)
 app.include_router(informacoes_router)
 app.include_router(metodologia_router)
-app.include_router(info_details_router)
\ No newline at end of file
+app.include_router(info_details_router)
+app.include_router(debug_router)
\ No newline at end of file
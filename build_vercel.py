@@ -0,0 +1,39 @@
+"""
+Gera o artefato compacto usado pela Vercel no cold start.
+
+A pasta 'artefato/' é versionada no git: o deploy a partir do repositório usa
+o artefato commitado (o builder @vercel/python não executa comandos de build).
+Sempre que 'dados/' ou o processamento mudarem, regenere e commite, na raiz
+do projeto:
+
+    python build_vercel.py
+
+Para conferir se o artefato commitado corresponde a 'dados/' (sai com erro se
+estiver ausente ou desatualizado; é o que tests/test_build_vercel.py verifica):
+
+    python build_vercel.py --verificar
+
+Os arquivos em 'artefato/' (frame tipado e cubo agregado, Arrow IPC com zstd)
+vão no bundle da função; na Vercel o SinespDataHandler responde pelo cubo
+imediatamente e só lê o frame completo na primeira consulta que precisar dele.
+"""
+import sys
+
+from data_handler import SinespDataHandler, ARTIFACT_FOLDER, IS_VERCEL, verificar_artefato
+
+
+if __name__ == "__main__":
+    if "--verificar" in sys.argv[1:]:
+        problema = verificar_artefato()
+        if problema:
+            sys.exit(f"{problema}; execute python build_vercel.py e commite '{ARTIFACT_FOLDER}/'")
+        print(f"Artefato em '{ARTIFACT_FOLDER}' atualizado")
+        sys.exit(0)
+
+    if IS_VERCEL:
+        sys.exit("Gere o artefato fora da Vercel (ambiente de build ou local)")
+
+    handler = SinespDataHandler()
+    if handler.df.empty:
+        sys.exit(f"Nenhum dado carregado; artefato não gerado em '{ARTIFACT_FOLDER}'")
+    handler.save_artifact()
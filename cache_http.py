@@ -0,0 +1,149 @@
+"""
+ETag e requisições condicionais (If-None-Match -> 304) para as rotas de leitura.
+
+A ETag é forte e deriva da versão dos dados, da versão do código da API,
+do caminho e dos parâmetros da query (ordenados). Como todas as respostas
+de leitura são função só desses valores, o 304 é respondido pelo middleware
+antes de a rota rodar: nenhuma consulta ao pandas, nenhum corpo enviado.
+
+Rotas com relógio ou estado do processo (/status*, /metrics, /debug) e a
+exportação JSON (traz a data da exportação) ficam de fora, assim como as
+requisições com token de perfil (cabeçalho X-Sinesp-Perfil ou ?perfil=).
+
+Configuração por ambiente:
+    SINESP_HTTP_MAX_AGE  segundos de Cache-Control max-age (padrão 300)
+"""
+import glob
+import hashlib
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+HTTP_MAX_AGE = int(os.environ.get("SINESP_HTTP_MAX_AGE", "300"))
+CACHE_CONTROL = f"public, max-age={HTTP_MAX_AGE}"
+
+ROTAS_SEM_ETAG = ("/status", "/metrics", "/debug", "/download/json")
+CABECALHO_PERFIL = b"x-sinesp-perfil"
+PARAMETRO_PERFIL = "perfil"
+CODIFICACOES = ("gzip", "br", "zstd")
+
+
+def _versao_codigo():
+    """Hash dos módulos da API: um deploy que muda respostas muda também as ETags"""
+    pasta = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.md5()
+    for caminho in sorted(glob.glob(os.path.join(pasta, "*.py")) + glob.glob(os.path.join(pasta, "routes", "*.py"))):
+        try:
+            with open(caminho, "rb") as f:
+                digest.update(f.read())
+        except OSError:
+            continue
+    return digest.hexdigest()[:12]
+
+
+VERSAO_CODIGO = _versao_codigo()
+
+
+def _query_normalizada(query_string):
+    from urllib.parse import parse_qsl, urlencode
+
+    pares = parse_qsl(query_string.decode("latin-1"), keep_blank_values=True)
+    return urlencode(sorted(pares))
+
+
+def _pede_perfil(scope):
+    """Token de perfil no cabeçalho ou na query (ver perfis.py)"""
+    from urllib.parse import parse_qsl
+
+    if any(nome == CABECALHO_PERFIL for nome, _ in scope["headers"]):
+        return True
+    pares = parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+    return any(nome == PARAMETRO_PERFIL for nome, _ in pares)
+
+
+def calcular_etag(versao_dados, caminho, query_string=b""):
+    base = f"{versao_dados}|{VERSAO_CODIGO}|{caminho}|{_query_normalizada(query_string)}"
+    return '"' + hashlib.sha256(base.encode()).hexdigest()[:32] + '"'
+
+
+def etag_codificada(etag, codificacao):
+    """ETag da variante comprimida (uma ETag forte por Content-Encoding)"""
+    return f'{etag[:-1]}-{codificacao}"'
+
+
+def etags_enviadas(valor):
+    """Tags de If-None-Match, sem o sufixo da codificação (comparação fraca: W/ é ignorado)"""
+    tags = set()
+    for parte in valor.split(","):
+        parte = parte.strip()
+        if parte.startswith("W/"):
+            parte = parte[2:]
+        for codificacao in CODIFICACOES:
+            sufixo = f'-{codificacao}"'
+            if parte.endswith(sufixo):
+                parte = parte[: -len(sufixo)] + '"'
+                break
+        if parte:
+            tags.add(parte)
+    return tags
+
+
+def versao_dados_atual():
+    import utils
+    try:
+        return utils.check_handler().versao_dados
+    except Exception:
+        return None
+
+
+def etag_da_requisicao(scope):
+    """ETag da resposta de uma requisição de leitura, ou None se a rota não usa ETag"""
+    if (
+        scope["type"] != "http"
+        or scope["method"] not in ("GET", "HEAD")
+        or scope["path"].startswith(ROTAS_SEM_ETAG)
+        # Requisição perfilada precisa executar a rota (e a resposta não pode ir para caches)
+        or _pede_perfil(scope)
+    ):
+        return None
+    versao = versao_dados_atual()
+    if versao is None:
+        return None
+    return calcular_etag(versao, scope["path"], scope.get("query_string", b""))
+
+
+class MiddlewareETag:
+    """Middleware ASGI: 304 para If-None-Match atual; ETag e Cache-Control nas respostas 200"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        etag = etag_da_requisicao(scope)
+        if etag is None:
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = dict(scope["headers"]).get(b"if-none-match", b"").decode("latin-1")
+        if if_none_match and (if_none_match.strip() == "*" or etag in etags_enviadas(if_none_match)):
+            await send({
+                "type": "http.response.start",
+                "status": 304,
+                "headers": [(b"etag", etag.encode()), (b"cache-control", CACHE_CONTROL.encode())],
+            })
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start" and mensagem["status"] == 200:
+                headers = list(mensagem.get("headers", []))
+                nomes = {nome.lower() for nome, _ in headers}
+                if b"etag" not in nomes:
+                    headers.append((b"etag", etag.encode()))
+                if b"cache-control" not in nomes:
+                    headers.append((b"cache-control", CACHE_CONTROL.encode()))
+                mensagem = {**mensagem, "headers": headers}
+            await send(mensagem)
+
+        await self.app(scope, receive, enviar)
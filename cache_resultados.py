@@ -0,0 +1,134 @@
+"""
+Cache de resultados de consultas (LRU com orçamento de memória e TTL).
+
+As chaves incluem a versão dos dados: quando a base muda, as entradas da
+versão anterior são descartadas na primeira consulta da nova versão.
+O tamanho de cada entrada é estimado pelo JSON serializado do resultado
+(com o mesmo serializador orjson das respostas, ver respostas.py).
+
+Configuração por ambiente:
+    SINESP_CACHE_MB   orçamento de memória (padrão 64; 0 desativa o cache)
+    SINESP_CACHE_TTL  validade das entradas em segundos (padrão 3600; 0 = sem expiração)
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from respostas import dumps
+
+logger = logging.getLogger(__name__)
+
+CACHE_MAX_MB = float(os.environ.get("SINESP_CACHE_MB", "64"))
+CACHE_TTL = float(os.environ.get("SINESP_CACHE_TTL", "3600"))
+
+
+def estimar_bytes(valor):
+    """Tamanho aproximado do resultado (JSON compacto)"""
+    try:
+        return len(dumps(valor))
+    except (TypeError, ValueError):
+        return 0
+
+
+class CacheResultados:
+    """LRU thread-safe por (versão dos dados, nome, parâmetros) com contadores"""
+
+    def __init__(self, max_mb=CACHE_MAX_MB, ttl=CACHE_TTL):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl = ttl
+        self._entradas = OrderedDict()  # chave -> (valor, bytes, expira_em)
+        self._bytes = 0
+        self._versao = None
+        self._lock = threading.Lock()
+        self.contadores = {"hits": 0, "misses": 0, "evictions": 0, "expiradas": 0, "invalidadas": 0}
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def _remover(self, chave):
+        _, tamanho, _ = self._entradas.pop(chave)
+        self._bytes -= tamanho
+
+    def _trocar_versao(self, versao):
+        """Descarta as entradas de outras versões dos dados (chamado com o lock)"""
+        if versao == self._versao:
+            return
+        if self._versao is not None and self._entradas:
+            self.contadores["invalidadas"] += len(self._entradas)
+            logger.info(f"Cache de resultados: versão dos dados mudou, {len(self._entradas)} entradas descartadas")
+            self._entradas.clear()
+            self._bytes = 0
+        self._versao = versao
+
+    def trocar_versao(self, versao):
+        """Descarta de imediato as entradas de versões anteriores (ex.: após recarga dos dados)"""
+        with self._lock:
+            self._trocar_versao(versao)
+
+    def obter(self, versao, chave):
+        """Retorna (encontrado, valor)"""
+        with self._lock:
+            self._trocar_versao(versao)
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                self.contadores["misses"] += 1
+                return False, None
+            valor, _, expira_em = entrada
+            if expira_em is not None and expira_em < time.monotonic():
+                self._remover(chave)
+                self.contadores["expiradas"] += 1
+                self.contadores["misses"] += 1
+                return False, None
+            self._entradas.move_to_end(chave)
+            self.contadores["hits"] += 1
+            return True, valor
+
+    def guardar(self, versao, chave, valor, tamanho=None):
+        """Guarda o valor; `tamanho` (bytes) substitui a estimativa pelo JSON"""
+        tamanho = estimar_bytes(valor) if tamanho is None else tamanho
+        if tamanho == 0 or self.max_bytes <= 0 or tamanho > self.max_bytes:
+            return
+        expira_em = time.monotonic() + self.ttl if self.ttl > 0 else None
+        with self._lock:
+            self._trocar_versao(versao)
+            if chave in self._entradas:
+                self._remover(chave)
+            self._entradas[chave] = (valor, tamanho, expira_em)
+            self._bytes += tamanho
+            while self._bytes > self.max_bytes:
+                chave_antiga = next(iter(self._entradas))
+                self._remover(chave_antiga)
+                self.contadores["evictions"] += 1
+
+    def obter_ou_calcular(self, versao, chave, calcular):
+        """Valor em cache ou calculado (e guardado); resultados None não são guardados"""
+        encontrado, valor = self.obter(versao, chave)
+        if encontrado:
+            return valor
+        valor = calcular()
+        if valor is not None:
+            self.guardar(versao, chave, valor)
+        return valor
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.contadores["hits"] + self.contadores["misses"]
+            return {
+                **self.contadores,
+                "taxa_acerto": round(self.contadores["hits"] / consultas, 4) if consultas else 0,
+                "entradas": len(self._entradas),
+                "memoria_mb": round(self._bytes / 1024 / 1024, 2),
+                "limite_mb": round(self.max_bytes / 1024 / 1024, 2),
+                "ttl_s": self.ttl,
+            }
+
+
+# Instância compartilhada pelo handler e pelas rotas
+cache_resultados = CacheResultados()
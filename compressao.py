@@ -0,0 +1,227 @@
+"""
+Compressão negociada das respostas (Accept-Encoding: zstd, br, gzip).
+
+O gzip vem da biblioteca padrão; br e zstd são usados quando os pacotes
+`brotli` e `zstandard` estão instalados. Respostas menores que o limite
+seguem sem compressão; respostas em streaming (exportações) são comprimidas
+bloco a bloco.
+
+Respostas com ETag (ver cache_http.py) dependem só da versão dos dados, do
+código e da URL: são comprimidas uma vez, com nível mais alto, e guardadas já
+comprimidas por (ETag, codificação). As próximas requisições iguais recebem
+os bytes prontos, sem executar a rota nem comprimir de novo — é o caso das
+listas de dimensões (/municipios, /ufs...) e dos textos fixos de
+/metodologia e /classificacoes.
+
+Configuração por ambiente:
+    SINESP_COMPRESSAO_MIN_BYTES  tamanho mínimo para comprimir (padrão 1024)
+    SINESP_COMPRESSAO_CACHE_MB   memória das respostas pré-comprimidas (padrão 32; 0 desativa)
+"""
+import logging
+import os
+import zlib
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+
+from cache_http import etag_codificada, etag_da_requisicao, versao_dados_atual
+from cache_resultados import CacheResultados
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSAO_MIN_BYTES = int(os.environ.get("SINESP_COMPRESSAO_MIN_BYTES", "1024"))
+COMPRESSAO_CACHE_MB = float(os.environ.get("SINESP_COMPRESSAO_CACHE_MB", "32"))
+
+# Corpos maiores que isso são comprimidos fora do event loop
+COMPRESSAO_EM_THREAD_BYTES = 64 * 1024
+
+TIPOS_COMPRIMIVEIS = ("application/json", "application/x-ndjson", "application/javascript", "text/")
+
+# Níveis por codificação: (respostas dinâmicas, respostas guardadas pré-comprimidas)
+NIVEIS = {"zstd": (3, 12), "br": (4, 9), "gzip": (6, 9)}
+
+
+def codificacoes_disponiveis():
+    """Codificações suportadas, na ordem de preferência do servidor"""
+    disponiveis = []
+    if zstandard is not None:
+        disponiveis.append("zstd")
+    if brotli is not None:
+        disponiveis.append("br")
+    disponiveis.append("gzip")
+    return disponiveis
+
+
+CODIFICACOES_DISPONIVEIS = codificacoes_disponiveis()
+
+# Respostas pré-comprimidas por (ETag, codificação); TTL 0: valem enquanto a versão dos dados for a mesma
+cache_compressao = CacheResultados(max_mb=COMPRESSAO_CACHE_MB, ttl=0)
+
+
+def negociar(accept_encoding):
+    """Melhor codificação aceita pelo cliente (q > 0), ou None"""
+    aceitas = {}
+    for parte in accept_encoding.split(","):
+        nome, _, parametros = parte.strip().partition(";")
+        nome = nome.strip().lower()
+        if not nome:
+            continue
+        q = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                q = float(parametros[2:])
+            except ValueError:
+                q = 0.0
+        aceitas[nome] = q
+
+    melhor, melhor_q = None, 0.0
+    for codificacao in CODIFICACOES_DISPONIVEIS:
+        q = aceitas.get(codificacao, aceitas.get("*", 0.0))
+        if q > melhor_q:
+            melhor, melhor_q = codificacao, q
+    return melhor
+
+
+class Compressor:
+    """Compressão incremental com a mesma interface para as três codificações"""
+
+    def __init__(self, codificacao, guardada=False):
+        nivel = NIVEIS[codificacao][1 if guardada else 0]
+        if codificacao == "gzip":
+            # wbits=31: fluxo zlib com cabeçalho e rodapé gzip
+            objeto = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+            self.comprimir, self.finalizar = objeto.compress, objeto.flush
+        elif codificacao == "br":
+            objeto = brotli.Compressor(quality=nivel)
+            self.comprimir, self.finalizar = objeto.process, objeto.finish
+        else:
+            objeto = zstandard.ZstdCompressor(level=nivel).compressobj()
+            self.comprimir, self.finalizar = objeto.compress, objeto.flush
+
+
+def comprimir(dados, codificacao, guardada=False):
+    compressor = Compressor(codificacao, guardada)
+    return compressor.comprimir(dados) + compressor.finalizar()
+
+
+def _comprimivel(headers):
+    tipo = headers.get("content-type", "")
+    return "content-encoding" not in headers and tipo.startswith(TIPOS_COMPRIMIVEIS)
+
+
+class MiddlewareCompressao:
+    """Middleware ASGI de compressão com cache das respostas pré-comprimidas"""
+
+    def __init__(self, app, minimo=COMPRESSAO_MIN_BYTES, cache=cache_compressao):
+        self.app = app
+        self.minimo = minimo
+        self.cache = cache
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+
+        cabecalhos = dict(scope["headers"])
+        codificacao = negociar(cabecalhos.get(b"accept-encoding", b"").decode("latin-1"))
+        etag = etag_da_requisicao(scope) if codificacao else None
+        versao = versao_dados_atual() if etag else None
+
+        # Condicional fica com o middleware de ETag (304); sem ela, a resposta pronta é enviada
+        if etag and b"if-none-match" not in cabecalhos:
+            encontrado, pronta = self.cache.obter(versao, (etag, codificacao))
+            if encontrado:
+                headers, corpo = pronta
+                await send({"type": "http.response.start", "status": 200, "headers": headers})
+                await send({"type": "http.response.body", "body": corpo})
+                return
+
+        inicio = None
+        compressor = None
+
+        async def enviar(mensagem):
+            nonlocal inicio, compressor
+            if mensagem["type"] == "http.response.start":
+                inicio = mensagem
+                headers = MutableHeaders(raw=list(mensagem.get("headers", [])))
+                if mensagem["status"] == 304 and etag is not None:
+                    # 304 do middleware de ETag: a tag é a da variante que o cliente guardou
+                    headers.add_vary_header("Accept-Encoding")
+                    headers["etag"] = etag_codificada(headers["etag"], codificacao)
+                    await send({**mensagem, "headers": headers.raw})
+                    inicio = None
+                    return
+                if not _comprimivel(headers):
+                    await send(mensagem)
+                    inicio = None
+                    return
+                headers.add_vary_header("Accept-Encoding")
+                if codificacao is None or mensagem["status"] in (204, 304):
+                    await send({**mensagem, "headers": headers.raw})
+                    inicio = None
+                return
+
+            if mensagem["type"] != "http.response.body" or inicio is None:
+                await send(mensagem)
+                return
+
+            corpo = mensagem.get("body", b"")
+            mais = mensagem.get("more_body", False)
+            headers = MutableHeaders(raw=list(inicio.get("headers", [])))
+            headers.add_vary_header("Accept-Encoding")
+
+            if compressor is None and not mais:
+                # Corpo completo numa mensagem: limite de tamanho e cache das respostas com ETag
+                if len(corpo) < self.minimo:
+                    await send({**inicio, "headers": headers.raw})
+                    await send(mensagem)
+                    return
+                guardar = etag is not None and inicio["status"] == 200 and headers.get("etag") == etag
+                if len(corpo) > COMPRESSAO_EM_THREAD_BYTES:
+                    comprimido = await run_in_threadpool(comprimir, corpo, codificacao, guardar)
+                else:
+                    comprimido = comprimir(corpo, codificacao, guardar)
+                headers["content-encoding"] = codificacao
+                headers["content-length"] = str(len(comprimido))
+                if "etag" in headers:
+                    headers["etag"] = etag_codificada(headers["etag"], codificacao)
+                if guardar:
+                    self.cache.guardar(versao, (etag, codificacao), (headers.raw, comprimido), len(comprimido))
+                await send({**inicio, "headers": headers.raw})
+                await send({"type": "http.response.body", "body": comprimido})
+                return
+
+            if compressor is None:
+                # Streaming: tamanho final desconhecido, comprime bloco a bloco
+                compressor = Compressor(codificacao)
+                del headers["content-length"]
+                headers["content-encoding"] = codificacao
+                if "etag" in headers:
+                    headers["etag"] = etag_codificada(headers["etag"], codificacao)
+                await send({**inicio, "headers": headers.raw})
+            saida = compressor.comprimir(corpo) if corpo else b""
+            if not mais:
+                saida += compressor.finalizar()
+            if saida or not mais:
+                await send({"type": "http.response.body", "body": saida, "more_body": mais})
+
+        await self.app(scope, receive, enviar)
+
+
+def estatisticas():
+    return {
+        "codificacoes": CODIFICACOES_DISPONIVEIS,
+        "minimo_bytes": COMPRESSAO_MIN_BYTES,
+        **cache_compressao.estatisticas(),
+    }
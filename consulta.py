@@ -0,0 +1,188 @@
+"""
+Motor de consultas compartilhado pelas rotas.
+
+Os filtros de uma requisição viram um `FiltroConsulta` declarativo, com a
+mesma semântica em todas as rotas: `uf` e `ano` exigem igualdade; município,
+evento, agente e arma aceitam trecho do nome. Em todos, sem distinção de
+acento ou caixa.
+
+O filtro é avaliado sobre índices invertidos, nunca sobre cópias do frame:
+- linhas brutas: o índice do SinespDataHandler devolve posições ordenadas
+  (a rota materializa só as linhas que vai entregar);
+- tabelas do cubo: cada tabela ganha o seu índice, montado na primeira
+  consulta, e o resultado é só o subconjunto de células que atende.
+
+Os predicados são avaliados do mais seletivo (menos linhas estimadas pelas
+contagens do índice) para o menos: os seguintes só verificam as posições que
+restaram. Assim a memória alocada por requisição acompanha o tamanho do
+resultado, não o da base.
+
+As somas e contagens são executadas pelo backend de agregação do handler
+(agregacao.py: pandas, ou DuckDB nas somas sobre as partições).
+
+No armazenamento particionado (particoes.py) as linhas brutas ficam em disco:
+as posições vêm do filtro empurrado às partições e `linhas` lê só as partes
+que contêm os ids pedidos.
+"""
+import threading
+
+from indice import IndiceInvertido
+from metricas import fase
+
+# Colunas filtráveis e se exigem igualdade (True) ou aceitam trecho do valor (False)
+SEMANTICA_FILTROS = {
+    "uf": True,
+    "municipio": False,
+    "evento": False,
+    "agente": False,
+    "arma": False,
+    "ano": True,
+}
+
+
+class FiltroConsulta:
+    """Filtros de uma consulta; valores None ou vazios são ignorados"""
+
+    def __init__(self, uf=None, municipio=None, evento=None, agente=None, arma=None, ano=None):
+        informados = {
+            "uf": uf, "municipio": municipio, "evento": evento,
+            "agente": agente, "arma": arma, "ano": ano,
+        }
+        self.valores = {col: valor for col, valor in informados.items() if valor is not None and valor != ""}
+
+    def __bool__(self):
+        return bool(self.valores)
+
+    def __repr__(self):
+        return f"FiltroConsulta({self.valores})"
+
+    @property
+    def colunas(self):
+        return set(self.valores)
+
+    @property
+    def exatos(self):
+        """Colunas comparadas por igualdade"""
+        return [col for col in self.valores if SEMANTICA_FILTROS[col]]
+
+    def termos(self):
+        """{coluna: (termo, exato)} no formato de IndiceInvertido.filtrar"""
+        return {col: (valor, SEMANTICA_FILTROS[col]) for col, valor in self.valores.items()}
+
+
+class TabelaConsulta:
+    """Filtros sobre uma tabela já agregada (ex.: células do cubo), pelo seu próprio índice invertido"""
+
+    def __init__(self, df):
+        self.df = df
+        self._indice = None
+        self._lock = threading.Lock()
+
+    @property
+    def indice(self):
+        if self._indice is None:
+            with self._lock:
+                if self._indice is None:
+                    colunas = [col for col in SEMANTICA_FILTROS if col in self.df.columns]
+                    self._indice = IndiceInvertido(self.df, colunas=colunas)
+        return self._indice
+
+    def filtrar(self, filtro):
+        """Linhas da tabela que atendem ao filtro (a própria tabela quando não há filtro)"""
+        ausentes = filtro.colunas - set(self.df.columns)
+        if ausentes:
+            raise ValueError(f"Filtro por {', '.join(sorted(ausentes))} não disponível nesta tabela")
+        if not filtro:
+            return self.df
+        with fase("filtro"):
+            posicoes = self.indice.filtrar(filtro.termos())
+            return self.df.take(posicoes)
+
+
+def _completar(resultado, serie):
+    """Inclui, com 0, os valores do dicionário da coluna sem linhas no resultado (na ordem do dicionário)"""
+    import pandas as pd
+
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        return resultado
+    return resultado.reindex(serie.cat.categories, fill_value=0).rename_axis(serie.name)
+
+
+class MotorConsultas:
+    """Consultas das rotas sobre um SinespDataHandler: posições de linhas brutas ou células do cubo"""
+
+    def __init__(self, handler):
+        from data_handler import TIME_COLUMNS
+
+        self.handler = handler
+        # Colunas derivadas na carga (ano, mes): servem aos filtros e ao cubo, não saem nos registros
+        self.derivadas = list(TIME_COLUMNS)
+
+    def colunas_publicas(self):
+        """Colunas dos registros entregues pelas rotas (sem as derivadas)"""
+        return [col for col in self.handler.colunas if col not in self.derivadas]
+
+    def posicoes(self, filtro):
+        """Posições ordenadas das linhas brutas (None quando não há filtro: todas as linhas)"""
+        return self.handler.filtrar_posicoes(exato=filtro.exatos, **filtro.valores)
+
+    def linhas(self, posicoes):
+        """Linhas brutas nas posições (ids) informadas, do frame em memória ou das partições"""
+        if self.handler.particoes is not None:
+            linhas = self.handler.particoes.linhas(posicoes)
+        else:
+            linhas = self.handler.df.take(posicoes)
+        return linhas.drop(columns=self.derivadas, errors="ignore")
+
+    def assinatura(self, filtro):
+        """Identificador curto do filtro (após normalização), o mesmo do cache de posições"""
+        return self.handler.assinatura_filtros(exato=filtro.exatos, **filtro.valores)
+
+    def celulas(self, filtro):
+        """Células do cubo agregado que atendem ao filtro"""
+        return self.handler.cubo.filtrar(filtro)
+
+    def presenca(self, filtro):
+        """Combinações de municípios presentes (tabela do cubo) que atendem ao filtro"""
+        return self.handler.cubo.filtrar_municipios(filtro)
+
+    def cubo_atende(self, filtro, *colunas):
+        """O cubo tem as colunas do filtro e as pedidas (não precisa das linhas brutas)"""
+        return (filtro.colunas | set(colunas)) <= set(self.handler.cubo.celulas.columns)
+
+    def somar_por(self, filtro, coluna, medida="total_vitima", completo=False):
+        """
+        Soma da medida por valor da coluna (Series indexada pelos valores).
+        Usa o cubo quando ele cobre o filtro; senão, só as linhas nas posições filtradas.
+        `completo`: no cubo, inclui com soma 0 os valores do dicionário fora do filtro.
+        """
+        if self.cubo_atende(filtro, coluna, medida):
+            celulas = self.celulas(filtro)
+            with fase("agregacao"):
+                somas = self.handler.agregacao.somar(celulas, coluna, [medida])[medida]
+                return _completar(somas, celulas[coluna]) if completo else somas
+
+        if self.handler.particoes is not None:
+            with fase("agregacao"):
+                return self.handler.particoes.somar_por(filtro.termos(), coluna, medida, self.handler.agregacao)
+
+        posicoes = self.posicoes(filtro)
+        df = self.handler.df
+        with fase("agregacao"):
+            grupos, valores = df[coluna], df[medida]
+            if posicoes is not None:
+                grupos, valores = grupos.take(posicoes), valores.take(posicoes)
+            return valores.groupby(grupos.to_numpy()).sum()
+
+    def resumo_por(self, filtro, coluna, celulas=None):
+        """
+        Vítimas (cubo) e UFs e municípios distintos (tabela de presença) por valor da coluna,
+        com todos os valores do dicionário; `celulas` reaproveita o filtro já aplicado pela rota.
+        """
+        celulas = self.celulas(filtro) if celulas is None else celulas
+        presenca = self.presenca(filtro)
+        backend = self.handler.agregacao
+        with fase("agregacao"):
+            somas = _completar(backend.somar(celulas, coluna, ["total_vitima"]), celulas[coluna])
+            resumo = somas.join(backend.distintos(presenca, coluna, ["uf", "municipio"]))
+            return resumo.fillna(0).astype("int64").reset_index()
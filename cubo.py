@@ -0,0 +1,112 @@
+"""
+Cubo de agregados pré-calculado na carga dos dados.
+
+As rotas de resumo, estatística e ranking consultam somas e contagens que
+não mudam entre publicações da base. O cubo guarda essas somas por
+uf × ano × mês × evento × agente × arma × faixa etária (algumas centenas
+de milhares de células contra milhões de linhas brutas), além de uma
+tabela de presença de municípios para as contagens de municípios distintos.
+Os filtros usam o motor de consultas (consulta.py), com a mesma semântica
+das linhas brutas.
+"""
+import logging
+
+from consulta import FiltroConsulta, TabelaConsulta
+from metricas import fase
+
+logger = logging.getLogger(__name__)
+
+DIMENSOES_CUBO = ["uf", "ano", "mes", "evento", "agente", "arma", "faixa_etaria"]
+MEDIDAS_CUBO = ["feminino", "masculino", "nao_informado", "total_vitima", "total_peso"]
+DIMENSOES_MUNICIPIOS = ["uf", "ano", "agente", "arma", "municipio"]
+
+
+class CuboAgregado:
+    """Somas das medidas de vítimas por combinação de dimensões"""
+
+    def __init__(self, df):
+        from datetime import datetime
+
+        inicio = datetime.now()
+        dimensoes = [col for col in DIMENSOES_CUBO if col in df.columns]
+        medidas = [col for col in MEDIDAS_CUBO if col in df.columns]
+
+        agrupado = df.groupby(dimensoes, observed=True, dropna=False)
+        celulas = agrupado[medidas].sum()
+        celulas["registros"] = agrupado.size()
+        self.celulas = celulas.reset_index()
+
+        dimensoes_municipios = [col for col in DIMENSOES_MUNICIPIOS if col in df.columns]
+        self.municipios = (
+            df.groupby(dimensoes_municipios, observed=True, dropna=False)
+            .size()
+            .reset_index(name="registros")
+        )
+
+        duracao = (datetime.now() - inicio).total_seconds()
+        logger.info(
+            f"Cubo agregado construído: {len(self.celulas):,} células, "
+            f"{len(self.municipios):,} combinações de municípios em {duracao:.2f}s"
+        )
+
+    @classmethod
+    def de_tabelas(cls, celulas, municipios):
+        """Reconstrói o cubo a partir das tabelas já agregadas (ex.: lidas do snapshot)"""
+        cubo = cls.__new__(cls)
+        cubo.celulas = celulas
+        cubo.municipios = municipios
+        return cubo
+
+    @classmethod
+    def combinar(cls, parciais):
+        """
+        Soma cubos parciais (ex.: um por arquivo de origem) num só, igual ao cubo do frame
+        concatenado: dicionários unidos e ordenados, células iguais somadas.
+        """
+        import pandas as pd
+        from pandas.api.types import union_categoricals
+
+        def juntar(tabelas, medidas):
+            colunas = {}
+            for col in tabelas[0].columns:
+                partes = [t[col] for t in tabelas]
+                if all(isinstance(p.dtype, pd.CategoricalDtype) for p in partes):
+                    colunas[col] = union_categoricals(partes, sort_categories=True)
+                else:
+                    colunas[col] = pd.concat(partes, ignore_index=True)
+            tabela = pd.DataFrame(colunas, copy=False)
+            dimensoes = [col for col in tabela.columns if col not in medidas]
+            return tabela.groupby(dimensoes, observed=True, dropna=False)[medidas].sum().reset_index()
+
+        medidas = [col for col in MEDIDAS_CUBO if col in parciais[0].celulas.columns] + ["registros"]
+        return cls.de_tabelas(
+            juntar([p.celulas for p in parciais], medidas),
+            juntar([p.municipios for p in parciais], ["registros"]),
+        )
+
+    def _consulta(self, nome):
+        """Índice de filtros da tabela, montado na primeira consulta"""
+        consultas = self.__dict__.setdefault("_consultas", {})
+        if nome not in consultas:
+            consultas[nome] = TabelaConsulta(getattr(self, nome))
+        return consultas[nome]
+
+    def filtrar(self, filtro=None, **filtros):
+        """Células do cubo que atendem ao filtro (FiltroConsulta ou uf/ano/evento/agente/arma)"""
+        return self._consulta("celulas").filtrar(filtro if filtro is not None else FiltroConsulta(**filtros))
+
+    def filtrar_municipios(self, filtro=None, **filtros):
+        """Combinações de municípios presentes que atendem ao filtro"""
+        return self._consulta("municipios").filtrar(filtro if filtro is not None else FiltroConsulta(**filtros))
+
+    @staticmethod
+    def totais(celulas):
+        """Somas das medidas e número de registros brutos representados"""
+        with fase("agregacao"):
+            resultado = {col: float(celulas[col].sum()) for col in MEDIDAS_CUBO if col in celulas.columns}
+            resultado["registros"] = int(celulas["registros"].sum())
+        return resultado
+
+    def get_memory_usage(self):
+        total = self.celulas.memory_usage(deep=True).sum() + self.municipios.memory_usage(deep=True).sum()
+        return round(total / 1024 / 1024, 2)
@@ -1,5 +1,22 @@
 import os
+import json
+import time
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from indice import IndiceInvertido, IndiceNgramas, normalizar_texto
+from cubo import CuboAgregado
+from consulta import MotorConsultas
+from manifesto import ManifestoCache
+import particoes
+import agregacao
+import snapshot
+from serializacao import registros
+from cache_resultados import cache_resultados
+from metricas import fase
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -16,34 +33,425 @@ COLUMN_NAMES = [
     "abrangencia", "formulario"
 ]
 
+NUMERIC_COLUMNS = ["feminino", "masculino", "nao_informado", "total_vitima", "total", "total_peso"]
+CATEGORICAL_COLUMNS = [
+    "uf", "municipio", "evento", "data_referencia", "agente", "arma", "faixa_etaria",
+    "abrangencia", "formulario", "arquivo_origem"
+]
+
+# Colunas textuais limpas na carga (strip e nulos textuais)
+TEXT_COLUMNS = ["uf", "municipio", "evento", "agente", "arma", "faixa_etaria", "abrangencia", "formulario"]
+
+# Colunas derivadas de data_referencia na carga (filtros de tempo viram comparação de inteiros)
+TIME_COLUMNS = {"ano": "int16", "mes": "int8"}
+
+# Versões registradas no manifesto do cache: o schema deriva das listas acima; o código de
+# processamento deve ser incrementado quando _load_single_file/_optimize_dtypes mudarem
+CACHE_SCHEMA_VERSION = hashlib.md5(
+    repr((COLUMN_NAMES, NUMERIC_COLUMNS, CATEGORICAL_COLUMNS, sorted(TIME_COLUMNS.items()))).encode()
+).hexdigest()[:12]
+PROCESSING_VERSION = "4"
+
+# Processos da ingestão paralela (padrão: todos os núcleos; 1 usa threads no processo atual)
+INGEST_WORKERS = int(os.environ.get("SINESP_INGEST_WORKERS", "0")) or os.cpu_count() or 1
+
+# Snapshot consolidado do frame final (e estruturas derivadas), aberto com memory-map
+SNAPSHOT_FOLDER = "snapshot"  # subpasta de CACHE_FOLDER
+SNAPSHOT_TABLES = ["dados", "indice", "cubo", "municipios"]
+
+# Resultados de filtros mantidos em memória (paginação por cursor retoma sem refiltrar)
+POSITIONS_CACHE_ENTRIES = 16
+POSITIONS_CACHE_MAX_MB = 64
+
+# Artefato compacto gerado antes do deploy (python build_vercel.py) e enviado no bundle da Vercel
+ARTIFACT_FOLDER = "artefato"
+ARTIFACT_TABLES = ["dados", "cubo", "municipios"]
+
+# Relatório da última construção a partir das fontes (tempos por etapa), em CACHE_FOLDER
+LOAD_REPORT_FILE = "relatorio_carga.json"
+
 # Cache global para evitar recarregar dados em cada request
 _global_data_cache = None
 _cache_timestamp = None
 
 
+@contextmanager
+def _etapa(etapas, nome):
+    """Acumula em etapas[nome] o tempo (s) do bloco"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        etapas[nome] = etapas.get(nome, 0.0) + time.perf_counter() - inicio
+
+
+class _LeituraCronometrada:
+    """Fonte comprimida lida pelo parser; mede o tempo gasto descomprimindo e os bytes gerados"""
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+        self.segundos = 0.0
+        self.bytes = 0
+
+    def read(self, tamanho=-1):
+        inicio = time.perf_counter()
+        dados = self.arquivo.read(tamanho)
+        self.segundos += time.perf_counter() - inicio
+        self.bytes += len(dados)
+        return dados
+
+    def __iter__(self):
+        return iter(self.arquivo)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.arquivo.close()
+
+
+def _limpar_texto(serie):
+    """strip e nulos textuais aplicados ao dicionário da coluna categórica, não a cada linha"""
+    import pandas as pd
+    import numpy as np
+    valores = serie.cat.categories.astype(str).str.strip().to_numpy(dtype=object)
+    # Posição extra para o código -1: o valor ausente vira o texto "<NA>", como em astype(str)
+    valores = np.append(valores, "<NA>")
+    valores[np.isin(valores, ["nan", "None", "", "null"])] = None
+    recodificacao, categorias = pd.factorize(valores)
+    codigos = recodificacao[serie.cat.codes.to_numpy()]
+    limpa = pd.Categorical.from_codes(codigos, categories=categorias).remove_unused_categories()
+    return limpa.reorder_categories(sorted(limpa.categories))
+
+
+def processar_arquivo(file_path, medidas=None):
+    """
+    Lê um arquivo de origem e devolve o frame normalizado e tipado (None se não suportado).
+    Se `medidas` for um dict, recebe os tempos por etapa e as contagens de bytes.
+    """
+    import pandas as pd
+    import numpy as np
+
+    medidas = {} if medidas is None else medidas
+    etapas = medidas.setdefault("etapas", {})
+    medidas["bytes_fonte"] = os.path.getsize(file_path)
+
+    # Lido direto como categórico: limpeza e conversão numérica operam só nos valores distintos
+    if file_path.endswith((".csv.xz", ".csv.gz")):
+        import gzip
+        import lzma
+        abrir = lzma.open if file_path.endswith(".xz") else gzip.open
+        with _LeituraCronometrada(abrir(file_path)) as fonte, _etapa(etapas, "leitura"):
+            df = pd.read_csv(fonte, dtype="category")
+        # Parsing = leitura menos o tempo dentro da descompressão
+        etapas["descompressao"] = fonte.segundos
+        etapas["parsing"] = etapas.pop("leitura") - fonte.segundos
+        medidas["bytes_descomprimidos"] = fonte.bytes
+    elif file_path.endswith(".xlsx"):
+        with _etapa(etapas, "parsing"):
+            df = pd.read_excel(file_path, engine="openpyxl", dtype="string").astype("category")
+    else:
+        logger.error(f"Formato de arquivo não suportado: {file_path}")
+        return None
+
+    # Normalizar colunas
+    df.columns = [str(c).strip().lower().replace(" ", "_") for c in df.columns]
+    available_columns = [col for col in COLUMN_NAMES if col in df.columns]
+    df = df[available_columns].copy()
+
+    # Limpeza básica de strings
+    with _etapa(etapas, "limpeza_texto"):
+        for col in TEXT_COLUMNS:
+            if col in df.columns:
+                df[col] = _limpar_texto(df[col])
+
+    # Adicionar metadado (usado também como fallback do ano)
+    df["arquivo_origem"] = pd.Categorical.from_codes(
+        np.zeros(len(df), dtype=np.int8), categories=[os.path.basename(file_path)]
+    )
+
+    with _etapa(etapas, "tipos"):
+        return SinespDataHandler._optimize_dtypes(df)
+
+
+def processar_e_salvar(file_path, cache_path=None, como_arrow=False):
+    """
+    Processa o arquivo e grava o cache Parquet; retorna (dados, salvo, medidas).
+    `medidas` traz a duração total, os tempos por etapa e os bytes lidos.
+    Executado também nos processos da ingestão paralela: com `como_arrow` os dados voltam
+    como Arrow IPC (buffers colunares, dicionários preservados) em vez de um DataFrame em pickle.
+    """
+    inicio = time.perf_counter()
+    medidas = {"etapas": {}}
+    etapas = medidas["etapas"]
+    df = processar_arquivo(file_path, medidas)
+    salvo = False
+    if df is not None and cache_path:
+        try:
+            with _etapa(etapas, "parquet_gravacao"):
+                df.to_parquet(cache_path, compression="snappy", index=False)
+            salvo = True
+        except Exception as e:
+            logger.warning(f"Erro ao salvar cache parquet: {e}")
+    if df is not None and como_arrow:
+        with _etapa(etapas, "arrow_codificacao"):
+            df = para_arrow(df)
+    medidas["duracao_s"] = time.perf_counter() - inicio
+    return df, salvo, medidas
+
+
+def para_arrow(df):
+    import pyarrow as pa
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, tabela.schema) as writer:
+        writer.write_table(tabela)
+    return sink.getvalue().to_pybytes()
+
+
+def de_arrow(dados):
+    import pyarrow as pa
+    return pa.ipc.open_stream(pa.py_buffer(dados)).read_all().to_pandas()
+
+
+def concatenar_frames(dataframes):
+    """Concatena mantendo as colunas categóricas (união dos dicionários, sem passar por object)"""
+    import pandas as pd
+    import numpy as np
+    from pandas.api.types import union_categoricals
+
+    colunas = list(dataframes[0].columns)
+    if len(dataframes) == 1 or any(list(df.columns) != colunas for df in dataframes[1:]):
+        return pd.concat(dataframes, ignore_index=True, sort=False)
+
+    combinado = {}
+    for col in colunas:
+        partes = [df[col] for df in dataframes]
+        if all(isinstance(p.dtype, pd.CategoricalDtype) for p in partes):
+            combinado[col] = union_categoricals(partes, sort_categories=True)
+        else:
+            combinado[col] = pd.concat(partes, ignore_index=True)
+    return pd.DataFrame(combinado, copy=False)
+
+
+def assinatura_dados(files, manifesto):
+    """Versão do dataset: conteúdo das fontes, schema e código de processamento"""
+    partes = [f"{os.path.basename(f)}:{manifesto.hash_fonte(f)}" for f in sorted(files)]
+    partes.append(f"{CACHE_SCHEMA_VERSION}:{PROCESSING_VERSION}")
+    return hashlib.md5("|".join(partes).encode()).hexdigest()
+
+
+def listar_fontes(pasta=DATA_FOLDER):
+    """Arquivos de origem da pasta de dados, em ordem"""
+    import glob
+
+    files = []
+    for padrao in ("*.xlsx", "*.csv.xz", "*.csv.gz"):
+        files.extend(glob.glob(os.path.join(pasta, padrao)))
+    return sorted(files)
+
+
+def verificar_artefato(pasta=None):
+    """
+    Problema do artefato da Vercel em relação a 'dados' (None se está atualizado).
+    A versão gravada no artefato deve ser a assinatura atual das fontes, do schema e do processamento.
+    """
+    pasta = pasta or ARTIFACT_FOLDER
+    ausentes = [nome for nome in ARTIFACT_TABLES if not os.path.exists(os.path.join(pasta, f"{nome}.arrow"))]
+    if ausentes:
+        return f"artefato incompleto em '{pasta}': faltam {', '.join(ausentes)}"
+    metadados = snapshot.ler_metadados(os.path.join(pasta, "cubo.arrow"))
+    if not metadados:
+        return f"metadados do artefato ilegíveis em '{pasta}'"
+    files = listar_fontes()
+    if not files:
+        return f"nenhum arquivo de origem em '{DATA_FOLDER}'"
+    versao = assinatura_dados(files, ManifestoCache(CACHE_FOLDER, CACHE_SCHEMA_VERSION, PROCESSING_VERSION))
+    if metadados.get("versao_dados") != versao:
+        return f"artefato desatualizado: versão {metadados.get('versao_dados', '?')[:12]}, dados em {versao[:12]}"
+    return None
+
+
 class SinespDataHandler:
-    def __init__(self):
+    def __init__(self, recarga=False):
+        """`recarga`: construído em segundo plano com o servidor no ar (ingestão sem fork)"""
         import pandas as pd
         from datetime import datetime
         global _global_data_cache, _cache_timestamp
 
+        self._recarga = recarga
+        self._lock = threading.Lock()
+        self._posicoes_cache = OrderedDict()
+        self._df = None
+        self._indice = None
+        self._sugestoes = None
+        self._artifact_metadata = None
+        # Armazenamento particionado em disco (SINESP_ARMAZENAMENTO=particionado); None: frame em memória
+        self.particoes = None
+        # Filtros e agregações das rotas (índice invertido e cubo, sem copiar o frame)
+        self.consultas = MotorConsultas(self)
+        # Execução das somas/contagens sobre o cubo (SINESP_BACKEND_AGREGACAO: pandas ou duckdb)
+        self.agregacao = agregacao.backend_configurado()
+        self.manifesto = ManifestoCache(CACHE_FOLDER, CACHE_SCHEMA_VERSION, PROCESSING_VERSION)
+        # Tempos por etapa da construção deste handler (GET /status/carga)
+        self.carga = {"origem": None, "inicio": datetime.now().isoformat(timespec="seconds"), "etapas": {}}
+        inicio = time.perf_counter()
+        etapas = self.carga["etapas"]
+
         # Se está na Vercel e já tem cache global, usar ele
         if IS_VERCEL and _global_data_cache is not None:
-            self.df = _global_data_cache
-            self._cached_values = {}
+            self.df, self.indice, self.cubo, self.versao_dados, self.manifesto = _global_data_cache
+            self.carga["origem"] = "cache_global"
             logger.info("Usando cache global dos dados (Vercel)")
             return
 
         self._setup_cache_folder()
-        self.df = self._load_all_data()
-        self._cached_values = {}
+        files = self._list_data_files()
+        with _etapa(etapas, "assinatura"):
+            self.versao_dados = self._get_data_signature(files)
+
+        # Na Vercel, o artefato pré-construído responde pelo cubo; o frame completo é lazy
+        if IS_VERCEL:
+            with _etapa(etapas, "artefato"):
+                carregado = self._load_artifact(files)
+            if carregado:
+                self._finalizar_carga("artefato", inicio)
+                return
+
+        # Pouca memória: linhas brutas ficam nas partições em disco, só o cubo em memória
+        if particoes.particionado():
+            origem = self._load_particionado(files)
+            self._finalizar_carga(origem, inicio)
+            return
+
+        with _etapa(etapas, "snapshot_abertura"):
+            carregado = self._load_snapshot(files)
+        origem = "snapshot"
+        if not carregado:
+            # Vários workers (uvicorn --workers N) iniciando juntos: um constrói, os demais esperam e mapeiam
+            with self._snapshot_build_lock():
+                with _etapa(etapas, "snapshot_abertura"):
+                    carregado = self._load_snapshot(files)
+                if not carregado:
+                    origem = "construcao"
+                    self.df = self._load_all_data(files)
+                    with _etapa(etapas, "indice"):
+                        self.indice = IndiceInvertido(self.df)
+                    with _etapa(etapas, "cubo"):
+                        self.cubo = CuboAgregado(self.df)
+                    with _etapa(etapas, "snapshot_gravacao"):
+                        salvo = self._save_snapshot()
+                    if salvo:
+                        # Reabre pelo snapshot: as colunas viram páginas compartilhadas com os outros workers
+                        with _etapa(etapas, "snapshot_reabertura"):
+                            self._load_snapshot(files, reaberto=True)
+                            self._release_memory()
+        self._finalizar_carga(origem, inicio)
 
         # Salvar no cache global se está na Vercel
         if IS_VERCEL:
-            _global_data_cache = self.df
+            _global_data_cache = (self.df, self.indice, self.cubo, self.versao_dados, self.manifesto)
             _cache_timestamp = datetime.now()
             logger.info("Dados salvos no cache global (Vercel)")
 
+    @property
+    def df(self):
+        """
+        Frame completo; no artefato da Vercel só é lido na primeira consulta que precisa dele.
+        No modo particionado não existe: ler as partições inteiras desfaria o modo de pouca memória.
+        """
+        if self._df is None and self.particoes is not None:
+            raise RuntimeError("Frame completo indisponível no modo particionado; use o cubo ou handler.consultas")
+        if self._df is None and self._artifact_metadata is not None:
+            with self._lock:
+                if self._df is None:
+                    from datetime import datetime
+                    start_time = datetime.now()
+                    self._df = snapshot.carregar_tabela(self._artifact_path("dados"))
+                    duration = (datetime.now() - start_time).total_seconds()
+                    logger.info(f"Frame completo lido do artefato: {len(self._df):,} registros em {duration:.2f}s")
+        return self._df
+
+    @df.setter
+    def df(self, value):
+        self._df = value
+
+    @property
+    def indice(self):
+        if self._indice is None and self._artifact_metadata is not None:
+            df = self.df
+            with self._lock:
+                if self._indice is None:
+                    self._indice = IndiceInvertido(df)
+        return self._indice
+
+    @indice.setter
+    def indice(self, value):
+        self._indice = value
+
+    @property
+    def total_registros(self):
+        """Número de registros sem exigir o frame completo"""
+        if self.particoes is not None:
+            return self.particoes.total_registros
+        if self._df is None and self._artifact_metadata is not None:
+            return self._artifact_metadata["total_registros"]
+        return len(self.df)
+
+    @property
+    def colunas(self):
+        if self.particoes is not None:
+            return self.particoes.colunas
+        if self._df is None and self._artifact_metadata is not None:
+            return list(self._artifact_metadata["colunas"])
+        return list(self.df.columns)
+
+    def _artifact_path(self, nome, pasta=None):
+        return os.path.join(pasta or ARTIFACT_FOLDER, f"{nome}.arrow")
+
+    def _load_artifact(self, files):
+        """Carrega o nível de resumo (cubo) do artefato pré-construído"""
+        from datetime import datetime
+        metadados = snapshot.ler_metadados(self._artifact_path("cubo"))
+        if not metadados:
+            logger.error(f"Artefato da Vercel ausente em '{ARTIFACT_FOLDER}'; processando as fontes no cold start")
+            return False
+        # Sem as fontes no bundle, o artefato é a própria referência da versão
+        if files and metadados.get("versao_dados") != self.versao_dados:
+            logger.error("Artefato da Vercel desatualizado em relação a 'dados'; processando as fontes no cold start")
+            return False
+
+        start_time = datetime.now()
+        try:
+            self.cubo = CuboAgregado.de_tabelas(
+                snapshot.carregar_tabela(self._artifact_path("cubo")),
+                snapshot.carregar_tabela(self._artifact_path("municipios")),
+            )
+        except Exception as e:
+            logger.warning(f"Erro lendo artefato da Vercel: {e}")
+            return False
+
+        self.versao_dados = metadados["versao_dados"]
+        self._artifact_metadata = metadados
+        duration = (datetime.now() - start_time).total_seconds()
+        logger.info(f"Artefato da Vercel carregado (nível de resumo) em {duration:.2f}s")
+        return True
+
+    def save_artifact(self, pasta=None):
+        """Gera o artefato compacto (frame tipado + cubo, zstd) para o bundle da Vercel"""
+        pasta = pasta or ARTIFACT_FOLDER
+        os.makedirs(pasta, exist_ok=True)
+        metadados = {
+            "versao_dados": self.versao_dados,
+            "total_registros": len(self.df),
+            "colunas": list(self.df.columns),
+        }
+        tabelas = {"dados": self.df, "cubo": self.cubo.celulas, "municipios": self.cubo.municipios}
+        for nome, tabela in tabelas.items():
+            snapshot.salvar_tabela(self._artifact_path(nome, pasta), tabela, metadados, compressao="zstd")
+        tamanho = sum(os.path.getsize(self._artifact_path(nome, pasta)) for nome in tabelas)
+        logger.info(f"Artefato salvo em '{pasta}' ({tamanho / 1024 / 1024:.1f} MB)")
+
     def _setup_cache_folder(self):
         if not os.path.exists(CACHE_FOLDER):
             try:
@@ -54,238 +462,616 @@ class SinespDataHandler:
                 else:
                     logger.info("Cache em disco não disponível, usando apenas cache em memória")
 
-    def _get_file_hash(self, file_path):
-        import hashlib
+    def _get_data_signature(self, files):
+        return assinatura_dados(files, self.manifesto)
+
+    def relatorio_cache(self):
+        """Resultado da última carga por arquivo (hit/miss/rebuild do cache Parquet)"""
+        return self.manifesto.resumo()
+
+    def _finalizar_carga(self, origem, inicio):
+        """Fecha o relatório da carga; a construção a partir das fontes fica gravada em disco"""
+        self.carga["origem"] = origem
+        self.carga["duracao_s"] = round(time.perf_counter() - inicio, 3)
+        self.carga["etapas"] = {nome: round(s, 3) for nome, s in self.carga["etapas"].items()}
+        self.carga["versao_dados"] = self.versao_dados
+        logger.info(f"Carga ({origem}) em {self.carga['duracao_s']:.2f}s: {self.carga['etapas']}")
+        if origem != "construcao" or IS_VERCEL:
+            return
+        relatorio = {**self.carga, "arquivos": self.manifesto.resumo()["arquivos"]}
         try:
-            stat = os.stat(file_path)
-            return hashlib.md5(f"{stat.st_size}_{stat.st_mtime}".encode()).hexdigest()
-        except:
-            return None
+            caminho = os.path.join(CACHE_FOLDER, LOAD_REPORT_FILE)
+            with open(f"{caminho}.tmp", "w", encoding="utf-8") as f:
+                json.dump(relatorio, f, ensure_ascii=False, indent=2)
+            os.replace(f"{caminho}.tmp", caminho)
+        except OSError as e:
+            logger.warning(f"Erro ao salvar relatório da carga: {e}")
 
-    def _get_cache_path(self, file_path):
-        base = (
-            os.path.basename(file_path)
-            .replace(".xlsx", ".parquet")
-            .replace(".csv.xz", ".parquet")
-            .replace(".csv.gz", ".parquet")
-        )
-        return os.path.join(CACHE_FOLDER, base)
+    def relatorio_carga(self):
+        """
+        Tempos por etapa da carga deste processo e por arquivo (descompressão, parsing,
+        limpeza, tipos, Parquet...), além da última construção a partir das fontes.
+        """
+        arquivos = self.manifesto.resumo()["arquivos"]
+        totais = {
+            chave: sum(a.get(chave) or 0 for a in arquivos)
+            for chave in ("registros", "bytes_fonte", "bytes_descomprimidos", "bytes_cache")
+        }
+        ultima_construcao = None
+        try:
+            with open(os.path.join(CACHE_FOLDER, LOAD_REPORT_FILE), encoding="utf-8") as f:
+                ultima_construcao = json.load(f)
+        except (OSError, ValueError):
+            pass
+        return {
+            **self.carga,
+            "totais": totais,
+            "arquivos": arquivos,
+            "ultima_construcao": ultima_construcao if self.carga["origem"] != "construcao" else None,
+        }
 
-    def _load_single_file(self, file_path):
-        import pandas as pd
-        cache_path = self._get_cache_path(file_path)
-        file_hash = self._get_file_hash(file_path)
+    def _snapshot_path(self, nome):
+        return os.path.join(CACHE_FOLDER, SNAPSHOT_FOLDER, f"{nome}.arrow")
 
-        # Verificar cache
-        if not IS_VERCEL and os.path.exists(cache_path):
+    def _release_memory(self):
+        """Devolve ao sistema a memória da construção (o frame agora vem do mapa do snapshot)"""
+        import gc
+        gc.collect()
+        try:
+            import ctypes
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+    @contextmanager
+    def _snapshot_build_lock(self):
+        """Lock de arquivo entre processos para a construção do snapshot"""
+        if IS_VERCEL:
+            yield
+            return
+        try:
+            import fcntl
+            os.makedirs(os.path.join(CACHE_FOLDER, SNAPSHOT_FOLDER), exist_ok=True)
+            lock_file = open(os.path.join(CACHE_FOLDER, SNAPSHOT_FOLDER, ".lock"), "w")
+        except (ImportError, OSError) as e:
+            logger.warning(f"Lock do snapshot indisponível ({e}); construindo sem coordenação")
+            yield
+            return
+
+        with lock_file:
             try:
-                df = pd.read_parquet(cache_path)
-                logger.info(f"Cache hit: {os.path.basename(file_path)}")
-                return df
-            except Exception as e:
-                logger.warning(f"Erro lendo cache {cache_path}: {e}")
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info("Outro processo está construindo o snapshot; aguardando...")
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
 
-        logger.info(f"Processando: {os.path.basename(file_path)}")
+    def _load_snapshot(self, files, reaberto=False):
+        """
+        Abre o snapshot consolidado se ele corresponde às fontes atuais.
+        Os arquivos são mapeados somente leitura: processos que abrem o mesmo snapshot
+        compartilham as páginas das colunas (uma cópia em memória para todos os workers).
+        """
+        from datetime import datetime
+        if IS_VERCEL:
+            return False
 
-        # Carregar arquivo
-        if file_path.endswith(".csv.xz"):
-            df = pd.read_csv(file_path, compression="xz", dtype="string")
-        elif file_path.endswith(".csv.gz"):
-            df = pd.read_csv(file_path, compression="gzip", dtype="string")
-        elif file_path.endswith(".xlsx"):
-            df = pd.read_excel(file_path, engine="openpyxl", dtype="string")
-        else:
-            logger.error(f"Formato de arquivo não suportado: {file_path}")
-            return None
+        metadados = {}
+        for nome in SNAPSHOT_TABLES:
+            metadados[nome] = snapshot.ler_metadados(self._snapshot_path(nome))
+            if not metadados[nome] or metadados[nome].get("versao_dados") != self.versao_dados:
+                return False
 
-        # Normalizar colunas
-        df.columns = [str(c).strip().lower().replace(" ", "_") for c in df.columns]
-        available_columns = [col for col in COLUMN_NAMES if col in df.columns]
-        df = df[available_columns]
+        start_time = datetime.now()
+        try:
+            self.df = snapshot.carregar_tabela(self._snapshot_path("dados"))
+            ordens = snapshot.carregar_tabela(self._snapshot_path("indice"))
+            self.indice = IndiceInvertido(
+                self.df,
+                ordens={col: ordens[col].to_numpy() for col in ordens.columns},
+                contagens=metadados["indice"].get("contagens"),
+            )
+            self.cubo = CuboAgregado.de_tabelas(
+                snapshot.carregar_tabela(self._snapshot_path("cubo")),
+                snapshot.carregar_tabela(self._snapshot_path("municipios")),
+            )
+        except Exception as e:
+            logger.warning(f"Erro lendo snapshot consolidado: {e}")
+            return False
 
-        # Limpeza básica de strings
-        string_columns = ["uf", "municipio", "evento", "agente", "arma", "faixa_etaria", "abrangencia", "formulario"]
-        for col in string_columns:
-            if col in df.columns:
-                df[col] = df[col].astype(str).str.strip()
-                df[col] = df[col].replace(["nan", "None", "", "null"], pd.NA)
+        duration = (datetime.now() - start_time).total_seconds()
+        logger.info(f"Snapshot consolidado aberto: {len(self.df):,} registros em {duration:.2f}s")
+        if not reaberto:
+            for file_path in files:
+                self.manifesto.registrar_resultado(file_path, "snapshot", "snapshot consolidado atual; Parquet não consultado")
+        return True
 
-        # Otimizar dtypes
-        df = self._optimize_dtypes(df)
+    def _save_snapshot(self):
+        """Grava o snapshot consolidado; retorna True se gravou"""
+        import pandas as pd
+        if IS_VERCEL or self.df.empty:
+            return False
+        try:
+            os.makedirs(os.path.join(CACHE_FOLDER, SNAPSHOT_FOLDER), exist_ok=True)
+            metadados = {"versao_dados": self.versao_dados}
+            tabelas = {
+                "dados": self.df,
+                "indice": pd.DataFrame(self.indice.ordens(), copy=False),
+                "cubo": self.cubo.celulas,
+                "municipios": self.cubo.municipios,
+            }
+            for nome, tabela in tabelas.items():
+                extras = {"contagens": self.indice.contagens()} if nome == "indice" else {}
+                snapshot.salvar_tabela(self._snapshot_path(nome), tabela, {**metadados, **extras})
+            logger.info(f"Snapshot consolidado salvo em {os.path.join(CACHE_FOLDER, SNAPSHOT_FOLDER)}")
+            return True
+        except Exception as e:
+            logger.warning(f"Erro ao salvar snapshot consolidado: {e}")
+            return False
 
-        # Adicionar metadado
-        df["arquivo_origem"] = os.path.basename(file_path)
+    def _load_particionado(self, files):
+        """Abre as partições da versão atual, gravando-as antes se ainda não existem; retorna a origem"""
+        etapas = self.carga["etapas"]
+        pasta = particoes.pasta_versao(CACHE_FOLDER, self.versao_dados)
+        with _etapa(etapas, "particoes_abertura"):
+            armazem = particoes.abrir(pasta, self.versao_dados)
+        origem = "particoes"
+        if armazem is None:
+            with self._snapshot_build_lock():
+                with _etapa(etapas, "particoes_abertura"):
+                    armazem = particoes.abrir(pasta, self.versao_dados)
+                if armazem is None:
+                    origem = "construcao"
+                    self._save_particoes(files, pasta)
+                    with _etapa(etapas, "particoes_abertura"):
+                        armazem = particoes.abrir(pasta, self.versao_dados)
+            if armazem is None:
+                raise RuntimeError(f"Erro abrindo as partições em '{pasta}'")
+
+        self.particoes = armazem
+        self.cubo = armazem.cubo
+        logger.info(f"Partições abertas: {armazem.total_registros:,} registros em {len(armazem.partes)} partes")
+        if origem == "particoes":
+            for file_path in files:
+                self.manifesto.registrar_resultado(file_path, "particoes", "partições atuais; Parquet não consultado")
+        return origem
+
+    def _save_particoes(self, files, pasta):
+        """
+        Grava as partições ano/uf e o cubo com um arquivo de origem em memória por vez
+        (o pico de memória é o do maior arquivo, não o da base inteira).
+        """
+        from datetime import datetime
+
+        if not files:
+            raise RuntimeError("Nenhum arquivo encontrado em 'dados'")
+
+        start_time = datetime.now()
+        etapas = self.carga["etapas"]
+        gravador = particoes.GravadorParticoes(pasta)
+        parciais = []
+        try:
+            for indice, file_path in enumerate(files):
+                try:
+                    df = self._load_single_file(file_path)
+                except Exception as e:
+                    logger.error(f"Erro processando {file_path}: {e}")
+                    self.manifesto.registrar_resultado(file_path, "erro", str(e))
+                    continue
+                if df is None:
+                    continue
+                with _etapa(etapas, "particoes_gravacao"):
+                    gravador.adicionar(indice, os.path.basename(file_path), df)
+                with _etapa(etapas, "cubo"):
+                    parciais.append(CuboAgregado(df))
+                del df
+                self._release_memory()
 
-        # Salvar cache em Parquet
-        if not IS_VERCEL:
             try:
-                df.to_parquet(cache_path, compression="snappy", index=False)
+                with _etapa(etapas, "manifesto"):
+                    self.manifesto.podar(files)
+                    self.manifesto.salvar()
             except Exception as e:
-                logger.warning(f"Erro ao salvar cache parquet: {e}")
+                logger.warning(f"Erro ao salvar manifesto do cache: {e}")
+
+            if not parciais:
+                raise RuntimeError("Nenhum arquivo foi carregado com sucesso")
+            with _etapa(etapas, "cubo"):
+                cubo = CuboAgregado.combinar(parciais)
+            with _etapa(etapas, "particoes_gravacao"):
+                gravador.finalizar(self.versao_dados, cubo)
+        except Exception:
+            gravador.descartar()
+            raise
+
+        duration = (datetime.now() - start_time).total_seconds()
+        logger.info(f"Dados particionados: {gravador.total_registros:,} registros em {duration:.2f}s")
+
+    def _cache_status(self, file_path):
+        """(status, motivo, chave) do Parquet da fonte segundo o manifesto"""
+        if IS_VERCEL:
+            return "miss", "cache em disco desativado na Vercel", None
+        return self.manifesto.verificar(file_path)
 
+    def _read_cached_file(self, file_path, chave, status=None, motivo=None):
+        """Lê o Parquet da fonte; com `status`, registra o hit (tempo e bytes) no relatório"""
+        import pandas as pd
+        cache_path = self.manifesto.caminho_cache(file_path, chave)
+        inicio = time.perf_counter()
+        try:
+            df = pd.read_parquet(cache_path)
+            logger.info(f"Cache hit: {os.path.basename(file_path)}")
+        except Exception as e:
+            logger.warning(f"Erro lendo cache {cache_path}: {e}")
+            return None
+        if status:
+            duracao = time.perf_counter() - inicio
+            medidas = {"etapas": {"parquet_leitura": duracao}, "bytes_cache": os.path.getsize(cache_path)}
+            self.manifesto.registrar_resultado(file_path, status, motivo, duracao, len(df), medidas)
         return df
 
-    def _optimize_dtypes(self, df):
+    def _load_single_file(self, file_path):
+        # Verificar cache pelo manifesto (conteúdo da fonte + schema + código)
+        status, motivo, chave = self._cache_status(file_path)
+        if status == "hit":
+            df = self._read_cached_file(file_path, chave, status, motivo)
+            if df is not None:
+                return df
+            status, motivo = "rebuild", "erro lendo o Parquet"
+
+        logger.info(f"Processando: {os.path.basename(file_path)} ({status}: {motivo})")
+        cache_path = self.manifesto.caminho_cache(file_path, chave) if chave else None
+        df, salvo, medidas = processar_e_salvar(file_path, cache_path)
+        self._register_processed_file(file_path, chave if salvo else None, status, motivo, df, medidas)
+        return df
+
+    def _register_processed_file(self, file_path, chave, status, motivo, df, medidas):
+        """Atualiza o manifesto (se o Parquet foi gravado) e o relatório da carga"""
+        if df is None:
+            return
+        if chave:
+            self.manifesto.atualizar(file_path, chave, len(df))
+        self.manifesto.registrar_resultado(file_path, status, motivo, medidas["duracao_s"], len(df), medidas)
+
+    @staticmethod
+    def _optimize_dtypes(df):
         import pandas as pd
-        numeric_columns = ["feminino", "masculino", "nao_informado", "total_vitima", "total", "total_peso"]
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0)
-                if df[col].dtype == "float64" and df[col].notnull().all():
-                    df[col] = df[col].astype("int64")
+        import numpy as np
+        for col in NUMERIC_COLUMNS:
+            if col not in df.columns:
+                continue
+            serie = df[col]
+            # float64 nativo (sem máscara de nulos): mapeável sem cópia a partir do snapshot
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                # Lido como categórico: converte só os valores distintos; código -1 (ausente) vira 0
+                valores = pd.to_numeric(pd.Series(serie.cat.categories), errors="coerce").fillna(0)
+                df[col] = np.append(valores.to_numpy(dtype="float64"), 0.0)[serie.cat.codes.to_numpy()]
+            else:
+                df[col] = pd.to_numeric(serie, errors="coerce").fillna(0).astype("float64")
 
-        categorical_columns = ["uf", "evento", "agente", "arma", "faixa_etaria", "abrangencia", "formulario"]
-        for col in categorical_columns:
+        # Inclui municipio: poucos milhares de valores, o dicionário serve de base para o índice invertido
+        for col in CATEGORICAL_COLUMNS:
             if col in df.columns:
                 df[col] = df[col].astype("category")
 
-        if "municipio" in df.columns:
-            df["municipio"] = df["municipio"].astype("string")
+        return SinespDataHandler._add_time_columns(df)
 
-        return df
-
-    def _load_all_data(self):
+    @staticmethod
+    def _add_time_columns(df):
+        """Deriva `ano` (int16) e `mes` (int8) de data_referencia; 0 quando desconhecido"""
         import pandas as pd
-        import glob
-        from datetime import datetime
-        from concurrent.futures import ThreadPoolExecutor, as_completed
+        import numpy as np
+        if "data_referencia" not in df.columns or all(col in df.columns for col in TIME_COLUMNS):
+            return df
+
+        # Apenas as poucas datas distintas (categorias) são convertidas
+        datas = df["data_referencia"].astype("category")
+        categorias = pd.to_datetime(pd.Series(datas.cat.categories), format="%Y-%m-%d", errors="coerce")
+        codigos = datas.cat.codes.to_numpy()
+        for col, dtype in TIME_COLUMNS.items():
+            valores = getattr(categorias.dt, "year" if col == "ano" else "month").fillna(0).to_numpy()
+            # Posição extra (0) para o código -1 de datas ausentes
+            valores = np.append(valores, 0).astype(dtype)
+            df[col] = valores[codigos]
 
+        # Fallback: ano presente no nome do arquivo de origem
+        if "arquivo_origem" in df.columns and (df["ano"] == 0).any():
+            sem_ano = df["ano"] == 0
+            ano_arquivo = df.loc[sem_ano, "arquivo_origem"].astype(str).str.extract(r"\b(20\d{2})\b")[0]
+            df.loc[sem_ano, "ano"] = pd.to_numeric(ano_arquivo, errors="coerce").fillna(0).astype("int16").to_numpy()
+
+        return df
+
+    def _list_data_files(self):
         if not os.path.exists(DATA_FOLDER):
             os.makedirs(DATA_FOLDER)
             logger.info(f"Pasta '{DATA_FOLDER}' criada. Adicione arquivos nela.")
-            return pd.DataFrame(columns=COLUMN_NAMES)
+            return []
+        return listar_fontes()
 
-        files = []
-        files.extend(glob.glob(os.path.join(DATA_FOLDER, "*.xlsx")))
-        files.extend(glob.glob(os.path.join(DATA_FOLDER, "*.csv.xz")))
-        files.extend(glob.glob(os.path.join(DATA_FOLDER, "*.csv.gz")))
+    def _load_all_data(self, files):
+        import pandas as pd
+        from datetime import datetime
+        from concurrent.futures import ThreadPoolExecutor, as_completed
 
         if not files:
             logger.info("Nenhum arquivo encontrado em 'dados'")
             return pd.DataFrame(columns=COLUMN_NAMES)
 
-        logger.info(f"Carregando {len(files)} arquivos...")
         start_time = datetime.now()
-        dataframes = []
+        etapas = self.carga["etapas"]
+        with _etapa(etapas, "manifesto"):
+            estados = {f: self._cache_status(f) for f in files}
+        pendentes = [f for f in files if estados[f][0] != "hit"]
 
-        max_workers = min(2 if IS_VERCEL else 4, len(files))
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_file = {executor.submit(self._load_single_file, f): f for f in files}
-            for future in as_completed(future_to_file):
-                file_path = future_to_file[future]
-                try:
-                    df = future.result()
-                    if df is not None:
-                        dataframes.append(df)
-                except Exception as e:
-                    logger.error(f"Erro processando {file_path}: {e}")
+        # Descompressão, parsing e normalização são presos ao GIL: com vários arquivos
+        # a processar, cada um vai para um processo e volta como tabela Arrow
+        # Com o servidor no ar (recarga) há outras threads rodando: fork não é seguro
+        workers = 1 if self._recarga else min(INGEST_WORKERS, len(pendentes))
+        inicio_arquivos = time.perf_counter()
+        if IS_VERCEL or workers < 2:
+            logger.info(f"Carregando {len(files)} arquivos ({len(pendentes)} a processar, threads)...")
+            resultados = {}
+            max_workers = min(2 if IS_VERCEL else 4, len(files))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                future_to_file = {executor.submit(self._load_single_file, f): f for f in files}
+                for future in as_completed(future_to_file):
+                    file_path = future_to_file[future]
+                    try:
+                        resultados[file_path] = future.result()
+                    except Exception as e:
+                        logger.error(f"Erro processando {file_path}: {e}")
+                        self.manifesto.registrar_resultado(file_path, "erro", str(e))
+        else:
+            logger.info(f"Carregando {len(files)} arquivos ({len(pendentes)} a processar em {workers} processos)...")
+            resultados = self._load_with_processes(files, estados, workers)
+        # Parede do conjunto de arquivos (os tempos por arquivo se sobrepõem entre workers)
+        etapas["arquivos"] = time.perf_counter() - inicio_arquivos
+
+        if not IS_VERCEL:
+            try:
+                with _etapa(etapas, "manifesto"):
+                    self.manifesto.podar(files)
+                    self.manifesto.salvar()
+            except Exception as e:
+                logger.warning(f"Erro ao salvar manifesto do cache: {e}")
 
+        # Ordem dos arquivos (e das linhas) determinística, independente de qual terminou antes
+        dataframes = [resultados[f] for f in files if resultados.get(f) is not None]
         if not dataframes:
             raise RuntimeError("Nenhum arquivo foi carregado com sucesso")
 
-        combined = pd.concat(dataframes, ignore_index=True, sort=False)
-        combined = self._optimize_dtypes(combined)
+        with _etapa(etapas, "concatenacao"):
+            combined = concatenar_frames(dataframes)
+        with _etapa(etapas, "tipos_final"):
+            combined = self._optimize_dtypes(combined)
 
         duration = (datetime.now() - start_time).total_seconds()
         logger.info(f"Dados carregados: {len(combined):,} registros em {duration:.2f}s")
         return combined
 
+    def _load_with_processes(self, files, estados, workers):
+        """Arquivos sem cache válido são processados no pool; os hits são lidos aqui enquanto isso"""
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        resultados = {}
+        # fork: o filho herda os módulos já importados (spawn reimportaria o app inteiro)
+        contexto = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=contexto) as executor:
+            future_to_file = {}
+            for file_path in files:
+                status, motivo, chave = estados[file_path]
+                if status == "hit":
+                    continue
+                logger.info(f"Processando: {os.path.basename(file_path)} ({status}: {motivo})")
+                cache_path = self.manifesto.caminho_cache(file_path, chave) if chave else None
+                future = executor.submit(processar_e_salvar, file_path, cache_path, True)
+                future_to_file[future] = file_path
+
+            for file_path in files:
+                status, motivo, chave = estados[file_path]
+                if status == "hit":
+                    df = self._read_cached_file(file_path, chave, status, motivo)
+                    if df is None:
+                        df = self._load_single_file(file_path)
+                    resultados[file_path] = df
+
+            for future in as_completed(future_to_file):
+                file_path = future_to_file[future]
+                status, motivo, chave = estados[file_path]
+                try:
+                    tabela, salvo, medidas = future.result()
+                    df = None
+                    if tabela is not None:
+                        with _etapa(medidas["etapas"], "arrow_decodificacao"):
+                            df = de_arrow(tabela)
+                    self._register_processed_file(file_path, chave if salvo else None, status, motivo, df, medidas)
+                    resultados[file_path] = df
+                except Exception as e:
+                    logger.error(f"Erro processando {file_path}: {e}")
+                    self.manifesto.registrar_resultado(file_path, "erro", str(e))
+        return resultados
+
     # ==== Métodos de consulta (iguais ao seu código) ====
 
+    def _cached(self, cache_key, calcular):
+        """Resultado guardado no cache de resultados compartilhado (por versão dos dados)"""
+        return cache_resultados.obter_ou_calcular(self.versao_dados, ("handler", cache_key), calcular)
+
     def get_anos_disponiveis(self):
-        import pandas as pd, re
-        cache_key = "anos_disponiveis"
-        if cache_key in self._cached_values:
-            return self._cached_values[cache_key]
+        def calcular():
+            anos = set()
+            if "ano" in self.cubo.celulas.columns:
+                anos.update(int(a) for a in self.cubo.celulas["ano"].unique() if a)
+            return sorted(list(anos))
 
-        anos = set()
-        if "data_referencia" in self.df.columns:
-            try:
-                anos.update(pd.to_datetime(self.df["data_referencia"], errors="coerce").dt.year.dropna().astype(int))
-            except:
-                pass
-        if "arquivo_origem" in self.df.columns:
-            for arquivo in self.df["arquivo_origem"].unique():
-                for match in re.findall(r"\b(20\d{2})\b", str(arquivo)):
-                    anos.add(int(match))
-
-        result = sorted(list(anos))
-        self._cached_values[cache_key] = result
-        return result
+        return self._cached("anos_disponiveis", calcular)
 
-    def get_arquivos_carregados(self):
-        cache_key = "arquivos_carregados"
-        if cache_key in self._cached_values:
-            return self._cached_values[cache_key]
+    def get_categorias(self, coluna):
+        """Categorias de uma dimensão lidas do cubo (sem tocar no frame completo); None se ausente"""
+        import pandas as pd
+        for tabela in (self.cubo.celulas, self.cubo.municipios):
+            if coluna in tabela.columns and isinstance(tabela[coluna].dtype, pd.CategoricalDtype):
+                return tabela[coluna].cat.categories.tolist()
+        return None
 
-        if "arquivo_origem" not in self.df.columns:
+    def get_arquivos_carregados(self):
+        if "arquivo_origem" not in self.colunas:
             return []
-        arquivo_counts = self.df["arquivo_origem"].value_counts()
-        result = [{"arquivo": a, "registros": int(c)} for a, c in arquivo_counts.items()]
-        result = sorted(result, key=lambda x: x["arquivo"])
-        self._cached_values[cache_key] = result
-        return result
+
+        def calcular():
+            if self.particoes is not None:
+                result = [{"arquivo": a, "registros": int(c)} for a, c in self.particoes.arquivos().items()]
+                return sorted(result, key=lambda x: x["arquivo"])
+            arquivo_counts = self.df["arquivo_origem"].value_counts()
+            result = [{"arquivo": a, "registros": int(c)} for a, c in arquivo_counts.items()]
+            return sorted(result, key=lambda x: x["arquivo"])
+
+        return self._cached("arquivos_carregados", calcular)
 
     def preview(self, limite=10):
-        return self.df.head(limite).to_dict(orient="records")
+        import numpy as np
+        return registros(self.consultas.linhas(np.arange(min(limite, self.total_registros))))
 
     def listar_ufs(self):
-        cache_key = "ufs"
-        if cache_key in self._cached_values:
-            return self._cached_values[cache_key]
-        if "uf" not in self.df.columns:
+        if "uf" not in self.colunas:
             raise ValueError("Coluna 'uf' não encontrada")
-        result = sorted(self.df["uf"].dropna().unique().tolist())
-        self._cached_values[cache_key] = result
-        return result
+        # Tabela de presença do cubo: as mesmas UFs das linhas brutas, sem ler o frame
+        return self._cached("ufs", lambda: sorted(self.cubo.municipios["uf"].dropna().unique().tolist()))
 
     def listar_municipios(self, uf=None):
-        cache_key = f"municipios_{uf}" if uf else "municipios_all"
-        if cache_key in self._cached_values:
-            return self._cached_values[cache_key]
-        if "municipio" not in self.df.columns:
+        if "municipio" not in self.colunas:
             raise ValueError("Coluna 'municipio' não encontrada")
 
-        df = self.df
+        def calcular():
+            tabela = self.cubo.municipios
+            if uf:
+                tabela = tabela[tabela["uf"].str.upper() == uf.upper()]
+            return sorted(tabela["municipio"].dropna().unique().tolist())
+
+        return self._cached(f"municipios_{uf}" if uf else "municipios_all", calcular)
+
+    def _indice_sugestoes(self):
+        """Nomes de municípios (com UFs e registros por UF) e seu índice de n-gramas, lidos do cubo"""
+        import numpy as np
+
+        if self._sugestoes is None:
+            with self._lock:
+                if self._sugestoes is None:
+                    tabela = self.cubo.municipios
+                    por_uf = tabela.groupby(["municipio", "uf"], observed=True)["registros"].sum()
+                    nomes, registros_uf = [], []
+                    for municipio, grupo in por_uf.groupby(level=0, observed=True):
+                        if str(municipio).strip() in ["", "nan", "None", "null", "<NA>"]:
+                            continue
+                        nomes.append(str(municipio))
+                        registros_uf.append({str(uf): int(n) for (_, uf), n in grupo.items() if n > 0})
+                    self._sugestoes = {
+                        "nomes": nomes,
+                        "registros_uf": registros_uf,
+                        "registros": np.array([sum(r.values()) for r in registros_uf], dtype=np.int64),
+                        "ngramas": IndiceNgramas([normalizar_texto(n) for n in nomes]),
+                    }
+        return self._sugestoes
+
+    def sugerir_municipios(self, termo, uf=None, limite=10):
+        """
+        Municípios cujo nome (sem acento/caixa) contém o termo, do mais relevante ao menos:
+        nome igual, começa com o termo, palavra que começa com o termo, demais; depois os
+        municípios com mais registros.
+        """
+        import numpy as np
+
+        sugestoes = self._indice_sugestoes()
+        registros_uf = sugestoes["registros_uf"]
+        permitidos = None
+        pesos = sugestoes["registros"]
         if uf:
-            df = df[df["uf"].str.upper() == uf.upper()]
-        result = sorted(df["municipio"].dropna().unique().tolist())
-        self._cached_values[cache_key] = result
-        return result
+            alvo_uf = normalizar_texto(uf)
+            pesos = np.array([r.get(alvo_uf, 0) for r in registros_uf], dtype=np.int64)
+            permitidos = pesos > 0
+
+        codigos = sugestoes["ngramas"].buscar(termo, limite=limite, pesos=pesos, permitidos=permitidos)
+        return [
+            {
+                "municipio": sugestoes["nomes"][c],
+                "ufs": sorted(registros_uf[c]),
+                "registros": int(pesos[c]),
+            }
+            for c in codigos
+        ]
 
     def ocorrencias(self, uf: str, municipio: str = None, evento: str = None, ano: int = None):
-        import pandas as pd
-        if "uf" not in self.df.columns:
+        if "uf" not in self.colunas:
             raise ValueError("Coluna 'uf' não encontrada")
 
-        mask = self.df["uf"].str.upper() == uf.upper()
-        if municipio:
-            mask &= self.df["municipio"].str.upper() == municipio.upper()
-        if evento:
-            mask &= self.df["evento"].str.upper() == evento.upper()
-        if ano:
-            if "data_referencia" in self.df.columns:
-                try:
-                    mask &= pd.to_datetime(self.df["data_referencia"], errors="coerce").dt.year == ano
-                except:
-                    pass
-            if "arquivo_origem" in self.df.columns and not mask.any():
-                mask = self.df["arquivo_origem"].str.contains(str(ano), na=False)
-
-        filtro = self.df[mask]
-        if filtro.empty:
+        # Igualdade em todos os filtros, pelo índice (ou partições); só as linhas encontradas são lidas
+        filtros = {"uf": uf, "municipio": municipio, "evento": evento, "ano": ano}
+        filtros = {col: valor for col, valor in filtros.items() if valor}
+        posicoes = self.filtrar_posicoes(exato=list(filtros), **filtros)
+        if posicoes is None or len(posicoes) == 0:
             return None
-        return filtro.to_dict(orient="records")
+        return registros(self.consultas.linhas(posicoes))
+
+    def filtrar_posicoes(self, exato=None, **filtros):
+        """
+        Posições (ordenadas) das linhas que atendem aos filtros, via índice invertido.
+        A posição no frame é o id estável do registro: os arquivos são concatenados sempre
+        na mesma ordem, então o id só muda quando a versão dos dados muda. No modo particionado
+        o id é a posição na ordem das partes e o filtro é empurrado às partições (particoes.py).
+        Filtros são por substring (sem acento/caixa); colunas em `exato` exigem igualdade.
+        Retorna None quando nenhum filtro foi informado.
+        """
+        exato = set(exato or [])
+        chave = self.assinatura_filtros(exato=exato, **filtros)
+        with self._lock:
+            if chave in self._posicoes_cache:
+                self._posicoes_cache.move_to_end(chave)
+                return self._posicoes_cache[chave]
+
+        with fase("filtro"):
+            fonte = self.particoes if self.particoes is not None else self.indice
+            posicoes = fonte.filtrar({col: (valor, col in exato) for col, valor in filtros.items()})
+        if posicoes is not None:
+            posicoes.flags.writeable = False
+            with self._lock:
+                self._posicoes_cache[chave] = posicoes
+                limite = POSITIONS_CACHE_MAX_MB * 1024 * 1024
+                while len(self._posicoes_cache) > 1 and (
+                    len(self._posicoes_cache) > POSITIONS_CACHE_ENTRIES
+                    or sum(p.nbytes for p in self._posicoes_cache.values()) > limite
+                ):
+                    self._posicoes_cache.popitem(last=False)
+        return posicoes
+
+    def assinatura_filtros(self, exato=None, **filtros):
+        """Identificador curto de um conjunto de filtros (após normalização)"""
+        exato = set(exato or [])
+        partes = sorted(
+            f"{col}{'=' if col in exato else '~'}{normalizar_texto(valor)}"
+            for col, valor in filtros.items() if valor is not None and valor != ""
+        )
+        return hashlib.md5("|".join(partes).encode()).hexdigest()[:16]
 
     def clear_cache(self):
-        self._cached_values.clear()
+        cache_resultados.limpar()
+        self._posicoes_cache.clear()
         logger.info("Cache em memória limpo")
 
     def get_memory_usage(self):
-        memory_mb = self.df.memory_usage(deep=True).sum() / 1024 / 1024
+        # No nível de resumo da Vercel o frame e o índice ainda não foram lidos
+        memory_mb = self._df.memory_usage(deep=True).sum() / 1024 / 1024 if self._df is not None else 0
         return {
             "dataframe_size_mb": round(memory_mb, 2),
-            "total_rows": len(self.df),
-            "total_columns": len(self.df.columns),
-            "cached_values": len(self._cached_values),
+            "total_rows": self.total_registros,
+            "total_columns": len(self.colunas),
+            "cached_values": len(cache_resultados),
+            "indice_mb": self._indice.get_memory_usage() if self._indice is not None else 0,
+            "cubo_mb": self.cubo.get_memory_usage(),
+            "armazenamento": "particionado" if self.particoes is not None else "memoria",
+            "particoes": self.particoes.get_memory_usage() if self.particoes is not None else None,
         }
@@ -0,0 +1,171 @@
+"""
+Execução das consultas pesadas em pools dedicados, com controle de admissão.
+
+Cada classe de consulta tem um ThreadPoolExecutor próprio, com número fixo de
+threads e uma fila limitada. Quando threads e fila estão ocupadas, a requisição
+é recusada na hora com 503 e Retry-After, em vez de se acumular. As rotas leves
+(metadados, dimensões) continuam no threadpool padrão do FastAPI e não esperam
+atrás das consultas pesadas.
+
+Configuração por ambiente (threads / fila por classe):
+    SINESP_CONSULTA_WORKERS, SINESP_CONSULTA_FILA       (padrão 4 / 16)
+    SINESP_EXPORTACAO_WORKERS, SINESP_EXPORTACAO_FILA   (padrão 2 / 4)
+    SINESP_RETRY_AFTER                                   (segundos, padrão 2)
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from starlette.responses import Response, StreamingResponse
+
+import perfis
+from respostas import RespostaJSON
+
+logger = logging.getLogger(__name__)
+
+RETRY_AFTER = int(os.environ.get("SINESP_RETRY_AFTER", "2"))
+
+
+def _config(nome, padrao):
+    return int(os.environ.get(nome, str(padrao)))
+
+
+class PoolConsultas:
+    """Executor de tamanho fixo com limite de requisições em execução + em espera"""
+
+    def __init__(self, nome, workers, fila):
+        self.nome = nome
+        self.workers = max(1, workers)
+        self.fila = max(0, fila)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"consulta-{nome}")
+        # Alterados só no event loop (sem lock)
+        self.ocupados = 0
+        self.contadores = {"admitidas": 0, "rejeitadas": 0, "concluidas": 0, "erros": 0}
+
+    def admitir(self):
+        """Reserva uma vaga ou recusa com 503 quando threads e fila estão cheias"""
+        if self.ocupados >= self.workers + self.fila:
+            self.contadores["rejeitadas"] += 1
+            logger.warning(f"Pool '{self.nome}' cheio ({self.ocupados} requisições); recusando")
+            raise HTTPException(
+                status_code=503,
+                detail="Servidor ocupado com outras consultas; tente novamente em instantes",
+                headers={"Retry-After": str(RETRY_AFTER)},
+            )
+        self.ocupados += 1
+        self.contadores["admitidas"] += 1
+
+    def liberar(self, erro=False):
+        self.ocupados -= 1
+        self.contadores["erros" if erro else "concluidas"] += 1
+
+    async def executar(self, func, *args, **kwargs):
+        """Roda a função no pool preservando as contextvars da requisição"""
+        loop = asyncio.get_running_loop()
+        contexto = contextvars.copy_context()
+        chamada = functools.partial(contexto.run, func, *args, **kwargs)
+        return await loop.run_in_executor(self.executor, chamada)
+
+    def estatisticas(self):
+        return {
+            "workers": self.workers,
+            "fila": self.fila,
+            "ocupados": self.ocupados,
+            **self.contadores,
+        }
+
+
+class _StreamingNoPool(StreamingResponse):
+    """Resposta em streaming que mantém a vaga do pool até o último bloco ser enviado"""
+
+    def __init__(self, original, pool):
+        # O corpo já é assíncrono (o Starlette roda iteradores síncronos no threadpool)
+        super().__init__(
+            original.body_iterator,
+            status_code=original.status_code,
+            headers=dict(original.headers),
+            media_type=original.media_type,
+            background=original.background,
+        )
+        self._pool = pool
+
+    async def __call__(self, scope, receive, send):
+        erro = False
+        try:
+            await super().__call__(scope, receive, send)
+        except BaseException:
+            erro = True
+            raise
+        finally:
+            # Também quando o cliente desconecta antes do primeiro bloco
+            self._pool.liberar(erro)
+
+
+POOLS = {
+    "consulta": PoolConsultas(
+        "consulta", _config("SINESP_CONSULTA_WORKERS", 4), _config("SINESP_CONSULTA_FILA", 16)
+    ),
+    "exportacao": PoolConsultas(
+        "exportacao", _config("SINESP_EXPORTACAO_WORKERS", 2), _config("SINESP_EXPORTACAO_FILA", 4)
+    ),
+}
+
+
+def _com_perfil(resposta, perfil_id):
+    """Anexa o id do perfil à resposta (dicts viram RespostaJSON, como a RotaJSON faria)"""
+    if not isinstance(resposta, Response):
+        resposta = RespostaJSON(resposta)
+    resposta.headers["X-Perfil-Id"] = str(perfil_id)
+    # Resposta de administrador (a URL pode trazer o token): nenhum cache deve guardá-la
+    resposta.headers["Cache-Control"] = "no-store"
+    return resposta
+
+
+def consulta_pesada(classe="consulta"):
+    """
+    Decorador de rota síncrona: executa no pool da classe, com admissão limitada.
+    Rotas com @resultado_em_cache têm o cache consultado antes da admissão.
+    Respostas em streaming mantêm a vaga até o último bloco ser enviado.
+    Requisições marcadas para perfil (ver perfis.py) rodam sob o cProfile.
+    """
+    pool = POOLS[classe]
+
+    def decorador(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            modo = perfis.modo_perfil(kwargs.get("request"))
+            executar = func
+            # Acertos do cache de resultados respondem sem ocupar vaga do pool
+            if modo is None and hasattr(func, "buscar_em_cache"):
+                encontrado, resposta = func.buscar_em_cache(kwargs)
+                if encontrado:
+                    return resposta
+                executar = func.calcular_e_guardar
+            pool.admitir()
+            try:
+                if modo is None:
+                    resposta = await pool.executar(executar, *args, **kwargs)
+                else:
+                    resposta, perfil_id = await pool.executar(perfis.executar_perfilado, func, modo, *args, **kwargs)
+                    if modo == "sob_demanda" and perfil_id is not None:
+                        resposta = _com_perfil(resposta, perfil_id)
+            except BaseException:
+                pool.liberar(erro=True)
+                raise
+            # A vaga segue ocupada enquanto o corpo é gerado e enviado
+            if isinstance(resposta, StreamingResponse):
+                return _StreamingNoPool(resposta, pool)
+            pool.liberar()
+            return resposta
+
+        return wrapper
+
+    return decorador
+
+
+def estatisticas_pools():
+    return {nome: pool.estatisticas() for nome, pool in POOLS.items()}
@@ -0,0 +1,261 @@
+"""
+Índice invertido sobre os códigos de dicionário das colunas categóricas.
+
+Cada dimensão guarda, para cada valor distinto, as posições (ordenadas) das
+linhas que o contêm. Os filtros viram interseções de listas de posições,
+começando pela dimensão mais seletiva. A busca por trecho do nome passa por
+um índice de n-gramas dos valores normalizados (sem acento/caixa), em vez de
+comparar o termo com cada valor distinto.
+"""
+import logging
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Dimensões indexadas na carga dos dados
+DIMENSOES_INDICE = ["uf", "municipio", "evento", "agente", "arma", "ano"]
+
+# Maior n-grama indexado: termos mais longos intersectam os trigramas e conferem o trecho
+TAMANHO_NGRAMA = 3
+
+
+def normalizar_texto(valor):
+    """Remove acentos e converte para maiúsculas (comparação tolerante)"""
+    texto = unicodedata.normalize("NFKD", str(valor))
+    return "".join(c for c in texto if not unicodedata.combining(c)).upper().strip()
+
+
+class IndiceNgramas:
+    """
+    Listas de códigos por n-grama (1 a 3 caracteres) dos valores normalizados.
+    Resolve "contém o trecho" sem percorrer todos os valores; termos de até 3
+    caracteres (prefixos digitados na busca) são uma única consulta ao dicionário.
+    """
+
+    def __init__(self, normalizadas):
+        self.normalizadas = list(normalizadas)
+        listas, prefixos, palavras = defaultdict(set), defaultdict(set), defaultdict(set)
+        for codigo, nome in enumerate(self.normalizadas):
+            for tamanho in range(1, TAMANHO_NGRAMA + 1):
+                for i in range(len(nome) - tamanho + 1):
+                    listas[nome[i:i + tamanho]].add(codigo)
+                # Prefixos do nome e das palavras seguintes, para ordenar as sugestões
+                if len(nome) >= tamanho:
+                    prefixos[nome[:tamanho]].add(codigo)
+                for palavra in _palavras(nome)[1:]:
+                    if len(palavra) >= tamanho:
+                        palavras[palavra[:tamanho]].add(codigo)
+
+        def como_arrays(grupos):
+            return {chave: np.array(sorted(codigos), dtype=np.int64) for chave, codigos in grupos.items()}
+
+        self.listas = como_arrays(listas)
+        self.prefixos = como_arrays(prefixos)
+        self.palavras = como_arrays(palavras)
+        self.ordem_alfabetica = np.argsort(np.argsort(np.array(self.normalizadas, dtype=object), kind="stable"))
+
+    def contendo(self, alvo):
+        """Códigos (crescentes) cujo valor normalizado contém o termo já normalizado"""
+        if not alvo:
+            return np.arange(len(self.normalizadas), dtype=np.int64)
+        if len(alvo) <= TAMANHO_NGRAMA:
+            return self.listas.get(alvo, np.empty(0, dtype=np.int64))
+
+        grams = {alvo[i:i + TAMANHO_NGRAMA] for i in range(len(alvo) - TAMANHO_NGRAMA + 1)}
+        listas = sorted((self.listas.get(gram, np.empty(0, dtype=np.int64)) for gram in grams), key=len)
+        candidatos = listas[0]
+        for lista in listas[1:]:
+            if len(candidatos) == 0:
+                break
+            candidatos = np.intersect1d(candidatos, lista, assume_unique=True)
+        # Trigramas presentes não garantem o trecho contíguo: confere nos candidatos
+        return np.array([c for c in candidatos.tolist() if alvo in self.normalizadas[c]], dtype=np.int64)
+
+    def classificar(self, codigo, alvo):
+        """0: igual, 1: começa com o termo, 2: alguma palavra começa com ele, 3: contém"""
+        nome = self.normalizadas[codigo]
+        if nome == alvo:
+            return 0
+        if nome.startswith(alvo):
+            return 1
+        if any(palavra.startswith(alvo) for palavra in _palavras(nome)[1:]):
+            return 2
+        return 3
+
+    def _classes(self, codigos, alvo):
+        """classificar() de vários códigos; termos curtos usam as listas de prefixos"""
+        if len(alvo) > TAMANHO_NGRAMA:
+            return np.array([self.classificar(c, alvo) for c in codigos.tolist()], dtype=np.int8)
+        vazio = np.empty(0, dtype=np.int64)
+        classes = np.full(len(codigos), 3, dtype=np.int8)
+        classes[np.isin(codigos, self.palavras.get(alvo, vazio))] = 2
+        prefixo = np.isin(codigos, self.prefixos.get(alvo, vazio))
+        classes[prefixo] = 1
+        for i in np.flatnonzero(prefixo):
+            if self.normalizadas[codigos[i]] == alvo:
+                classes[i] = 0
+        return classes
+
+    def buscar(self, termo, limite=10, pesos=None, permitidos=None):
+        """
+        Códigos que contêm o termo, do mais relevante ao menos: tipo de correspondência,
+        depois `pesos` (maior primeiro) e ordem alfabética.
+        `permitidos` (array booleano por código) restringe o resultado.
+        """
+        alvo = normalizar_texto(termo)
+        codigos = self.contendo(alvo)
+        if permitidos is not None and len(codigos):
+            codigos = codigos[permitidos[codigos]]
+        if len(codigos) == 0:
+            return []
+
+        pesos = np.zeros(len(codigos), dtype=np.int64) if pesos is None else np.asarray(pesos)[codigos]
+        ordem = np.lexsort((self.ordem_alfabetica[codigos], -pesos, self._classes(codigos, alvo)))
+        return codigos[ordem[:limite]].tolist()
+
+
+def _palavras(nome):
+    return nome.replace("-", " ").split()
+
+
+class DimensaoIndexada:
+    """Listas de posições de uma coluna, agrupadas pelo código do dicionário"""
+
+    def __init__(self, serie, ordem=None, contagens=None):
+        import pandas as pd
+
+        self._valores = None
+        self._minimo = 0
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            codigos = serie.cat.codes.to_numpy()
+            categorias = serie.cat.categories
+        elif pd.api.types.is_integer_dtype(serie.dtype) and len(serie):
+            # Inteiros de faixa curta (ex.: ano): o código é o deslocamento a partir do mínimo.
+            # Calculado sob demanda a partir da coluna (que pode ser um mapa compartilhado do snapshot)
+            self._valores = serie.to_numpy()
+            self._minimo = int(self._valores.min())
+            codigos = None
+            categorias = range(self._minimo, int(self._valores.max()) + 1)
+        else:
+            codigos, categorias = pd.factorize(serie, use_na_sentinel=True)
+            codigos = codigos.astype(np.int32)
+
+        self.codigos = codigos
+        self.categorias = [str(c) for c in categorias]
+        self.normalizadas = [normalizar_texto(c) for c in self.categorias]
+        self._ngramas = None
+
+        # Ordenação estável: dentro de cada código as posições ficam crescentes
+        if ordem is None or contagens is None:
+            todos = self._codigos_em(slice(None))
+            if ordem is None:
+                ordem = np.argsort(todos, kind="stable").astype(np.int32)
+            if contagens is None:
+                contagens = np.bincount(todos[todos >= 0], minlength=len(self.categorias))
+        self.ordem = ordem
+        contagens = np.asarray(contagens, dtype=np.int64)
+        inicio_validos = len(serie) - int(contagens.sum())  # códigos -1 (NA) vêm primeiro
+        self.inicios = np.concatenate(([0], np.cumsum(contagens))) + inicio_validos
+        self.contagens = contagens
+
+    def _codigos_em(self, posicoes):
+        """Códigos das linhas nas posições informadas"""
+        if self.codigos is not None:
+            return self.codigos[posicoes]
+        return (self._valores[posicoes] - self._minimo).astype(np.int32)
+
+    @property
+    def ngramas(self):
+        """Índice de n-gramas dos valores, montado na primeira busca por trecho"""
+        if self._ngramas is None:
+            self._ngramas = IndiceNgramas(self.normalizadas)
+        return self._ngramas
+
+    def codigos_correspondentes(self, termo, exato=False):
+        """Códigos cujo valor normalizado é igual ao termo (ou o contém)"""
+        alvo = normalizar_texto(termo)
+        if exato:
+            return np.array([i for i, v in enumerate(self.normalizadas) if v == alvo], dtype=np.int64)
+        return self.ngramas.contendo(alvo)
+
+    def estimar(self, codigos):
+        """Número de linhas cobertas pelos códigos"""
+        return int(self.contagens[codigos].sum()) if len(codigos) else 0
+
+    def posicoes(self, codigos):
+        """Posições ordenadas das linhas com algum dos códigos"""
+        if len(codigos) == 0:
+            return np.empty(0, dtype=np.int32)
+        partes = [self.ordem[self.inicios[c]:self.inicios[c + 1]] for c in codigos]
+        if len(partes) == 1:
+            return partes[0]
+        return np.sort(np.concatenate(partes))
+
+    def restringir(self, posicoes, codigos):
+        """Mantém apenas as posições cujo código está entre os informados"""
+        # Tabela com uma posição extra (falsa) para o código -1 de valores ausentes
+        tabela = np.zeros(len(self.categorias) + 1, dtype=bool)
+        tabela[codigos] = True
+        return posicoes[tabela[self._codigos_em(posicoes)]]
+
+
+class IndiceInvertido:
+    """Conjunto de dimensões indexadas de um DataFrame"""
+
+    def __init__(self, df, colunas=DIMENSOES_INDICE, ordens=None, contagens=None):
+        """`ordens`/`contagens` reaproveitam o que já foi calculado (ex.: lido do snapshot)"""
+        from datetime import datetime
+
+        inicio = datetime.now()
+        ordens = ordens or {}
+        contagens = contagens or {}
+        self.total_linhas = len(df)
+        self.dimensoes = {
+            col: DimensaoIndexada(df[col], ordem=ordens.get(col), contagens=contagens.get(col))
+            for col in colunas if col in df.columns
+        }
+        duracao = (datetime.now() - inicio).total_seconds()
+        logger.info(f"Índice invertido construído ({', '.join(self.dimensoes)}) em {duracao:.2f}s")
+
+    def ordens(self):
+        """Ordenações por dimensão, para persistir junto com o snapshot"""
+        return {col: dimensao.ordem for col, dimensao in self.dimensoes.items()}
+
+    def contagens(self):
+        """Linhas por código em cada dimensão, para persistir junto com o snapshot"""
+        return {col: dimensao.contagens.tolist() for col, dimensao in self.dimensoes.items()}
+
+    def filtrar(self, filtros):
+        """
+        Aplica filtros {coluna: (termo, exato)} e retorna as posições ordenadas.
+        Retorna None quando nenhum filtro foi informado (todas as linhas).
+        """
+        candidatos = []
+        for coluna, (termo, exato) in filtros.items():
+            if termo is None or termo == "":
+                continue
+            dimensao = self.dimensoes.get(coluna)
+            if dimensao is None:
+                raise ValueError(f"Coluna '{coluna}' não indexada")
+            codigos = dimensao.codigos_correspondentes(termo, exato=exato)
+            candidatos.append((dimensao.estimar(codigos), dimensao, codigos))
+
+        if not candidatos:
+            return None
+
+        # Mais seletiva primeiro: as demais só verificam as posições restantes
+        candidatos.sort(key=lambda c: c[0])
+        _, dimensao, codigos = candidatos[0]
+        posicoes = dimensao.posicoes(codigos)
+        for _, dimensao, codigos in candidatos[1:]:
+            if len(posicoes) == 0:
+                break
+            posicoes = dimensao.restringir(posicoes, codigos)
+        return posicoes
+
+    def get_memory_usage(self):
+        total = sum(d.ordem.nbytes + d.inicios.nbytes for d in self.dimensoes.values())
+        return round(total / 1024 / 1024, 2)
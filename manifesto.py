@@ -0,0 +1,203 @@
+"""
+Manifesto do cache Parquet por arquivo de origem (cache/manifest.json).
+
+Cada entrada registra o sha256 do conteúdo da fonte, a versão do schema
+(COLUMN_NAMES e dtypes) e a versão do código de processamento usados para
+gerar o Parquet. A chave do cache deriva dos três: só é reprocessado o
+arquivo cujas entradas realmente mudaram.
+
+Relatório sem carregar os dados (o que seria hit/miss/rebuild):
+
+    python manifesto.py
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+MANIFESTO_ARQUIVO = "manifest.json"
+MANIFESTO_FORMATO = 1
+
+# Extensões das fontes aceitas em 'dados' (removidas no nome do Parquet)
+EXTENSOES_FONTE = [".xlsx", ".csv.xz", ".csv.gz"]
+
+
+def hash_conteudo(caminho, bloco=1024 * 1024):
+    """sha256 do conteúdo do arquivo"""
+    digest = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for parte in iter(lambda: f.read(bloco), b""):
+            digest.update(parte)
+    return digest.hexdigest()
+
+
+class ManifestoCache:
+    """Entradas do cache por arquivo de origem e relatório da última carga"""
+
+    def __init__(self, pasta, versao_schema, versao_codigo):
+        self.pasta = pasta
+        self.caminho = os.path.join(pasta, MANIFESTO_ARQUIVO)
+        self.versao_schema = versao_schema
+        self.versao_codigo = versao_codigo
+        self.entradas = self._ler()
+        self.relatorio = {}
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def _ler(self):
+        try:
+            with open(self.caminho, encoding="utf-8") as f:
+                conteudo = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if conteudo.get("formato") != MANIFESTO_FORMATO:
+            return {}
+        return conteudo.get("arquivos", {})
+
+    def hash_fonte(self, caminho_fonte):
+        """sha256 da fonte; reaproveita o do manifesto se tamanho e mtime não mudaram"""
+        nome = os.path.basename(caminho_fonte)
+        stat = os.stat(caminho_fonte)
+        assinatura = (stat.st_size, stat.st_mtime_ns)
+        if nome in self._hashes and self._hashes[nome][0] == assinatura:
+            return self._hashes[nome][1]
+
+        entrada = self.entradas.get(nome)
+        if entrada and (entrada.get("tamanho"), entrada.get("mtime_ns")) == assinatura:
+            sha = entrada["fonte_sha256"]
+        else:
+            sha = hash_conteudo(caminho_fonte)
+        self._hashes[nome] = (assinatura, sha)
+        return sha
+
+    def chave(self, sha):
+        """Chave do cache: conteúdo da fonte + schema + código de processamento"""
+        base = f"{sha}|{self.versao_schema}|{self.versao_codigo}"
+        return hashlib.sha256(base.encode()).hexdigest()[:16]
+
+    def caminho_cache(self, caminho_fonte, chave):
+        """Parquet endereçado pela chave: 'BancoVDE 2024-<chave>.parquet'"""
+        nome = os.path.basename(caminho_fonte)
+        for extensao in EXTENSOES_FONTE:
+            if nome.endswith(extensao):
+                nome = nome[: -len(extensao)]
+                break
+        return os.path.join(self.pasta, f"{nome}-{chave}.parquet")
+
+    def verificar(self, caminho_fonte):
+        """Retorna (status, motivo, chave) com status 'hit', 'miss' ou 'rebuild'"""
+        nome = os.path.basename(caminho_fonte)
+        sha = self.hash_fonte(caminho_fonte)
+        chave = self.chave(sha)
+        entrada = self.entradas.get(nome)
+
+        if entrada is None:
+            return "miss", "sem entrada no manifesto", chave
+        if entrada.get("chave") == chave:
+            if os.path.exists(self.caminho_cache(caminho_fonte, chave)):
+                return "hit", "fonte, schema e código inalterados", chave
+            return "miss", "arquivo de cache ausente", chave
+
+        motivos = []
+        if entrada.get("fonte_sha256") != sha:
+            motivos.append("fonte alterada")
+        if entrada.get("versao_schema") != self.versao_schema:
+            motivos.append("schema alterado")
+        if entrada.get("versao_codigo") != self.versao_codigo:
+            motivos.append("código de processamento alterado")
+        return "rebuild", ", ".join(motivos) or "chave divergente", chave
+
+    def atualizar(self, caminho_fonte, chave, registros):
+        """Registra o Parquet recém-gravado e remove o da chave anterior"""
+        from datetime import datetime
+        nome = os.path.basename(caminho_fonte)
+        caminho_cache = self.caminho_cache(caminho_fonte, chave)
+        (tamanho, mtime_ns), sha = self._hashes[nome]
+        with self._lock:
+            anterior = self.entradas.get(nome, {}).get("cache")
+            self.entradas[nome] = {
+                "fonte_sha256": sha,
+                "tamanho": tamanho,
+                "mtime_ns": mtime_ns,
+                "versao_schema": self.versao_schema,
+                "versao_codigo": self.versao_codigo,
+                "chave": chave,
+                "cache": os.path.basename(caminho_cache),
+                "registros": registros,
+                "atualizado_em": datetime.now().isoformat(timespec="seconds"),
+            }
+        if anterior and anterior != os.path.basename(caminho_cache):
+            self._remover_cache(anterior)
+
+    def registrar_resultado(self, caminho_fonte, status, motivo, duracao=None, registros=None, medidas=None):
+        """Resultado da fonte na carga; `medidas` traz os tempos por etapa e os bytes lidos"""
+        nome = os.path.basename(caminho_fonte)
+        entrada = {
+            "arquivo": nome,
+            "status": status,
+            "motivo": motivo,
+            "registros": registros,
+            "duracao_s": round(duracao, 3) if duracao is not None else None,
+        }
+        for chave, valor in (medidas or {}).items():
+            if chave == "etapas":
+                entrada["etapas"] = {etapa: round(s, 3) for etapa, s in valor.items()}
+            elif chave != "duracao_s":
+                entrada[chave] = valor
+        with self._lock:
+            self.relatorio[nome] = entrada
+
+    def podar(self, caminhos_fontes):
+        """Descarta entradas (e Parquets) de fontes que não existem mais"""
+        atuais = {os.path.basename(f) for f in caminhos_fontes}
+        with self._lock:
+            removidas = [nome for nome in self.entradas if nome not in atuais]
+            for nome in removidas:
+                self._remover_cache(self.entradas.pop(nome).get("cache"))
+        if removidas:
+            logger.info(f"Manifesto: {len(removidas)} entradas de fontes removidas descartadas")
+
+    def _remover_cache(self, nome_cache):
+        if not nome_cache:
+            return
+        try:
+            os.remove(os.path.join(self.pasta, nome_cache))
+        except OSError:
+            pass
+
+    def salvar(self):
+        """Grava o manifesto (escrita atômica via arquivo temporário)"""
+        with self._lock:
+            conteudo = {"formato": MANIFESTO_FORMATO, "arquivos": self.entradas}
+            temporario = f"{self.caminho}.tmp"
+            with open(temporario, "w", encoding="utf-8") as f:
+                json.dump(conteudo, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(temporario, self.caminho)
+
+    def resumo(self):
+        """Relatório da última carga por arquivo e contagem por status"""
+        arquivos = sorted(self.relatorio.values(), key=lambda r: r["arquivo"])
+        contagem = {}
+        for item in arquivos:
+            contagem[item["status"]] = contagem.get(item["status"], 0) + 1
+        return {
+            "versao_schema": self.versao_schema,
+            "versao_codigo": self.versao_codigo,
+            "totais": contagem,
+            "arquivos": arquivos,
+        }
+
+
+if __name__ == "__main__":
+    import glob
+    from data_handler import DATA_FOLDER, CACHE_FOLDER, CACHE_SCHEMA_VERSION, PROCESSING_VERSION
+
+    manifesto = ManifestoCache(CACHE_FOLDER, CACHE_SCHEMA_VERSION, PROCESSING_VERSION)
+    fontes = sorted(f for ext in EXTENSOES_FONTE for f in glob.glob(os.path.join(DATA_FOLDER, f"*{ext}")))
+    print(f"schema {CACHE_SCHEMA_VERSION} · código {PROCESSING_VERSION} · {len(fontes)} arquivos")
+    for fonte in fontes:
+        status, motivo, chave = manifesto.verificar(fonte)
+        print(f"{status:<8} {os.path.basename(fonte):<30} {chave}  {motivo}")
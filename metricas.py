@@ -0,0 +1,247 @@
+"""
+Métricas da API no formato texto do Prometheus (GET /metrics).
+
+O middleware registra, por rota (o caminho declarado, ex. '/resumo/armas'):
+latência, tamanho das respostas, requisições por status e erros, além das
+requisições em andamento. Dentro do handler e das consultas, blocos
+marcados com `fase("filtro")`, `fase("agregacao")`, `fase("leitura")` (partições
+em disco) ou `fase("serializacao")` são cronometrados e somados à rota da
+requisição corrente (contextvars, que acompanham a requisição também nas
+threads dos pools).
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LIMITES_TAMANHO = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+ROTA_DESCONHECIDA = "desconhecida"
+FORA_DE_REQUISICAO = "-"
+
+# Fases da requisição corrente: {"fase": segundos}
+_fases_requisicao = contextvars.ContextVar("fases_requisicao", default=None)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _rotulos(nomes, valores, extra=""):
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor):
+    if isinstance(valor, float):
+        return repr(valor) if valor != int(valor) else str(int(valor))
+    return str(valor)
+
+
+class Contador:
+    """Contador monotônico por combinação de rótulos"""
+
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, *valores, quantidade=1):
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + quantidade
+
+    def linhas(self):
+        with self._lock:
+            itens = sorted(self._valores.items())
+        return [f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(valor)}" for chave, valor in itens]
+
+
+class Medidor(Contador):
+    """Valor que sobe e desce (ex.: requisições em andamento)"""
+
+    tipo = "gauge"
+
+    def decrementar(self, *valores, quantidade=1):
+        self.incrementar(*valores, quantidade=-quantidade)
+
+
+class Histograma:
+    """Histograma cumulativo (buckets + soma + contagem) por combinação de rótulos"""
+
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), limites=LIMITES_LATENCIA):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.limites = tuple(limites)
+        self._series = {}  # rótulos -> [contagens por bucket..., soma, total]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *valores):
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [0] * len(self.limites) + [0.0, 0]
+            for i, limite in enumerate(self.limites):
+                if valor <= limite:
+                    serie[i] += 1
+                    break
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def linhas(self):
+        with self._lock:
+            itens = sorted((chave, list(serie)) for chave, serie in self._series.items())
+        saida = []
+        for chave, serie in itens:
+            acumulado = 0
+            for limite, contagem in zip(self.limites, serie):
+                acumulado += contagem
+                saida.append(f"{self.nome}_bucket{_rotulos(self.rotulos, chave, f'le="{_numero(float(limite))}"')} {acumulado}")
+            saida.append(f"{self.nome}_bucket{_rotulos(self.rotulos, chave, 'le="+Inf"')} {serie[-1]}")
+            saida.append(f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {round(serie[-2], 6)}")
+            saida.append(f"{self.nome}_count{_rotulos(self.rotulos, chave)} {serie[-1]}")
+        return saida
+
+
+REQUISICOES = Contador("sinesp_requisicoes_total", "Requisições atendidas", ("rota", "metodo", "status"))
+ERROS = Contador("sinesp_erros_total", "Respostas 5xx e exceções não tratadas", ("rota", "tipo"))
+EM_ANDAMENTO = Medidor("sinesp_requisicoes_em_andamento", "Requisições em processamento")
+LATENCIA = Histograma(
+    "sinesp_requisicao_duracao_segundos", "Tempo até o último byte da resposta", ("rota", "metodo")
+)
+TAMANHO = Histograma(
+    "sinesp_resposta_bytes", "Tamanho do corpo da resposta", ("rota",), limites=LIMITES_TAMANHO
+)
+FASES = Histograma(
+    "sinesp_fase_duracao_segundos", "Tempo das fases internas (filtro, agregação, serialização)", ("rota", "fase")
+)
+
+METRICAS = [REQUISICOES, ERROS, EM_ANDAMENTO, LATENCIA, TAMANHO, FASES]
+
+
+@contextmanager
+def fase(nome):
+    """Cronometra um bloco como fase da requisição corrente"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        fases = _fases_requisicao.get()
+        if fases is None:
+            FASES.observar(duracao, FORA_DE_REQUISICAO, nome)
+        else:
+            fases[nome] = fases.get(nome, 0.0) + duracao
+
+
+class MiddlewareMetricas:
+    """Middleware ASGI que alimenta as métricas por rota"""
+
+    def __init__(self, app):
+        self.app = app
+        self._rotas = None  # endpoint -> caminho declarado
+
+    def _rota(self, scope):
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            # Respondida antes do roteador (304 do ETag, resposta já comprimida em cache)
+            return self._rota_pelo_caminho(scope)
+        if self._rotas is None or endpoint not in self._rotas:
+            app = scope.get("app")
+            rotas = getattr(app, "routes", [])
+            self._rotas = {getattr(r, "endpoint", None): r.path for r in rotas if hasattr(r, "path")}
+        return self._rotas.get(endpoint, ROTA_DESCONHECIDA)
+
+    @staticmethod
+    def _rota_pelo_caminho(scope):
+        """Caminho declarado da rota que atenderia a requisição, casado como o roteador faz"""
+        from starlette.routing import Match
+
+        for rota in getattr(scope.get("app"), "routes", []):
+            correspondencia, _ = rota.matches(scope)
+            if correspondencia == Match.FULL and hasattr(rota, "path"):
+                return rota.path
+        return ROTA_DESCONHECIDA
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        fases = {}
+        token = _fases_requisicao.set(fases)
+        resposta = {"status": 500, "bytes": 0}
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                resposta["status"] = mensagem["status"]
+            elif mensagem["type"] == "http.response.body":
+                resposta["bytes"] += len(mensagem.get("body", b""))
+            await send(mensagem)
+
+        EM_ANDAMENTO.incrementar()
+        excecao = False
+        try:
+            await self.app(scope, receive, enviar)
+        except BaseException:
+            excecao = True
+            raise
+        finally:
+            EM_ANDAMENTO.decrementar()
+            _fases_requisicao.reset(token)
+            duracao = time.perf_counter() - inicio
+            rota = self._rota(scope)
+            status = resposta["status"]
+            REQUISICOES.incrementar(rota, scope["method"], str(status))
+            LATENCIA.observar(duracao, rota, scope["method"])
+            TAMANHO.observar(resposta["bytes"], rota)
+            if excecao:
+                ERROS.incrementar(rota, "excecao")
+            elif status >= 500:
+                ERROS.incrementar(rota, "5xx")
+            for nome, segundos in fases.items():
+                FASES.observar(segundos, rota, nome)
+
+
+def _medidores_externos():
+    """Estado do cache de resultados e dos pools, lido no momento da coleta"""
+    from cache_resultados import cache_resultados
+    from execucao import estatisticas_pools
+
+    cache = cache_resultados.estatisticas()
+    pools = estatisticas_pools()
+    familias = [
+        ("sinesp_cache_resultados_total", "counter",
+         [(f'{{evento="{chave}"}}', cache[chave]) for chave in ("hits", "misses", "evictions", "expiradas", "invalidadas")]),
+        ("sinesp_cache_resultados_entradas", "gauge", [("", cache["entradas"])]),
+        ("sinesp_cache_resultados_bytes", "gauge", [("", int(cache["memoria_mb"] * 1024 * 1024))]),
+        ("sinesp_pool_ocupados", "gauge", [(f'{{pool="{nome}"}}', pool["ocupados"]) for nome, pool in pools.items()]),
+        ("sinesp_pool_rejeitadas_total", "counter",
+         [(f'{{pool="{nome}"}}', pool["rejeitadas"]) for nome, pool in pools.items()]),
+    ]
+    linhas = []
+    for nome, tipo, amostras in familias:
+        linhas.append(f"# TYPE {nome} {tipo}")
+        linhas.extend(f"{nome}{rotulos} {valor}" for rotulos, valor in amostras)
+    return linhas
+
+
+def exportar():
+    """Todas as métricas no formato de exposição texto do Prometheus (0.0.4)"""
+    linhas = []
+    for metrica in METRICAS:
+        linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+        linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+        linhas.extend(metrica.linhas())
+    linhas.extend(_medidores_externos())
+    return "\n".join(linhas) + "\n"
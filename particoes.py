@@ -0,0 +1,343 @@
+"""
+Armazenamento particionado em disco, para containers com pouca memória.
+
+Com SINESP_ARMAZENAMENTO=particionado o frame completo não fica em memória.
+Na carga, cada arquivo de origem é lido sozinho e gravado em Parquet no
+layout Hive `ano=AAAA/uf=XX/parte-NNN.parquet`. Dele também sai um cubo
+parcial. Os cubos parciais são somados no cubo agregado, que continua
+respondendo resumos, estatísticas e rankings em memória.
+
+Nas consultas de linhas brutas (/ocorrencias, /series fora do cubo,
+/download), os filtros viram uma expressão do pyarrow.dataset:
+- `ano` e `uf` descartam partições inteiras sem abrir os arquivos;
+- os demais filtros leem só as colunas necessárias das partições restantes.
+Os termos são resolvidos para os valores exatos pelo índice das tabelas do
+cubo, com a mesma semântica (trecho do nome, sem acento/caixa) do modo em
+memória. As partes lidas para montar registros ficam num cache LRU limitado
+em MB (partições quentes).
+
+O id de um registro é a sua posição na ordem das partes: por arquivo de
+origem, depois por ano e UF. Ele continua estável entre requisições da mesma
+versão dos dados.
+
+Configuração por ambiente:
+    SINESP_ARMAZENAMENTO         memoria (padrão) ou particionado
+    SINESP_PARTICOES_CACHE_MB    memória das partições quentes (padrão 64)
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import snapshot
+from metricas import fase
+
+logger = logging.getLogger(__name__)
+
+ARMAZENAMENTO = os.environ.get("SINESP_ARMAZENAMENTO", "memoria").strip().lower()
+PARTICOES_CACHE_MB = float(os.environ.get("SINESP_PARTICOES_CACHE_MB", "64"))
+
+PARTICOES_FOLDER = "particoes"  # subpasta de CACHE_FOLDER
+METADADOS_FILE = "particoes.json"
+COLUNAS_PARTICAO = ("ano", "uf")
+PARTICAO_NULA = "__HIVE_DEFAULT_PARTITION__"
+COLUNA_ID = "_id"
+VERSOES_MANTIDAS = 2
+
+
+def particionado():
+    """O modo de armazenamento configurado é o particionado"""
+    return ARMAZENAMENTO == "particionado"
+
+
+def pasta_versao(cache_folder, versao_dados):
+    return os.path.join(cache_folder, PARTICOES_FOLDER, versao_dados[:12])
+
+
+def _esquema_particao():
+    import pyarrow as pa
+    return pa.schema([("ano", pa.int16()), ("uf", pa.string())])
+
+
+class GravadorParticoes:
+    """Grava os frames dos arquivos de origem, um por vez, nas partições ano/uf"""
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+        self.temporaria = f"{pasta}.tmp"
+        shutil.rmtree(self.temporaria, ignore_errors=True)
+        os.makedirs(self.temporaria)
+        self.partes = []
+        self.arquivos = {}
+        self.colunas = None
+        self.total_registros = 0
+
+    def adicionar(self, indice_arquivo, nome_arquivo, df):
+        """Grava as linhas do frame agrupadas por (ano, uf); os ids seguem a ordem de gravação"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.colunas is None:
+            self.colunas = list(df.columns)
+        elif list(df.columns) != self.colunas:
+            df = df.reindex(columns=self.colunas)
+
+        grupos = df.groupby(list(COLUNAS_PARTICAO), observed=True, dropna=False, sort=True).indices
+        for (ano, uf), posicoes in sorted(grupos.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+            uf = None if uf is None or uf != uf else str(uf)
+            relativo = os.path.join(
+                f"ano={int(ano)}", f"uf={PARTICAO_NULA if uf is None else uf}", f"parte-{indice_arquivo:03d}.parquet"
+            )
+            bloco = df.take(posicoes).drop(columns=list(COLUNAS_PARTICAO))
+            tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+            # Índices de dicionário com a mesma largura em todas as partes (schema único no dataset)
+            campos = [
+                campo.with_type(pa.dictionary(pa.int32(), campo.type.value_type))
+                if pa.types.is_dictionary(campo.type) else campo
+                for campo in tabela.schema
+            ]
+            tabela = tabela.cast(pa.schema(campos, metadata=tabela.schema.metadata))
+            ids = np.arange(self.total_registros, self.total_registros + len(posicoes), dtype=np.int64)
+            tabela = tabela.append_column(COLUNA_ID, pa.array(ids))
+
+            os.makedirs(os.path.join(self.temporaria, os.path.dirname(relativo)), exist_ok=True)
+            pq.write_table(tabela, os.path.join(self.temporaria, relativo), compression="zstd")
+            self.partes.append({
+                "caminho": relativo, "ano": int(ano), "uf": uf,
+                "inicio": self.total_registros, "registros": len(posicoes),
+            })
+            self.total_registros += len(posicoes)
+        self.arquivos[nome_arquivo] = len(df)
+
+    def finalizar(self, versao_dados, cubo):
+        """Grava o cubo e os metadados e publica a pasta da versão (troca atômica)"""
+        metadados = {"versao_dados": versao_dados}
+        snapshot.salvar_tabela(os.path.join(self.temporaria, "cubo.arrow"), cubo.celulas, metadados)
+        snapshot.salvar_tabela(os.path.join(self.temporaria, "municipios.arrow"), cubo.municipios, metadados)
+        with open(os.path.join(self.temporaria, METADADOS_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                **metadados,
+                "colunas": self.colunas,
+                "total_registros": self.total_registros,
+                "arquivos": self.arquivos,
+                "partes": self.partes,
+            }, f, ensure_ascii=False)
+
+        shutil.rmtree(self.pasta, ignore_errors=True)
+        os.replace(self.temporaria, self.pasta)
+        _podar_versoes(os.path.dirname(self.pasta), manter=os.path.basename(self.pasta))
+        logger.info(f"Partições gravadas em '{self.pasta}': {len(self.partes)} partes, {self.total_registros:,} registros")
+
+    def descartar(self):
+        shutil.rmtree(self.temporaria, ignore_errors=True)
+
+
+def _podar_versoes(pasta, manter):
+    """Remove as pastas de versões antigas (fica a atual e a anterior, ainda em uso durante a recarga)"""
+    try:
+        versoes = [
+            os.path.join(pasta, nome) for nome in os.listdir(pasta)
+            if nome != manter and not nome.endswith(".tmp") and os.path.isdir(os.path.join(pasta, nome))
+        ]
+    except OSError:
+        return
+    versoes.sort(key=os.path.getmtime, reverse=True)
+    for antiga in versoes[VERSOES_MANTIDAS - 1:]:
+        shutil.rmtree(antiga, ignore_errors=True)
+
+
+def abrir(pasta, versao_dados):
+    """ArmazemParticionado da versão, ou None se as partições não existem ou são de outra versão"""
+    from cubo import CuboAgregado
+
+    try:
+        with open(os.path.join(pasta, METADADOS_FILE), encoding="utf-8") as f:
+            metadados = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if metadados.get("versao_dados") != versao_dados:
+        return None
+    try:
+        cubo = CuboAgregado.de_tabelas(
+            snapshot.carregar_tabela(os.path.join(pasta, "cubo.arrow")),
+            snapshot.carregar_tabela(os.path.join(pasta, "municipios.arrow")),
+        )
+    except Exception as e:
+        logger.warning(f"Erro lendo o cubo das partições: {e}")
+        return None
+    return ArmazemParticionado(pasta, metadados, cubo)
+
+
+def _distintos(serie):
+    """Valores distintos como tipos nativos (None para ausente)"""
+    import pandas as pd
+    return [None if pd.isna(v) else v for v in pd.unique(serie.to_numpy()).tolist()]
+
+
+class ArmazemParticionado:
+    """Linhas brutas lidas das partições Parquet sob demanda, com cache LRU das partes quentes"""
+
+    def __init__(self, pasta, metadados, cubo, cache_mb=PARTICOES_CACHE_MB):
+        self.pasta = pasta
+        self.metadados = metadados
+        self.cubo = cubo
+        self.partes = metadados["partes"]
+        self.inicios = np.array([p["inicio"] for p in self.partes], dtype=np.int64)
+        self.limite_bytes = cache_mb * 1024 * 1024
+        self._dataset = None
+        self._cache = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.leituras = 0
+
+    @property
+    def total_registros(self):
+        return self.metadados["total_registros"]
+
+    @property
+    def colunas(self):
+        return list(self.metadados["colunas"])
+
+    @property
+    def dataset(self):
+        if self._dataset is None:
+            import pyarrow.dataset as ds
+            with self._lock:
+                if self._dataset is None:
+                    self._dataset = ds.dataset(
+                        [os.path.join(self.pasta, p["caminho"]) for p in self.partes],
+                        format="parquet",
+                        partitioning=ds.partitioning(_esquema_particao(), flavor="hive"),
+                        partition_base_dir=self.pasta,
+                    )
+        return self._dataset
+
+    def _resolver(self, coluna, termo, exato):
+        """Células do cubo (coluna, ano e uf) que atendem ao termo, pelo índice da tabela do cubo"""
+        nome = "celulas" if coluna in self.cubo.celulas.columns else "municipios"
+        consulta = self.cubo._consulta(nome)
+        if coluna not in consulta.indice.dimensoes:
+            raise ValueError(f"Filtro por {coluna} não disponível no armazenamento particionado")
+        posicoes = consulta.indice.filtrar({coluna: (termo, exato)})
+        return consulta.df[list(dict.fromkeys([coluna, *COLUNAS_PARTICAO]))].take(posicoes)
+
+    def _expressao(self, filtros):
+        """
+        Expressão do dataset para filtros {coluna: (termo, exato)}; None sem filtro, False sem resultado.
+        Cada termo vira a lista dos valores exatos que o atendem. Para colunas fora da partição,
+        os anos e UFs em que esses valores aparecem no cubo também entram na expressão:
+        as partições sem nenhum deles não são abertas.
+        """
+        import pyarrow.dataset as ds
+
+        condicoes = []
+        for coluna, (termo, exato) in filtros.items():
+            if termo is None or termo == "":
+                continue
+            celulas = self._resolver(coluna, termo, exato)
+            if celulas.empty:
+                return False
+            for nome in dict.fromkeys([coluna, *COLUNAS_PARTICAO]):
+                valores = _distintos(celulas[nome])
+                if None not in valores:
+                    condicoes.append(ds.field(nome).isin(valores))
+        if not condicoes:
+            return None
+        expressao = condicoes[0]
+        for condicao in condicoes[1:]:
+            expressao = expressao & condicao
+        return expressao
+
+    def filtrar(self, filtros):
+        """
+        Aplica filtros {coluna: (termo, exato)} e retorna os ids ordenados (como IndiceInvertido.filtrar).
+        Retorna None quando nenhum filtro foi informado (todas as linhas).
+        """
+        expressao = self._expressao(filtros)
+        if expressao is None:
+            return None
+        if expressao is False:
+            return np.empty(0, dtype=np.int64)
+        tabela = self.dataset.to_table(columns=[COLUNA_ID], filter=expressao)
+        return np.sort(tabela.column(COLUNA_ID).to_numpy())
+
+    def somar_por(self, filtros, coluna, medida, agregacao):
+        """
+        Soma da medida por valor da coluna, lendo só essas duas colunas das partições filtradas;
+        a soma é do backend de agregação (agregacao.py).
+        """
+        import pandas as pd
+
+        expressao = self._expressao(filtros)
+        if expressao is False:
+            return pd.Series(dtype="float64")
+        return agregacao.somar_particoes(self.dataset, expressao, coluna, medida)
+
+    def _ler_parte(self, indice):
+        """Frame de uma parte com as colunas de partição restauradas na ordem original"""
+        import pandas as pd
+        import pyarrow.parquet as pq
+
+        parte = self.partes[indice]
+        # ParquetFile: lê só o arquivo, sem inferir partições Hive pelo caminho
+        df = pq.ParquetFile(os.path.join(self.pasta, parte["caminho"])).read().to_pandas()
+        df = df.drop(columns=[COLUNA_ID])
+        df["ano"] = np.full(len(df), parte["ano"], dtype="int16")
+        df["uf"] = pd.Categorical([parte["uf"]] * len(df))
+        return df[self.colunas]
+
+    def _parte(self, indice):
+        with self._lock:
+            if indice in self._cache:
+                self._cache.move_to_end(indice)
+                self.acertos += 1
+                return self._cache[indice][0]
+
+        df = self._ler_parte(indice)
+        tamanho = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            self.leituras += 1
+            if indice not in self._cache:
+                self._cache[indice] = (df, tamanho)
+                self._bytes += tamanho
+            while len(self._cache) > 1 and self._bytes > self.limite_bytes:
+                _, (_, removido) = self._cache.popitem(last=False)
+                self._bytes -= removido
+        return df
+
+    def linhas(self, ids):
+        """Linhas dos ids informados, na ordem informada"""
+        from data_handler import concatenar_frames
+
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return self._parte(0).iloc[0:0] if self.partes else None
+        indices = np.searchsorted(self.inicios, ids, side="right") - 1
+        # Trechos consecutivos de ids na mesma parte
+        cortes = np.flatnonzero(np.diff(indices)) + 1
+        frames = []
+        with fase("leitura"):
+            for trecho_ids, trecho_partes in zip(np.split(ids, cortes), np.split(indices, cortes)):
+                indice = int(trecho_partes[0])
+                frames.append(self._parte(indice).take(trecho_ids - self.partes[indice]["inicio"]))
+        return concatenar_frames(frames) if len(frames) > 1 else frames[0].reset_index(drop=True)
+
+    def arquivos(self):
+        """Registros por arquivo de origem"""
+        return dict(self.metadados.get("arquivos", {}))
+
+    def get_memory_usage(self):
+        with self._lock:
+            return {
+                "partes": len(self.partes),
+                "partes_em_cache": len(self._cache),
+                "cache_mb": round(self._bytes / 1024 / 1024, 2),
+                "limite_mb": round(self.limite_bytes / 1024 / 1024, 2),
+                "acertos": self.acertos,
+                "leituras": self.leituras,
+            }
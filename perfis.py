@@ -0,0 +1,174 @@
+"""
+Perfilamento sob demanda das consultas pesadas (cProfile).
+
+Desativado por padrão e sem custo quando desligado: só é considerado se
+SINESP_PERFIL_TOKEN ou SINESP_PERFIL_AMOSTRA estiverem configurados.
+
+- Sob demanda: a requisição envia o token no cabeçalho `X-Sinesp-Perfil`
+  (ou no parâmetro `perfil`). A rota roda sob o cProfile, ignorando o cache
+  de resultados, e a resposta traz `X-Perfil-Id`; o perfil fica em
+  GET /debug/perfis/{id}.
+- Amostragem: uma fração SINESP_PERFIL_AMOSTRA (0 a 1) das consultas é
+  perfilada e guardada no mesmo buffer circular (SINESP_PERFIL_BUFFER perfis).
+
+Só um perfil roda por vez (o cProfile é global ao interpretador); se outro
+estiver ativo, a requisição segue sem perfil. Em Python 3.12+ o cProfile
+também registra chamadas de outras threads que rodarem no mesmo intervalo.
+Respostas em streaming são perfiladas até a montagem da resposta (filtro e
+posições), não durante o envio dos blocos.
+"""
+import contextvars
+import hmac
+import io
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+PERFIL_TOKEN = os.environ.get("SINESP_PERFIL_TOKEN") or None
+PERFIL_AMOSTRA = float(os.environ.get("SINESP_PERFIL_AMOSTRA", "0"))
+PERFIL_BUFFER = int(os.environ.get("SINESP_PERFIL_BUFFER", "20"))
+PERFIL_FUNCOES = 30  # funções listadas por perfil
+
+CABECALHO_TOKEN = "x-sinesp-perfil"
+PARAMETRO_TOKEN = "perfil"
+
+# Verdadeiro durante a execução de uma rota perfilada (o cache de resultados é ignorado)
+_perfilando = contextvars.ContextVar("perfilando", default=False)
+
+_perfis = deque(maxlen=max(1, PERFIL_BUFFER))
+_ids = itertools.count(1)
+_lock_perfis = threading.Lock()
+_lock_profiler = threading.Lock()
+
+
+def habilitado():
+    return PERFIL_TOKEN is not None or PERFIL_AMOSTRA > 0
+
+
+def token_valido(request):
+    """Token de administrador no cabeçalho ou na query"""
+    if PERFIL_TOKEN is None or request is None:
+        return False
+    enviado = request.headers.get(CABECALHO_TOKEN) or request.query_params.get(PARAMETRO_TOKEN)
+    return bool(enviado) and hmac.compare_digest(enviado, PERFIL_TOKEN)
+
+
+def modo_perfil(request):
+    """'sob_demanda', 'amostra' ou None (requisição não perfilada)"""
+    if not habilitado():
+        return None
+    if token_valido(request):
+        return "sob_demanda"
+    if PERFIL_AMOSTRA > 0 and random.random() < PERFIL_AMOSTRA:
+        return "amostra"
+    return None
+
+
+def perfilando():
+    return _perfilando.get()
+
+
+def _nome_funcao(chave):
+    arquivo, linha, nome = chave
+    if arquivo == "~":
+        return nome
+    return f"{arquivo}:{linha}({nome})"
+
+
+def _resumir(profiler, limite=PERFIL_FUNCOES):
+    """Funções por tempo acumulado, destacando as chamadas ao pandas"""
+    import pstats
+
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    linhas = []
+    for chave, (_, chamadas, proprio, acumulado, _) in stats.stats.items():
+        linhas.append({
+            "funcao": _nome_funcao(chave),
+            "chamadas": chamadas,
+            "tempo_proprio_s": round(proprio, 6),
+            "tempo_acumulado_s": round(acumulado, 6),
+        })
+    linhas.sort(key=lambda l: l["tempo_acumulado_s"], reverse=True)
+    pandas = [l for l in linhas if f"{os.sep}pandas{os.sep}" in l["funcao"]]
+    return {
+        "chamadas_totais": stats.total_calls,
+        "funcoes": linhas[:limite],
+        "pandas": {
+            "tempo_proprio_s": round(sum(l["tempo_proprio_s"] for l in pandas), 6),
+            "funcoes": pandas[:limite],
+        },
+    }
+
+
+def executar_perfilado(func, modo, *args, **kwargs):
+    """
+    Roda a rota sob o cProfile e guarda o perfil no buffer.
+    Retorna (resultado, id do perfil ou None se outro perfil estava ativo).
+    """
+    import cProfile
+
+    if not _lock_profiler.acquire(blocking=False):
+        logger.info("Perfil ignorado: outro perfil em andamento")
+        return func(*args, **kwargs), None
+
+    perfil_id = next(_ids)
+    profiler = cProfile.Profile()
+    token = _perfilando.set(True)
+    inicio = time.perf_counter()
+    erro = None
+    try:
+        profiler.enable()
+        try:
+            return func(*args, **kwargs), perfil_id
+        except BaseException as e:
+            erro = repr(e)
+            raise
+        finally:
+            profiler.disable()
+            _perfilando.reset(token)
+            _guardar(perfil_id, profiler, modo, kwargs.get("request"), time.perf_counter() - inicio, erro)
+    finally:
+        _lock_profiler.release()
+
+
+def _guardar(perfil_id, profiler, modo, request, duracao, erro):
+    from datetime import datetime
+
+    parametros = {}
+    if request is not None:
+        # O token nunca é guardado junto com o perfil
+        parametros = {k: v for k, v in request.query_params.items() if k != PARAMETRO_TOKEN}
+    perfil = {
+        "id": perfil_id,
+        "modo": modo,
+        "rota": request.url.path if request is not None else None,
+        "parametros": parametros,
+        "inicio": datetime.now().isoformat(timespec="seconds"),
+        "duracao_s": round(duracao, 6),
+        "erro": erro,
+        **_resumir(profiler),
+    }
+    with _lock_perfis:
+        _perfis.append(perfil)
+    logger.info(f"Perfil {perfil_id} ({modo}) de {perfil['rota']}: {duracao:.3f}s")
+
+
+def listar_perfis():
+    """Perfis guardados (mais recentes primeiro), sem a lista de funções"""
+    with _lock_perfis:
+        perfis = list(_perfis)
+    return [
+        {chave: valor for chave, valor in p.items() if chave not in ("funcoes", "pandas")}
+        for p in reversed(perfis)
+    ]
+
+
+def obter_perfil(perfil_id):
+    with _lock_perfis:
+        return next((p for p in _perfis if p["id"] == perfil_id), None)
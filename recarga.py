@@ -0,0 +1,138 @@
+"""
+Recarga a quente dos arquivos de dados, sem reiniciar o processo.
+
+Uma thread verifica periodicamente a pasta de dados (nome, tamanho e mtime
+das fontes). Quando algo muda e o conteúdo fica estável, um novo
+SinespDataHandler é construído em segundo plano: o manifesto reaproveita o
+Parquet dos anos inalterados e só as fontes alteradas são reprocessadas.
+O novo handler substitui o atual de uma vez (utils.trocar_handler);
+requisições em andamento terminam com o handler que já tinham em mãos.
+O cache de resultados é indexado pela versão dos dados, então só as
+entradas da versão anterior são descartadas.
+
+Configuração por ambiente:
+    SINESP_RECARGA_INTERVALO  segundos entre verificações (padrão 60; 0 desativa)
+    SINESP_RECARGA_ESPERA     segundos sem mudança antes de recarregar (padrão 5)
+"""
+import glob
+import logging
+import os
+import threading
+import time
+
+from manifesto import EXTENSOES_FONTE
+
+logger = logging.getLogger(__name__)
+
+RECARGA_INTERVALO = float(os.environ.get("SINESP_RECARGA_INTERVALO", "60"))
+RECARGA_ESPERA = float(os.environ.get("SINESP_RECARGA_ESPERA", "5"))
+
+
+def assinatura_pasta(pasta):
+    """{arquivo: (tamanho, mtime_ns)} das fontes na pasta"""
+    assinatura = {}
+    for extensao in EXTENSOES_FONTE:
+        for caminho in glob.glob(os.path.join(pasta, f"*{extensao}")):
+            try:
+                stat = os.stat(caminho)
+            except OSError:
+                continue
+            assinatura[os.path.basename(caminho)] = (stat.st_size, stat.st_mtime_ns)
+    return assinatura
+
+
+class MonitorDados:
+    """Observa a pasta de dados e troca o handler quando as fontes mudam"""
+
+    def __init__(self, pasta, construir, atual, trocar, intervalo=RECARGA_INTERVALO, espera=RECARGA_ESPERA):
+        self.pasta = pasta
+        self.construir = construir  # () -> novo handler
+        self.atual = atual  # () -> handler em uso
+        self.trocar = trocar  # (novo handler) -> None
+        self.intervalo = intervalo
+        self.espera = espera
+        self._assinatura = assinatura_pasta(pasta)
+        self._parar = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.estado = {
+            "ativo": False,
+            "intervalo_s": intervalo,
+            "verificacoes": 0,
+            "recargas": 0,
+            "ultima_verificacao": None,
+            "ultima_recarga": None,
+            "ultimo_erro": None,
+        }
+
+    def iniciar(self):
+        if self.intervalo <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._executar, name="recarga-dados", daemon=True)
+        self._thread.start()
+        self.estado["ativo"] = True
+        logger.info(f"Recarga a quente ativa: verificando '{self.pasta}' a cada {self.intervalo:g}s")
+
+    def parar(self):
+        self._parar.set()
+        self.estado["ativo"] = False
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                self.verificar()
+            except Exception as e:
+                self.estado["ultimo_erro"] = str(e)
+                logger.error(f"Erro na recarga dos dados: {e}")
+
+    def verificar(self):
+        """Uma verificação; retorna True se o handler foi trocado"""
+        from datetime import datetime
+
+        self.estado["verificacoes"] += 1
+        self.estado["ultima_verificacao"] = datetime.now().isoformat(timespec="seconds")
+        assinatura = assinatura_pasta(self.pasta)
+        if assinatura == self._assinatura:
+            return False
+
+        # Arquivo ainda sendo copiado: espera o tamanho/mtime estabilizarem
+        if self.espera > 0:
+            time.sleep(self.espera)
+            if assinatura_pasta(self.pasta) != assinatura:
+                logger.info("Fontes ainda mudando; recarga adiada para a próxima verificação")
+                return False
+
+        alteradas = sorted(
+            nome for nome in set(assinatura) | set(self._assinatura)
+            if assinatura.get(nome) != self._assinatura.get(nome)
+        )
+        return self.recarregar(assinatura, alteradas)
+
+    def recarregar(self, assinatura=None, alteradas=None):
+        """Constrói o novo handler e o coloca em uso (se a versão dos dados mudou)"""
+        from datetime import datetime
+
+        with self._lock:
+            assinatura = assinatura if assinatura is not None else assinatura_pasta(self.pasta)
+            logger.info(f"Fontes alteradas ({', '.join(alteradas or []) or 'verificação manual'}); recarregando...")
+            inicio = time.perf_counter()
+            novo = self.construir()
+            self._assinatura = assinatura
+            anterior = self.atual()
+            if anterior is not None and novo.versao_dados == anterior.versao_dados:
+                logger.info("Conteúdo das fontes inalterado; handler mantido")
+                return False
+
+            self.trocar(novo)
+            duracao = time.perf_counter() - inicio
+            self.estado["recargas"] += 1
+            self.estado["ultimo_erro"] = None
+            self.estado["ultima_recarga"] = {
+                "em": datetime.now().isoformat(timespec="seconds"),
+                "duracao_s": round(duracao, 3),
+                "arquivos_alterados": alteradas or [],
+                "versao_anterior": anterior.versao_dados if anterior is not None else None,
+                "versao_nova": novo.versao_dados,
+            }
+            logger.info(f"Dados recarregados em {duracao:.2f}s: versão {novo.versao_dados[:12]}")
+            return True
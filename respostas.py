@@ -0,0 +1,146 @@
+"""
+Respostas JSON da API serializadas com orjson.
+
+`RespostaJSON` é a classe de resposta padrão do app (api.py). Ela serializa
+nativamente escalares e arrays numpy, datas e timestamps, e converte `pd.NA`,
+`NaT`, NaN e infinitos em null. `RotaJSON` é a classe de rota dos routers:
+o dict devolvido pela rota vira `RespostaJSON` direto, sem a passagem do
+FastAPI pelo `jsonable_encoder`, que percorre a resposta valor a valor.
+
+Sem o pacote `orjson` instalado, o json da biblioteca padrão é usado com o
+mesmo tratamento de tipos (mesma saída, só mais lento).
+"""
+import functools
+import inspect
+import json
+import math
+
+import numpy as np
+from fastapi.routing import APIRoute
+from starlette.responses import JSONResponse, Response
+
+from metricas import fase
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    OPCOES_ORJSON = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _padrao(valor):
+    """Tipos fora do JSON nativo: numpy, pandas, datas, conjuntos"""
+    import datetime
+    from decimal import Decimal
+
+    import pandas as pd
+
+    if valor is pd.NA or valor is pd.NaT:
+        return None
+    if isinstance(valor, np.generic):
+        return _padrao_float(valor.item())
+    if isinstance(valor, np.ndarray):
+        return valor.tolist()
+    if isinstance(valor, (datetime.date, datetime.time)):
+        return valor.isoformat()
+    if isinstance(valor, (pd.Series, pd.Index)):
+        return valor.tolist()
+    if isinstance(valor, (set, frozenset)):
+        return list(valor)
+    if isinstance(valor, Decimal):
+        return float(valor)
+    raise TypeError(f"Tipo não serializável em JSON: {type(valor).__name__}")
+
+
+def _padrao_float(valor):
+    if isinstance(valor, float) and not math.isfinite(valor):
+        return None
+    return valor
+
+
+def _normalizar(valor):
+    """Cópia com chaves e valores em tipos nativos (caminho lento, só quando o rápido recusa)"""
+    if isinstance(valor, dict):
+        return {_chave(k): _normalizar(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_normalizar(v) for v in valor]
+    if isinstance(valor, float):
+        return _padrao_float(valor)
+    if valor is None or isinstance(valor, (str, int, bool)):
+        return valor
+    try:
+        return _normalizar(_padrao(valor))
+    except TypeError:
+        return valor
+
+
+def _chave(chave):
+    chave = _normalizar(chave)
+    if chave is None or isinstance(chave, (str, int, float, bool)):
+        return chave
+    return str(chave)
+
+
+def _dumps_padrao(conteudo):
+    return json.dumps(
+        conteudo, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_padrao
+    ).encode("utf-8")
+
+
+def dumps(conteudo):
+    """Bytes UTF-8 do JSON compacto de `conteudo`"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(conteudo, default=_padrao, option=OPCOES_ORJSON)
+        except orjson.JSONEncodeError:
+            # Chaves numpy/Timestamp em dicts: normaliza e tenta de novo
+            return orjson.dumps(_normalizar(conteudo), default=_padrao, option=OPCOES_ORJSON)
+    try:
+        return _dumps_padrao(conteudo)
+    except (TypeError, ValueError):
+        # Chaves numpy e NaN/infinito: normaliza (NaN vira null, como no orjson)
+        return _dumps_padrao(_normalizar(conteudo))
+
+
+class RespostaJSON(JSONResponse):
+    """JSONResponse serializada com orjson (ou json da biblioteca padrão)"""
+
+    def render(self, content):
+        with fase("serializacao"):
+            return dumps(content)
+
+
+def _responder(resultado):
+    if isinstance(resultado, Response):
+        return resultado
+    return RespostaJSON(resultado)
+
+
+def _sem_jsonable_encoder(func):
+    """Envolve a rota para devolver RespostaJSON pronta (o FastAPI não reprocessa Response)"""
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def rota_assincrona(*args, **kwargs):
+            return _responder(await func(*args, **kwargs))
+
+        return rota_assincrona
+
+    @functools.wraps(func)
+    def rota(*args, **kwargs):
+        return _responder(func(*args, **kwargs))
+
+    return rota
+
+
+class RotaJSON(APIRoute):
+    """
+    Rota cujo retorno vira RespostaJSON sem o jsonable_encoder.
+    Rotas com response_model ou status_code próprios seguem o caminho padrão do FastAPI.
+    """
+
+    def get_route_handler(self):
+        if self.response_model is None and self.status_code is None:
+            self.dependant.call = _sem_jsonable_encoder(self.dependant.call)
+        return super().get_route_handler()
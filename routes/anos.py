@@ -1,7 +1,8 @@
 from depends import Request,HTTPException
 from fastapi import APIRouter
+from respostas import RotaJSON
 from utils import check_handler, logger
-router = APIRouter()
+router = APIRouter(route_class=RotaJSON)
 
 
 @router.get("/anos", summary="Lista de anos disponíveis", tags=["Dados"])
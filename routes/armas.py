@@ -1,7 +1,8 @@
 from depends import Request,HTTPException
 from fastapi import APIRouter
+from respostas import RotaJSON
 from utils import safe_get_unique_values, logger
-router = APIRouter()
+router = APIRouter(route_class=RotaJSON)
 
 
 @router.get("/armas", summary="Lista de armas", tags=["Dimensões"])
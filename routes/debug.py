@@ -0,0 +1,31 @@
+from fastapi import APIRouter, HTTPException, Request
+from respostas import RotaJSON
+import perfis
+router = APIRouter(route_class=RotaJSON)
+
+
+def _exigir_admin(request: Request):
+    """Sem token válido (ou sem SINESP_PERFIL_TOKEN configurado) as rotas não existem"""
+    if not perfis.token_valido(request):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+@router.get("/debug/perfis", include_in_schema=False)
+def listar_perfis(request: Request):
+    """Perfis recentes (sob demanda e amostrados), mais recentes primeiro"""
+    _exigir_admin(request)
+    return {
+        "amostra": perfis.PERFIL_AMOSTRA,
+        "capacidade": perfis.PERFIL_BUFFER,
+        "perfis": perfis.listar_perfis(),
+    }
+
+
+@router.get("/debug/perfis/{perfil_id}", include_in_schema=False)
+def obter_perfil(request: Request, perfil_id: int):
+    """Funções por tempo acumulado e chamadas ao pandas de um perfil"""
+    _exigir_admin(request)
+    perfil = perfis.obter_perfil(perfil_id)
+    if perfil is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado (o buffer guarda só os mais recentes)")
+    return perfil
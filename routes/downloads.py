@@ -1,75 +1,118 @@
 
 import json
-import os
-import tempfile
+import zlib
 from typing import Optional
+from urllib.parse import quote
+import numpy as np
 import pandas as pd
 from fastapi import APIRouter, HTTPException, Query, Request
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
+from consulta import FiltroConsulta
+from respostas import RotaJSON
+from serializacao import linhas_json
+from execucao import consulta_pesada
+from metricas import fase
 from utils import check_handler, logger
 
-router = APIRouter()
+router = APIRouter(route_class=RotaJSON)
+
+# Linhas por bloco na exportação em streaming (memória constante, independente do limit)
+TAMANHO_BLOCO = 5000
+
+
+def _posicoes_exportacao(current_handler, uf, municipio, evento, ano, limit):
+    """Posições das linhas exportadas, filtradas pelo índice invertido e já limitadas"""
+    filtro = FiltroConsulta(uf=uf, municipio=municipio, evento=evento, ano=ano or None)
+    posicoes = current_handler.consultas.posicoes(filtro)
+    if posicoes is None:
+        return np.arange(min(limit, current_handler.total_registros))
+    return posicoes[:limit]
+
+
+def _nome_arquivo(extensao, uf=None, municipio=None, evento=None, ano=None):
+    """Nome do arquivo baseado nos filtros"""
+    filename_parts = ["sinesp_vde"]
+    if uf:
+        filename_parts.append(f"uf_{uf}")
+    if municipio:
+        filename_parts.append(f"municipio_{municipio[:10]}")
+    if evento:
+        filename_parts.append(f"evento_{evento[:10]}")
+    if ano:
+        filename_parts.append(f"ano_{ano}")
+    return "_".join(filename_parts) + extensao
+
+
+def _content_disposition(filename):
+    """Cabeçalho de anexo; nomes com acento vão no formato RFC 5987 (como no FileResponse)"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def _blocos_csv(linhas, posicoes):
+    """Gera o CSV em blocos de linhas; `linhas(ids)` materializa cada bloco"""
+    for inicio in range(0, len(posicoes), TAMANHO_BLOCO):
+        with fase("serializacao"):
+            bloco = linhas(posicoes[inicio:inicio + TAMANHO_BLOCO])
+            dados = bloco.to_csv(index=False, header=inicio == 0).encode("utf-8")
+        yield dados
+
+
+def _blocos_json(linhas, posicoes, metadados):
+    """Documento JSON {"metadados", "dados"} gerado em blocos, uma linha por registro"""
+    yield ('{"metadados": ' + json.dumps(metadados, ensure_ascii=False) + ',\n"dados": [\n').encode("utf-8")
+    for inicio in range(0, len(posicoes), TAMANHO_BLOCO):
+        dados = linhas_json(linhas(posicoes[inicio:inicio + TAMANHO_BLOCO]))
+        separador = "" if inicio == 0 else ",\n"
+        yield (separador + ",\n".join(dados)).encode("utf-8")
+    yield b"\n]}\n"
+
+
+def _blocos_ndjson(linhas, posicoes):
+    """Um objeto JSON por linha (NDJSON), gerado em blocos"""
+    for inicio in range(0, len(posicoes), TAMANHO_BLOCO):
+        dados = linhas_json(linhas(posicoes[inicio:inicio + TAMANHO_BLOCO]))
+        yield ("\n".join(dados) + "\n").encode("utf-8")
+
+
+def _gzip(blocos):
+    """Comprime os blocos em gzip durante o envio"""
+    # wbits=31: fluxo zlib com cabeçalho e rodapé gzip
+    compressor = zlib.compressobj(wbits=31)
+    for dados in blocos:
+        dados = compressor.compress(dados)
+        if dados:
+            yield dados
+    yield compressor.flush()
 
 
 @router.get("/download/csv", summary="Exportar dados como CSV", tags=["Exportação"])
+@consulta_pesada("exportacao")
 def download_csv(
     request: Request,
     uf: Optional[str] = Query(None, description="Filtrar por UF"),
     municipio: Optional[str] = Query(None, description="Filtrar por município"),
     evento: Optional[str] = Query(None, description="Filtrar por tipo de evento"),
     ano: Optional[int] = Query(None, description="Filtrar por ano"),
-    limit: int = Query(10000, ge=1, le=50000, description="Limite de registros")
+    limit: int = Query(10000, ge=1, le=50000, description="Limite de registros"),
+    gzip: bool = Query(False, description="Comprimir o arquivo (.csv.gz)")
 ):
-    """Exporta os dados filtrados como arquivo CSV"""
+    """Exporta os dados filtrados como arquivo CSV, enviado em streaming"""
     try:
         current_handler = check_handler()
-        df = current_handler.df.copy()
+        posicoes = _posicoes_exportacao(current_handler, uf, municipio, evento, ano, limit)
         
-        # Aplicar filtros
-        if uf:
-            df = df[df['uf'].str.contains(uf, case=False, na=False)]
-        if municipio:
-            df = df[df['municipio'].str.contains(municipio, case=False, na=False)]
-        if evento:
-            df = df[df['evento'].str.contains(evento, case=False, na=False)]
-        if ano:
-            df = df[df['data_referencia'].str.contains(str(ano), na=False)]
-        
-        # Limitar resultados
-        df = df.head(limit)
-        
-        if df.empty:
+        if len(posicoes) == 0:
             raise HTTPException(status_code=404, detail="Nenhum dado encontrado com os filtros aplicados")
         
-        # Criar arquivo temporário
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.csv', encoding='utf-8') as tmp_file:
-            df.to_csv(tmp_file.name, index=False, encoding='utf-8')
-            tmp_filename = tmp_file.name
-        
-        # Definir nome do arquivo baseado nos filtros
-        filename_parts = ["sinesp_vde"]
-        if uf:
-            filename_parts.append(f"uf_{uf}")
-        if municipio:
-            filename_parts.append(f"municipio_{municipio[:10]}")
-        if evento:
-            filename_parts.append(f"evento_{evento[:10]}")
-        if ano:
-            filename_parts.append(f"ano_{ano}")
-        
-        filename = "_".join(filename_parts) + ".csv"
-        
-        def cleanup():
-            try:
-                os.unlink(tmp_filename)
-            except:
-                pass
-        
-        return FileResponse(
-            tmp_filename,
-            media_type='text/csv',
-            filename=filename,
-            background=cleanup
+        filename = _nome_arquivo(".csv.gz" if gzip else ".csv", uf, municipio, evento, ano)
+        blocos = _blocos_csv(current_handler.consultas.linhas, posicoes)
+        return StreamingResponse(
+            _gzip(blocos) if gzip else blocos,
+            media_type='application/gzip' if gzip else 'text/csv',
+            headers={"Content-Disposition": _content_disposition(filename)}
         )
         
     except HTTPException:
@@ -79,85 +122,48 @@ def download_csv(
         raise HTTPException(status_code=500, detail="Erro ao gerar arquivo CSV")
 
 @router.get("/download/json", summary="Exportar dados como JSON", tags=["Exportação"])
+@consulta_pesada("exportacao")
 def download_json(
     request: Request,
     uf: Optional[str] = Query(None, description="Filtrar por UF"),
     municipio: Optional[str] = Query(None, description="Filtrar por município"),
     evento: Optional[str] = Query(None, description="Filtrar por tipo de evento"),
     ano: Optional[int] = Query(None, description="Filtrar por ano"),
-    limit: int = Query(5000, ge=1, le=25000, description="Limite de registros")
+    limit: int = Query(5000, ge=1, le=50000, description="Limite de registros"),
+    formato: str = Query("json", pattern="^(json|ndjson)$", description="json (documento com metadados) ou ndjson (um registro por linha)"),
+    gzip: bool = Query(False, description="Comprimir o arquivo (.gz)")
 ):
-    """Exporta os dados filtrados como arquivo JSON"""
+    """Exporta os dados filtrados como JSON ou NDJSON, enviado em streaming"""
     try:
         current_handler = check_handler()
-        df = current_handler.df.copy()
-        
-        # Aplicar filtros
-        if uf:
-            df = df[df['uf'].str.contains(uf, case=False, na=False)]
-        if municipio:
-            df = df[df['municipio'].str.contains(municipio, case=False, na=False)]
-        if evento:
-            df = df[df['evento'].str.contains(evento, case=False, na=False)]
-        if ano:
-            df = df[df['data_referencia'].str.contains(str(ano), na=False)]
+        posicoes = _posicoes_exportacao(current_handler, uf, municipio, evento, ano, limit)
         
-        # Limitar resultados
-        df = df.head(limit)
-        
-        if df.empty:
+        if len(posicoes) == 0:
             raise HTTPException(status_code=404, detail="Nenhum dado encontrado com os filtros aplicados")
         
-        # Tratar valores NaN e tipos numpy
-        df_clean = df.copy()
-        for col in df_clean.columns:
-            df_clean[col] = df_clean[col].apply(lambda x: None if pd.isna(x) else x)
-        
-        # Converter para dicionário
-        data = {
-            "metadados": {
+        if formato == "ndjson":
+            blocos = _blocos_ndjson(current_handler.consultas.linhas, posicoes)
+            media_type = 'application/x-ndjson'
+        else:
+            metadados = {
                 "fonte": "SINESP VDE - Ministério da Justiça e Segurança Pública",
                 "data_exportacao": pd.Timestamp.now().isoformat(),
-                "total_registros": len(df_clean),
+                "total_registros": len(posicoes),
                 "filtros_aplicados": {
                     "uf": uf,
                     "municipio": municipio,
                     "evento": evento,
                     "ano": ano
                 }
-            },
-            "dados": df_clean.to_dict(orient='records')
-        }
-        
-        # Criar arquivo temporário JSON
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json', encoding='utf-8') as tmp_file:
-            json.dump(data, tmp_file, ensure_ascii=False, indent=2, default=str)
-            tmp_filename = tmp_file.name
-        
-        # Definir nome do arquivo
-        filename_parts = ["sinesp_vde"]
-        if uf:
-            filename_parts.append(f"uf_{uf}")
-        if municipio:
-            filename_parts.append(f"municipio_{municipio[:10]}")
-        if evento:
-            filename_parts.append(f"evento_{evento[:10]}")
-        if ano:
-            filename_parts.append(f"ano_{ano}")
-        
-        filename = "_".join(filename_parts) + ".json"
-        
-        def cleanup():
-            try:
-                os.unlink(tmp_filename)
-            except:
-                pass
-        
-        return FileResponse(
-            tmp_filename,
-            media_type='application/json',
-            filename=filename,
-            background=cleanup
+            }
+            blocos = _blocos_json(current_handler.consultas.linhas, posicoes, metadados)
+            media_type = 'application/json'
+        
+        filename = _nome_arquivo(f".{formato}.gz" if gzip else f".{formato}", uf, municipio, evento, ano)
+        return StreamingResponse(
+            _gzip(blocos) if gzip else blocos,
+            media_type='application/gzip' if gzip else media_type,
+            headers={"Content-Disposition": _content_disposition(filename)}
         )
         
     except HTTPException:
@@ -1,25 +1,31 @@
 from depends import *
 from fastapi import APIRouter
-from utils import check_handler, safe_numeric_operation, logger, handler
-router = APIRouter()
+from respostas import RotaJSON
+from consulta import FiltroConsulta
+from execucao import consulta_pesada
+from utils import check_handler, logger, resultado_em_cache
+router = APIRouter(route_class=RotaJSON)
 
 
 @router.get("/estatisticas/resumo", summary="Estatísticas gerais", tags=["Estatísticas"])
+@consulta_pesada("consulta")
+@resultado_em_cache
 def estatisticas_resumo(request: Request):
     """Estatísticas gerais do dataset"""
     try:
         current_handler = check_handler()
-        df = current_handler.df
+        cubo = current_handler.cubo
+        totais = cubo.totais(cubo.celulas)
         
         stats = {
-            "total_registros": len(df),
-            "total_vitimas": safe_numeric_operation("total_vitima", "sum"),
-            "vitimas_femininas": safe_numeric_operation("feminino", "sum"),
-            "vitimas_masculinas": safe_numeric_operation("masculino", "sum"),
-            "vitimas_nao_informado": safe_numeric_operation("nao_informado", "sum"),
-            "ufs_cobertas": safe_numeric_operation("uf", "nunique"),
-            "municipios_cobertos": safe_numeric_operation("municipio", "nunique"),
-            "tipos_eventos": safe_numeric_operation("evento", "nunique"),
+            "total_registros": totais['registros'],
+            "total_vitimas": totais['total_vitima'],
+            "vitimas_femininas": totais['feminino'],
+            "vitimas_masculinas": totais['masculino'],
+            "vitimas_nao_informado": totais['nao_informado'],
+            "ufs_cobertas": int(cubo.celulas['uf'].nunique()),
+            "municipios_cobertos": int(cubo.municipios['municipio'].nunique()),
+            "tipos_eventos": int(cubo.celulas['evento'].nunique()),
             "status": "sucesso"
         }
         return stats
@@ -28,32 +34,38 @@ def estatisticas_resumo(request: Request):
         raise HTTPException(status_code=500, detail="Erro ao gerar estatísticas de resumo")
 
 @router.get("/estatisticas/por-uf", summary="Estatísticas por UF", tags=["Estatísticas"])
+@consulta_pesada("consulta")
+@resultado_em_cache
 def estatisticas_por_uf(request: Request, uf: str = Query(..., description="UF para consulta")):
     """Estatísticas detalhadas por UF"""
     try:
-        check_handler()
-        df = handler.df
+        current_handler = check_handler()
+        cubo = current_handler.cubo
         
-        # Filtrar por UF
-        df_uf = df[df['uf'].str.upper() == uf.upper()]
+        # Filtrar por UF no cubo agregado
+        filtro = FiltroConsulta(uf=uf)
+        celulas = current_handler.consultas.celulas(filtro)
         
-        if df_uf.empty:
+        if celulas.empty:
             return {
                 "uf": uf,
                 "total_registros": 0,
                 "status": "nenhum_resultado"
             }
         
+        totais = cubo.totais(celulas)
+        eventos = celulas.groupby('evento', observed=False)['registros'].sum().sort_values(ascending=False, kind='stable')
+        
         stats = {
             "uf": uf.upper(),
-            "total_registros": len(df_uf),
-            "total_vitimas": int(df_uf['total_vitima'].sum()),
-            "vitimas_femininas": int(df_uf['feminino'].sum()),
-            "vitimas_masculinas": int(df_uf['masculino'].sum()),
-            "vitimas_nao_informado": int(df_uf['nao_informado'].sum()),
-            "municipios_afetados": df_uf['municipio'].nunique(),
-            "tipos_eventos": df_uf['evento'].nunique(),
-            "eventos_mais_comuns": df_uf['evento'].value_counts().head(5).to_dict(),
+            "total_registros": totais['registros'],
+            "total_vitimas": int(totais['total_vitima']),
+            "vitimas_femininas": int(totais['feminino']),
+            "vitimas_masculinas": int(totais['masculino']),
+            "vitimas_nao_informado": int(totais['nao_informado']),
+            "municipios_afetados": int(current_handler.consultas.presenca(filtro)['municipio'].nunique()),
+            "tipos_eventos": int(celulas['evento'].nunique()),
+            "eventos_mais_comuns": {k: int(v) for k, v in eventos.head(5).items()},
             "status": "sucesso"
         }
         
@@ -63,38 +75,38 @@ def estatisticas_por_uf(request: Request, uf: str = Query(..., description="UF p
         raise HTTPException(status_code=500, detail="Erro ao gerar estatísticas por UF")
 
 @router.get("/estatisticas/por-ano", summary="Estatísticas por ano", tags=["Estatísticas"])
+@consulta_pesada("consulta")
+@resultado_em_cache
 def estatisticas_por_ano(request: Request, ano: int = Query(..., description="Ano para consulta")):
     """Estatísticas detalhadas por ano"""
     try:
-        check_handler()
-        df = handler.df
-        
-        # Filtrar por ano (usando data_referencia ou arquivo_origem)
-        mask = df['data_referencia'].str.contains(str(ano), na=False)
-        if 'arquivo_origem' in df.columns:
-            mask_arquivo = df['arquivo_origem'].str.contains(str(ano), na=False)
-            mask = mask | mask_arquivo
+        current_handler = check_handler()
+        cubo = current_handler.cubo
         
-        df_ano = df[mask]
+        # Filtrar por ano no cubo agregado (ano derivado na carga)
+        filtro = FiltroConsulta(ano=ano)
+        celulas = current_handler.consultas.celulas(filtro)
         
-        if df_ano.empty:
+        if celulas.empty:
             return {
                 "ano": ano,
                 "total_registros": 0,
                 "status": "nenhum_resultado"
             }
         
+        totais = cubo.totais(celulas)
+        
         stats = {
             "ano": ano,
-            "total_registros": len(df_ano),
-            "total_vitimas": int(df_ano['total_vitima'].sum()),
-            "vitimas_femininas": int(df_ano['feminino'].sum()),
-            "vitimas_masculinas": int(df_ano['masculino'].sum()),
-            "vitimas_nao_informado": int(df_ano['nao_informado'].sum()),
-            "ufs_afetadas": df_ano['uf'].nunique(),
-            "municipios_afetados": df_ano['municipio'].nunique(),
-            "tipos_eventos": df_ano['evento'].nunique(),
-            "top_ufs": df_ano.groupby('uf')['total_vitima'].sum().sort_values(ascending=False).head(5).to_dict(),
+            "total_registros": totais['registros'],
+            "total_vitimas": int(totais['total_vitima']),
+            "vitimas_femininas": int(totais['feminino']),
+            "vitimas_masculinas": int(totais['masculino']),
+            "vitimas_nao_informado": int(totais['nao_informado']),
+            "ufs_afetadas": int(celulas['uf'].nunique()),
+            "municipios_afetados": int(current_handler.consultas.presenca(filtro)['municipio'].nunique()),
+            "tipos_eventos": int(celulas['evento'].nunique()),
+            "top_ufs": current_handler.consultas.somar_por(filtro, 'uf', completo=True).sort_values(ascending=False).head(5).to_dict(),
             "status": "sucesso"
         }
         
@@ -1,7 +1,8 @@
 from depends import *
 from fastapi import APIRouter
+from respostas import RotaJSON
 from utils import check_handler, logger
-router = APIRouter()
+router = APIRouter(route_class=RotaJSON)
 
 
 @router.get("/api/info", summary="Informações da API", tags=["Informações"])
@@ -9,7 +10,7 @@ def info():
     """Informações gerais sobre a API e dados disponíveis"""
     try:
         current_handler = check_handler()
-        total_registros = len(current_handler.df) if current_handler and current_handler.df is not None else 0
+        total_registros = current_handler.total_registros if current_handler else 0
         
         return {
             "api": "SINESP VDE 2015-2025",
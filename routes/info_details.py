@@ -1,7 +1,8 @@
 from depends import *
 from fastapi import APIRouter
+from respostas import RotaJSON
 from utils import logger, check_handler
-router = APIRouter()
+router = APIRouter(route_class=RotaJSON)
 
 
 @router.get("/info", summary="Informações detalhadas da API", tags=["Metadados"])
@@ -9,9 +10,9 @@ def info_detalhada(request: Request):
     """Informações detalhadas sobre a API e dados disponíveis"""
     try:
         current_handler = check_handler()
-        total_registros = len(current_handler.df) if current_handler and current_handler.df is not None else 0
-        colunas_disponiveis = list(current_handler.df.columns) if current_handler and current_handler.df is not None else []
-        anos_disponiveis = current_handler.get_anos_disponiveis() if current_handler and current_handler.df is not None else []
+        total_registros = current_handler.total_registros if current_handler else 0
+        colunas_disponiveis = current_handler.consultas.colunas_publicas() if current_handler else []
+        anos_disponiveis = current_handler.get_anos_disponiveis() if current_handler else []
         
         return {
             "api": {
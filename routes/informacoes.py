@@ -1,6 +1,7 @@
 from depends import *
 from fastapi import APIRouter
-router = APIRouter()
+from respostas import RotaJSON
+router = APIRouter(route_class=RotaJSON)
 
 
 @router.get("/notas-metodologicas/estados", summary="Notas metodológicas por estado", tags=["Informações"])
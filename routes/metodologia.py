@@ -1,6 +1,7 @@
 from depends import *
 from fastapi import APIRouter
-router = APIRouter()
+from respostas import RotaJSON
+router = APIRouter(route_class=RotaJSON)
 
 
 @router.get("/metodologia", summary="Metodologia e Notas Técnicas", tags=["Informações"])
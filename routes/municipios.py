@@ -1,7 +1,9 @@
 from depends import *
 from fastapi import APIRouter
+from respostas import RotaJSON
+from consulta import FiltroConsulta
 from utils import check_handler, safe_get_unique_values, logger
-router = APIRouter()
+router = APIRouter(route_class=RotaJSON)
 
 
 @router.get("/municipios", summary="Lista de municípios", tags=["Dimensões"])
@@ -9,16 +11,15 @@ def get_municipios(request: Request, uf: Optional[str] = Query(None, description
     """Lista municípios, opcionalmente filtrados por UF"""
     try:
         current_handler = check_handler()
-        df = current_handler.df
         
         if uf:
-            # Filtrar por UF
-            df_filtrado = df[df['uf'].str.upper() == uf.upper()]
-            if df_filtrado.empty:
+            # Filtrar por UF na tabela de presença de municípios do cubo
+            presenca = current_handler.consultas.presenca(FiltroConsulta(uf=uf))
+            if presenca.empty:
                 return {"municipios": [], "total": 0, "uf": uf, "status": "nenhum_resultado"}
             
-            # Obter municípios únicos do dataframe filtrado
-            municipios = df_filtrado['municipio'].dropna().unique().tolist()
+            # Obter municípios únicos presentes na UF
+            municipios = presenca['municipio'].dropna().unique().tolist()
             municipios = sorted([m for m in municipios if str(m).strip() not in ['', 'nan', 'None', 'null', '<NA>']])
         else:
             municipios = safe_get_unique_values("municipio")
@@ -31,4 +32,30 @@ def get_municipios(request: Request, uf: Optional[str] = Query(None, description
         }
     except Exception as e:
         logger.error(f"Erro em get_municipios: {e}")
-        raise HTTPException(status_code=500, detail="Erro ao obter lista de municípios")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="Erro ao obter lista de municípios")
+
+@router.get("/municipios/sugestoes", summary="Sugestões de municípios (autocompletar)", tags=["Dimensões"])
+def sugerir_municipios(
+    request: Request,
+    q: str = Query(..., min_length=1, description="Trecho do nome (sem distinção de acento ou caixa)"),
+    uf: Optional[str] = Query(None, description="Restringir a uma UF"),
+    limite: int = Query(10, ge=1, le=50, description="Número máximo de sugestões")
+):
+    """
+    Municípios cujo nome contém o termo, para campos de busca: primeiro o nome igual,
+    depois os que começam com o termo, os que têm uma palavra começando com ele e os demais;
+    em cada grupo, os municípios com mais registros vêm antes.
+    """
+    try:
+        current_handler = check_handler()
+        sugestoes = current_handler.sugerir_municipios(q, uf=uf, limite=limite)
+        return {
+            "sugestoes": sugestoes,
+            "total": len(sugestoes),
+            "termo": q,
+            "uf": uf if uf else "todas",
+            "status": "sucesso" if sugestoes else "nenhum_resultado"
+        }
+    except Exception as e:
+        logger.error(f"Erro em sugerir_municipios: {e}")
+        raise HTTPException(status_code=500, detail="Erro ao obter sugestões de municípios")
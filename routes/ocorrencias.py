@@ -1,10 +1,40 @@
 from depends import *
+import base64
+import json
 from fastapi import APIRouter
-from utils import check_handler, logger
-router = APIRouter()
+from respostas import RotaJSON
+from consulta import FiltroConsulta
+from serializacao import registros
+from execucao import consulta_pesada
+from utils import check_handler, logger, resultado_em_cache
+router = APIRouter(route_class=RotaJSON)
+
+
+def _codificar_cursor(versao_dados, assinatura, ultimo_id):
+    """Cursor opaco: versão dos dados, filtros e id do último registro entregue"""
+    conteudo = json.dumps({"v": versao_dados[:12], "f": assinatura, "u": ultimo_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(conteudo.encode()).decode().rstrip("=")
+
+
+def _decodificar_cursor(cursor, versao_dados, assinatura, total_registros):
+    """Id do último registro entregue; HTTP 400 se o cursor é inválido ou de outra consulta"""
+    try:
+        conteudo = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        ultimo_id = int(conteudo["u"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if not 0 <= ultimo_id < total_registros:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if conteudo.get("v") != versao_dados[:12]:
+        raise HTTPException(status_code=400, detail="Cursor expirado: os dados foram atualizados, reinicie a paginação")
+    if conteudo.get("f") != assinatura:
+        raise HTTPException(status_code=400, detail="Cursor não corresponde aos filtros informados")
+    return ultimo_id
 
 
 @router.get("/ocorrencias", summary="Buscar ocorrências", tags=["Consultas"])
+@consulta_pesada("consulta")
+@resultado_em_cache
 def buscar_ocorrencias(
     request: Request,
     uf: Optional[str] = Query(None, description="UF"),
@@ -14,46 +44,42 @@ def buscar_ocorrencias(
     agente: Optional[str] = Query(None, description="Tipo de agente"),
     arma: Optional[str] = Query(None, description="Tipo de arma"),
     limit: int = Query(100, ge=1, le=1000, description="Limite de resultados"),
-    offset: int = Query(0, ge=0, description="Offset para paginação")
+    offset: int = Query(0, ge=0, description="Offset para paginação"),
+    cursor: Optional[str] = Query(None, description="Cursor da próxima página (paginacao.proximo_cursor); substitui o offset")
 ):
-    """Busca ocorrências com filtros opcionais e paginação"""
+    """
+    Busca ocorrências com filtros opcionais e paginação.
+    Para varrer todo o resultado, siga `paginacao.proximo_cursor`: cada página retoma
+    do último registro entregue, sem refazer o filtro nem percorrer as páginas anteriores.
+    """
     try:
         current_handler = check_handler()
-        df = current_handler.df.copy()
         
-        # Aplicar filtros
-        if uf:
-            df = df[df['uf'].str.contains(uf, case=False, na=False)]
-        if municipio:
-            df = df[df['municipio'].str.contains(municipio, case=False, na=False)]
-        if evento:
-            df = df[df['evento'].str.contains(evento, case=False, na=False)]
-        if agente:
-            df = df[df['agente'].str.contains(agente, case=False, na=False)]
-        if arma:
-            df = df[df['arma'].str.contains(arma, case=False, na=False)]
-        if ano:
-            df = df[df['data_referencia'].str.contains(str(ano), na=False)]
+        # Aplicar filtros pelo índice invertido (sem varrer a tabela inteira)
+        filtro = FiltroConsulta(uf=uf, municipio=municipio, evento=evento, agente=agente, arma=arma, ano=ano)
+        posicoes = current_handler.consultas.posicoes(filtro)
+        
+        total_encontrado = current_handler.total_registros if posicoes is None else len(posicoes)
         
-        total_encontrado = len(df)
+        # Cursor: o id do registro é a sua posição no frame; a página começa logo após o último entregue
+        assinatura = current_handler.consultas.assinatura(filtro)
+        if cursor:
+            if offset:
+                raise HTTPException(status_code=400, detail="Informe offset ou cursor, não ambos")
+            ultimo_id = _decodificar_cursor(
+                cursor, current_handler.versao_dados, assinatura, current_handler.total_registros
+            )
+            offset = ultimo_id + 1 if posicoes is None else int(np.searchsorted(posicoes, ultimo_id, side="right"))
         
-        # Aplicar paginação
-        df_resultado = df.iloc[offset:offset + limit]
+        # Aplicar paginação: só as linhas da página são materializadas
+        if posicoes is None:
+            ids = np.arange(offset, min(offset + limit, total_encontrado))
+        else:
+            ids = posicoes[offset:offset + limit]
+        df_resultado = current_handler.consultas.linhas(ids)
         
-        # Converter para lista de dicionários com tratamento de tipos
-        resultados = []
-        for _, row in df_resultado.iterrows():
-            registro = {}
-            for col, val in row.items():
-                # Tratar valores NaN e infinitos
-                if pd.isna(val) or (isinstance(val, (int, float)) and np.isinf(val)):
-                    registro[col] = None
-                elif isinstance(val, (np.integer, np.floating)):
-                    # Converter tipos numpy para tipos Python nativos
-                    registro[col] = int(val) if isinstance(val, np.integer) else float(val)
-                else:
-                    registro[col] = val
-            resultados.append(registro)
+        # Converter para lista de dicionários (nulos, infinitos e tipos numpy tratados por coluna)
+        resultados = registros(df_resultado)
         
         return {
             "ocorrencias": resultados,
@@ -62,7 +88,11 @@ def buscar_ocorrencias(
                 "total_exibido": len(resultados),
                 "offset": offset,
                 "limit": limit,
-                "proxima_pagina": offset + limit if offset + limit < total_encontrado else None
+                "proxima_pagina": offset + limit if offset + limit < total_encontrado else None,
+                "proximo_cursor": (
+                    _codificar_cursor(current_handler.versao_dados, assinatura, int(ids[-1]))
+                    if len(ids) and offset + len(ids) < total_encontrado else None
+                )
             },
             "filtros_aplicados": {
                 "uf": uf,
@@ -74,6 +104,8 @@ def buscar_ocorrencias(
             },
             "status": "sucesso" if len(resultados) > 0 else "nenhum_resultado"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro em buscar_ocorrencias: {e}")
         raise HTTPException(status_code=500, detail="Erro ao buscar ocorrências")
@@ -1,10 +1,15 @@
 from depends import *
 from fastapi import APIRouter
-from utils import check_handler, logger
-router = APIRouter()
+from respostas import RotaJSON
+from serializacao import registros
+from execucao import consulta_pesada
+from utils import check_handler, logger, resultado_em_cache
+router = APIRouter(route_class=RotaJSON)
 
 
 @router.get("/ranking/ufs-violencia", summary="Ranking de UFs por violência", tags=["Estatísticas"])
+@consulta_pesada("consulta")
+@resultado_em_cache
 def ranking_ufs_violencia(
     request: Request,
     limit: int = Query(27, ge=1, le=50, description="Limite de resultados")
@@ -12,21 +17,17 @@ def ranking_ufs_violencia(
     """Ranking das UFs com maior número de casos de violência"""
     try:
         current_handler = check_handler()
-        df = current_handler.df
+        celulas = current_handler.cubo.celulas
         
-        # Agrupar por UF e somar as vítimas
-        ranking = df.groupby('uf')['total_vitima'].sum().reset_index()
+        # Agrupar por UF e somar as vítimas (sobre o cubo agregado)
+        ranking = celulas.groupby('uf', observed=False)['total_vitima'].sum().reset_index()
         ranking = ranking.sort_values('total_vitima', ascending=False)
         ranking = ranking.head(limit)
         
         # Converter para lista de dicionários
-        resultado = []
-        for _, row in ranking.iterrows():
-            resultado.append({
-                "uf": row['uf'],
-                "total_vitimas": int(row['total_vitima']),
-                "posicao": len(resultado) + 1
-            })
+        ranking = ranking.rename(columns={'total_vitima': 'total_vitimas'}).astype({'total_vitimas': 'int64'})
+        ranking['posicao'] = range(1, len(ranking) + 1)
+        resultado = registros(ranking)
         
         return {
             "ranking": resultado,
@@ -1,10 +1,16 @@
 from depends import *
 from fastapi import APIRouter
-from utils import check_handler, logger
-router = APIRouter()
+from respostas import RotaJSON
+from consulta import FiltroConsulta
+from serializacao import registros
+from execucao import consulta_pesada
+from utils import check_handler, logger, resultado_em_cache
+router = APIRouter(route_class=RotaJSON)
 
 
 @router.get("/resumo/vitimas", summary="Resumo de vítimas", tags=["Resumos"])
+@consulta_pesada("consulta")
+@resultado_em_cache
 def resumo_vitimas(
     request: Request,
     uf: Optional[str] = Query(None, description="Filtrar por UF"),
@@ -14,17 +20,11 @@ def resumo_vitimas(
     """Totais de vítimas com filtros opcionais"""
     try:
         current_handler = check_handler()
-        df = current_handler.df.copy()
         
-        # Aplicar filtros
-        if uf:
-            df = df[df['uf'].str.upper() == uf.upper()]
-        if ano:
-            df = df[df['data_referencia'].str.contains(str(ano), na=False)]
-        if evento:
-            df = df[df['evento'].str.contains(evento, case=False, na=False)]
+        # Aplicar filtros sobre o cubo agregado
+        celulas = current_handler.consultas.celulas(FiltroConsulta(uf=uf, ano=ano, evento=evento))
         
-        if df.empty:
+        if celulas.empty:
             return {
                 "total_vitimas": 0,
                 "vitimas_femininas": 0,
@@ -34,17 +34,20 @@ def resumo_vitimas(
                 "status": "nenhum_resultado"
             }
         
+        totais = current_handler.cubo.totais(celulas)
+        total_vitimas = totais['total_vitima']
+        
         resumo = {
-            "total_vitimas": int(df['total_vitima'].sum()),
-            "vitimas_femininas": int(df['feminino'].sum()),
-            "vitimas_masculinas": int(df['masculino'].sum()),
-            "vitimas_nao_informado": int(df['nao_informado'].sum()),
-            "registros_analisados": len(df),
+            "total_vitimas": int(total_vitimas),
+            "vitimas_femininas": int(totais['feminino']),
+            "vitimas_masculinas": int(totais['masculino']),
+            "vitimas_nao_informado": int(totais['nao_informado']),
+            "registros_analisados": totais['registros'],
             "filtros": {"uf": uf, "ano": ano, "evento": evento},
             "percentuais": {
-                "feminino": round((df['feminino'].sum() / df['total_vitima'].sum()) * 100, 2) if df['total_vitima'].sum() > 0 else 0,
-                "masculino": round((df['masculino'].sum() / df['total_vitima'].sum()) * 100, 2) if df['total_vitima'].sum() > 0 else 0,
-                "nao_informado": round((df['nao_informado'].sum() / df['total_vitima'].sum()) * 100, 2) if df['total_vitima'].sum() > 0 else 0
+                "feminino": round((totais['feminino'] / total_vitimas) * 100, 2) if total_vitimas > 0 else 0,
+                "masculino": round((totais['masculino'] / total_vitimas) * 100, 2) if total_vitimas > 0 else 0,
+                "nao_informado": round((totais['nao_informado'] / total_vitimas) * 100, 2) if total_vitimas > 0 else 0
             },
             "status": "sucesso"
         }
@@ -55,6 +58,8 @@ def resumo_vitimas(
         raise HTTPException(status_code=500, detail="Erro ao gerar resumo de vítimas")
 
 @router.get("/resumo/faixa-etaria", summary="Resumo por faixa etária", tags=["Resumos"])
+@consulta_pesada("consulta")
+@resultado_em_cache
 def resumo_faixa_etaria(
     request: Request,
     uf: Optional[str] = Query(None, description="Filtrar por UF"),
@@ -63,15 +68,12 @@ def resumo_faixa_etaria(
     """Distribuição de vítimas por faixa etária"""
     try:
         current_handler = check_handler()
-        df = current_handler.df.copy()
         
-        # Aplicar filtros
-        if uf:
-            df = df[df['uf'].str.upper() == uf.upper()]
-        if ano:
-            df = df[df['data_referencia'].str.contains(str(ano), na=False)]
+        # Aplicar filtros sobre o cubo agregado
+        filtro = FiltroConsulta(uf=uf, ano=ano)
+        celulas = current_handler.consultas.celulas(filtro)
         
-        if df.empty or 'faixa_etaria' not in df.columns:
+        if celulas.empty or 'faixa_etaria' not in celulas.columns:
             return {
                 "distribuicao": {},
                 "total_vitimas": 0,
@@ -80,7 +82,7 @@ def resumo_faixa_etaria(
             }
         
         # Agrupar por faixa etária e somar vítimas
-        distribuicao = df.groupby('faixa_etaria')['total_vitima'].sum().to_dict()
+        distribuicao = celulas.groupby('faixa_etaria', observed=False)['total_vitima'].sum().to_dict()
         distribuicao = {k: int(v) for k, v in distribuicao.items() if k and str(k).strip() not in ['nan', 'None', '']}
         
         total = sum(distribuicao.values())
@@ -92,7 +94,7 @@ def resumo_faixa_etaria(
             "distribuicao": distribuicao,
             "percentuais": percentuais,
             "total_vitimas": total,
-            "registros_analisados": len(df),
+            "registros_analisados": int(celulas['registros'].sum()),
             "filtros": {"uf": uf, "ano": ano},
             "status": "sucesso"
         }
@@ -101,6 +103,8 @@ def resumo_faixa_etaria(
         raise HTTPException(status_code=500, detail="Erro ao gerar resumo por faixa etária")
 
 @router.get("/resumo/armas", summary="Resumo por tipo de arma", tags=["Resumos"])
+@consulta_pesada("consulta")
+@resultado_em_cache
 def resumo_armas(
     request: Request,
     uf: Optional[str] = Query(None, description="Filtrar por UF"),
@@ -109,15 +113,12 @@ def resumo_armas(
     """Estatísticas por tipo de arma"""
     try:
         current_handler = check_handler()
-        df = current_handler.df.copy()
         
-        # Aplicar filtros
-        if uf:
-            df = df[df['uf'].str.upper() == uf.upper()]
-        if ano:
-            df = df[df['data_referencia'].str.contains(str(ano), na=False)]
+        # Aplicar filtros sobre o cubo agregado
+        filtro = FiltroConsulta(uf=uf, ano=ano)
+        celulas = current_handler.consultas.celulas(filtro)
         
-        if df.empty or 'arma' not in df.columns:
+        if celulas.empty or 'arma' not in celulas.columns:
             return {
                 "estatisticas": {},
                 "total_registros": 0,
@@ -125,29 +126,25 @@ def resumo_armas(
                 "status": "nenhum_resultado"
             }
         
-        # Agrupar por tipo de arma
-        stats_armas = df.groupby('arma').agg({
-            'total_vitima': 'sum',
-            'uf': 'nunique',
-            'municipio': 'nunique'
-        }).reset_index()
-        
-        estatisticas = {}
-        for _, row in stats_armas.iterrows():
-            arma = row['arma']
-            if arma and str(arma).strip() not in ['nan', 'None', '']:
-                estatisticas[arma] = {
-                    "total_vitimas": int(row['total_vitima']),
-                    "ufs_afetadas": int(row['uf']),
-                    "municipios_afetados": int(row['municipio'])
-                }
+        # Somas por tipo de arma no cubo; UFs e municípios distintos na tabela de presença
+        stats_armas = current_handler.consultas.resumo_por(filtro, 'arma', celulas=celulas)
+        
+        estatisticas = {
+            linha['arma']: {
+                "total_vitimas": linha['total_vitima'],
+                "ufs_afetadas": linha['uf'],
+                "municipios_afetados": linha['municipio']
+            }
+            for linha in registros(stats_armas)
+            if linha['arma'] and str(linha['arma']).strip() not in ['nan', 'None', '']
+        }
         
         # Ordenar por total de vítimas
         estatisticas = dict(sorted(estatisticas.items(), key=lambda x: x[1]['total_vitimas'], reverse=True))
         
         return {
             "estatisticas": estatisticas,
-            "total_registros": len(df),
+            "total_registros": int(celulas['registros'].sum()),
             "total_tipos_armas": len(estatisticas),
             "filtros": {"uf": uf, "ano": ano},
             "status": "sucesso"
@@ -157,6 +154,8 @@ def resumo_armas(
         raise HTTPException(status_code=500, detail="Erro ao gerar resumo de armas")
 
 @router.get("/resumo/agentes", summary="Resumo por tipo de agente", tags=["Resumos"])
+@consulta_pesada("consulta")
+@resultado_em_cache
 def resumo_agentes(
     request: Request,
     uf: Optional[str] = Query(None, description="Filtrar por UF"),
@@ -165,15 +164,12 @@ def resumo_agentes(
     """Estatísticas por tipo de agente"""
     try:
         current_handler = check_handler()
-        df = current_handler.df.copy()
         
-        # Aplicar filtros
-        if uf:
-            df = df[df['uf'].str.upper() == uf.upper()]
-        if ano:
-            df = df[df['data_referencia'].str.contains(str(ano), na=False)]
+        # Aplicar filtros sobre o cubo agregado
+        filtro = FiltroConsulta(uf=uf, ano=ano)
+        celulas = current_handler.consultas.celulas(filtro)
         
-        if df.empty or 'agente' not in df.columns:
+        if celulas.empty or 'agente' not in celulas.columns:
             return {
                 "estatisticas": {},
                 "total_registros": 0,
@@ -181,29 +177,25 @@ def resumo_agentes(
                 "status": "nenhum_resultado"
             }
         
-        # Agrupar por tipo de agente
-        stats_agentes = df.groupby('agente').agg({
-            'total_vitima': 'sum',
-            'uf': 'nunique',
-            'municipio': 'nunique'
-        }).reset_index()
-        
-        estatisticas = {}
-        for _, row in stats_agentes.iterrows():
-            agente = row['agente']
-            if agente and str(agente).strip() not in ['nan', 'None', '']:
-                estatisticas[agente] = {
-                    "total_vitimas": int(row['total_vitima']),
-                    "ufs_afetadas": int(row['uf']),
-                    "municipios_afetados": int(row['municipio'])
-                }
+        # Somas por tipo de agente no cubo; UFs e municípios distintos na tabela de presença
+        stats_agentes = current_handler.consultas.resumo_por(filtro, 'agente', celulas=celulas)
+        
+        estatisticas = {
+            linha['agente']: {
+                "total_vitimas": linha['total_vitima'],
+                "ufs_afetadas": linha['uf'],
+                "municipios_afetados": linha['municipio']
+            }
+            for linha in registros(stats_agentes)
+            if linha['agente'] and str(linha['agente']).strip() not in ['nan', 'None', '']
+        }
         
         # Ordenar por total de vítimas
         estatisticas = dict(sorted(estatisticas.items(), key=lambda x: x[1]['total_vitimas'], reverse=True))
         
         return {
             "estatisticas": estatisticas,
-            "total_registros": len(df),
+            "total_registros": int(celulas['registros'].sum()),
             "total_tipos_agentes": len(estatisticas),
             "filtros": {"uf": uf, "ano": ano},
             "status": "sucesso"
@@ -1,10 +1,15 @@
 from depends import *
 from fastapi import APIRouter
-from utils import check_handler, logger
-router = APIRouter()
+from respostas import RotaJSON
+from consulta import FiltroConsulta
+from execucao import consulta_pesada
+from utils import check_handler, logger, resultado_em_cache
+router = APIRouter(route_class=RotaJSON)
 
 
 @router.get("/series/ocorrencias", summary="Série temporal de ocorrências", tags=["Séries Temporais"])
+@consulta_pesada("consulta")
+@resultado_em_cache
 def serie_temporal_ocorrencias(
     request: Request,
     uf: Optional[str] = Query(None, description="Filtrar por UF"),
@@ -14,17 +19,12 @@ def serie_temporal_ocorrencias(
     """Evolução temporal (ano a ano) do total de vítimas"""
     try:
         current_handler = check_handler()
-        df = current_handler.df.copy()
         
-        # Aplicar filtros
-        if uf:
-            df = df[df['uf'].str.upper() == uf.upper()]
-        if municipio:
-            df = df[df['municipio'].str.contains(municipio, case=False, na=False)]
-        if evento:
-            df = df[df['evento'].str.contains(evento, case=False, na=False)]
+        # Soma por ano pelo motor de consultas: pelo cubo, ou só nas linhas do município filtrado
+        filtro = FiltroConsulta(uf=uf, municipio=municipio, evento=evento)
+        serie = current_handler.consultas.somar_por(filtro, "ano")
         
-        if df.empty:
+        if serie.empty:
             return {
                 "serie_temporal": {},
                 "tendencia": "sem_dados",
@@ -32,30 +32,7 @@ def serie_temporal_ocorrencias(
                 "status": "nenhum_resultado"
             }
         
-        # Extrair ano da data_referencia
-        anos = []
-        for data_ref in df['data_referencia']:
-            try:
-                if pd.isna(data_ref):
-                    continue
-                # Tentar extrair ano da data
-                data_parsed = pd.to_datetime(data_ref, errors='coerce')
-                if not pd.isna(data_parsed):
-                    anos.append(data_parsed.year)
-                else:
-                    # Fallback: procurar por 4 dígitos no texto
-                    import re
-                    matches = re.findall(r'\b(20\d{2})\b', str(data_ref))
-                    if matches:
-                        anos.append(int(matches[0]))
-            except:
-                continue
-        
-        df['ano_extraido'] = anos[:len(df)]
-        
-        # Agrupar por ano e somar vítimas
-        serie = df.groupby('ano_extraido')['total_vitima'].sum().to_dict()
-        serie = {k: int(v) for k, v in serie.items() if k and not pd.isna(k)}
+        serie = {int(k): int(v) for k, v in serie.items() if k}
         serie_ordenada = dict(sorted(serie.items()))
         
         # Calcular tendência simples
@@ -1,7 +1,14 @@
 from depends import *
 from fastapi import APIRouter
+from respostas import RotaJSON
+from cache_resultados import cache_resultados
+import compressao
+from execucao import estatisticas_pools
+from fastapi.responses import PlainTextResponse
+import metricas
+import utils
 from utils import check_handler, logger
-router = APIRouter()
+router = APIRouter(route_class=RotaJSON)
 
 
 @router.get("/status", summary="Status da API", tags=["Metadados"])
@@ -9,7 +16,7 @@ def status(request: Request):
     """Healthcheck da API com informações de status"""
     try:
         current_handler = check_handler()
-        total_registros = len(current_handler.df) if current_handler and current_handler.df is not None else 0
+        total_registros = current_handler.total_registros if current_handler else 0
         memoria = current_handler.get_memory_usage() if current_handler else {"dataframe_size_mb": 0}
         
         return {
@@ -34,3 +41,55 @@ def status(request: Request):
                 "erro": str(e)
             }
         )
+
+
+@router.get("/status/cache", summary="Relatório do cache de dados", tags=["Metadados"])
+def status_cache(request: Request):
+    """Última carga por arquivo (hit, miss ou rebuild do cache Parquet), cache de resultados e de respostas comprimidas"""
+    try:
+        current_handler = check_handler()
+        return {
+            **current_handler.relatorio_cache(),
+            "resultados": cache_resultados.estatisticas(),
+            "compressao": compressao.estatisticas(),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro em /status/cache: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/status/carga", summary="Relatório da carga dos dados", tags=["Metadados"])
+def status_carga(request: Request):
+    """Tempos por etapa da inicialização e por arquivo (descompressão, parsing, limpeza, Parquet, concat...)"""
+    try:
+        current_handler = check_handler()
+        return current_handler.relatorio_carga()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erro em /status/carga: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/status/recarga", summary="Recarga a quente dos dados", tags=["Metadados"])
+def status_recarga(request: Request):
+    """Verificações da pasta de dados e última troca de versão sem reinício"""
+    monitor = utils.monitor_dados
+    versao = utils.handler.versao_dados if utils.handler is not None else None
+    if monitor is None:
+        return {"ativo": False, "versao_dados": versao}
+    return {**monitor.estado, "versao_dados": versao}
+
+
+@router.get("/status/execucao", summary="Ocupação dos pools de consulta", tags=["Metadados"])
+def status_execucao(request: Request):
+    """Threads, fila, requisições em andamento e recusadas (503) por classe de consulta"""
+    return estatisticas_pools()
+
+
+@router.get("/metrics", summary="Métricas (Prometheus)", tags=["Metadados"], response_class=PlainTextResponse)
+def metrics():
+    """Latência, tamanho de resposta, erros e fases internas por rota, no formato texto do Prometheus"""
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,7 +1,8 @@
 from depends import *
 from fastapi import APIRouter
+from respostas import RotaJSON
 from utils import safe_get_unique_values, logger
-router = APIRouter()
+router = APIRouter(route_class=RotaJSON)
 
 
 @router.get("/ufs", summary="Lista de UFs", tags=["Dimensões"])
@@ -0,0 +1,96 @@
+"""
+Serialização colunar de DataFrames para respostas e exportações JSON.
+
+Nulos, infinitos e tipos numpy são tratados uma vez por coluna, em operações
+vetorizadas, em vez de célula a célula. Colunas categóricas convertem só o
+dicionário e expandem pelos códigos.
+"""
+import json
+
+import numpy as np
+
+from metricas import fase
+
+
+def _categorias_mais_nulo(serie, converter):
+    """Valores convertidos por categoria, com uma posição extra (None) para o código -1"""
+    categorias = [converter(c) for c in serie.cat.categories]
+    return np.array(categorias + [converter(None)], dtype=object)
+
+
+def valores_coluna(serie):
+    """Lista de valores Python nativos da coluna (None para nulos e infinitos)"""
+    import pandas as pd
+
+    dtype = serie.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        tabela = _categorias_mais_nulo(serie, lambda c: None if c is None else _nativo(c))
+        return tabela[serie.cat.codes.to_numpy()].tolist()
+    if pd.api.types.is_float_dtype(dtype):
+        valores = serie.to_numpy(dtype="float64", na_value=np.nan)
+        lista = valores.tolist()
+        for i in np.flatnonzero(~np.isfinite(valores)):
+            lista[i] = None
+        return lista
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        if serie.hasnans:
+            return serie.astype(object).where(serie.notna(), None).tolist()
+        return serie.to_numpy().tolist()
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return [None if pd.isna(v) else v.isoformat() for v in serie]
+    return [_nativo(v) for v in serie.astype(object).where(serie.notna(), None)]
+
+
+def _nativo(valor):
+    """Converte um escalar numpy para o tipo Python equivalente"""
+    if isinstance(valor, np.generic):
+        valor = valor.item()
+    if isinstance(valor, float) and not np.isfinite(valor):
+        return None
+    return valor
+
+
+def registros(df):
+    """Equivalente a to_dict(orient='records') com nulos como None e tipos nativos"""
+    with fase("serializacao"):
+        colunas = [str(c) for c in df.columns]
+        valores = [valores_coluna(df[c]) for c in df.columns]
+        return [dict(zip(colunas, linha)) for linha in zip(*valores)]
+
+
+def _json(valor):
+    return json.dumps(valor, ensure_ascii=False, default=str)
+
+
+def tokens_json(serie):
+    """Array (object) com o texto JSON de cada valor da coluna"""
+    import pandas as pd
+
+    dtype = serie.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        # Cada categoria é codificada uma única vez
+        tabela = _categorias_mais_nulo(serie, lambda c: "null" if c is None else _json(_nativo(c)))
+        return tabela[serie.cat.codes.to_numpy()]
+    if pd.api.types.is_float_dtype(dtype):
+        valores = serie.to_numpy(dtype="float64", na_value=np.nan)
+        tokens = np.array(list(map(repr, valores.tolist())), dtype=object)
+        tokens[~np.isfinite(valores)] = "null"
+        return tokens
+    if pd.api.types.is_bool_dtype(dtype) and not serie.hasnans:
+        return np.where(serie.to_numpy(), "true", "false").astype(object)
+    if pd.api.types.is_integer_dtype(dtype) and not serie.hasnans:
+        return np.array(list(map(str, serie.to_numpy().tolist())), dtype=object)
+    return np.array(["null" if v is None else _json(v) for v in valores_coluna(serie)], dtype=object)
+
+
+def linhas_json(df):
+    """Array (object) com um objeto JSON por linha, montado coluna a coluna"""
+    if len(df.columns) == 0:
+        return np.full(len(df), "{}", dtype=object)
+    with fase("serializacao"):
+        linhas = None
+        for i, col in enumerate(df.columns):
+            chave = ("{" if i == 0 else ",") + _json(str(col)) + ":"
+            parte = chave + tokens_json(df[col])
+            linhas = parte if linhas is None else linhas + parte
+        return linhas + "}"
@@ -0,0 +1,88 @@
+"""
+Snapshot consolidado do dataset já tipado (Arrow IPC sem compressão).
+
+Colunas categóricas são gravadas como seus códigos inteiros, com as categorias
+nos metadados do schema; colunas numéricas como arrays nativos. Na leitura o
+arquivo é mapeado em memória e as colunas viram views dos buffers, sem cópia,
+sem concat e sem nova otimização de dtypes.
+"""
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Incrementar quando o layout do arquivo mudar
+SNAPSHOT_FORMAT = "1"
+
+
+def salvar_tabela(caminho, df, metadados=None, compressao=None):
+    """
+    Grava o DataFrame em Arrow IPC (escrita atômica via arquivo temporário).
+    Com `compressao` ("zstd"/"lz4") o arquivo fica menor, mas a leitura descomprime os buffers.
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    arrays = []
+    categorias = {}
+    for col in df.columns:
+        serie = df[col]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            categorias[col] = [str(c) for c in serie.cat.categories]
+            arrays.append(pa.array(serie.cat.codes.to_numpy()))
+        else:
+            arrays.append(pa.array(serie.to_numpy()))
+
+    schema = pa.schema(
+        [pa.field(str(col), arr.type) for col, arr in zip(df.columns, arrays)],
+        metadata={
+            "sinesp_formato": SNAPSHOT_FORMAT,
+            "sinesp_categorias": json.dumps(categorias, ensure_ascii=False),
+            "sinesp_metadados": json.dumps(metadados or {}, ensure_ascii=False),
+        },
+    )
+
+    temporario = f"{caminho}.tmp"
+    opcoes = pa.ipc.IpcWriteOptions(compression=compressao)
+    with pa.OSFile(temporario, "wb") as sink:
+        with pa.ipc.new_file(sink, schema, options=opcoes) as writer:
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+    os.replace(temporario, caminho)
+
+
+def ler_metadados(caminho):
+    """Metadados gravados com a tabela, sem ler as colunas (None se inválido)"""
+    import pyarrow as pa
+
+    try:
+        with pa.memory_map(caminho, "r") as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    if metadata.get(b"sinesp_formato", b"").decode() != SNAPSHOT_FORMAT:
+        return None
+    return json.loads(metadata[b"sinesp_metadados"])
+
+
+def carregar_tabela(caminho):
+    """Abre a tabela com memory-map; colunas são views somente leitura do arquivo"""
+    import pandas as pd
+    import pyarrow as pa
+
+    tabela = pa.ipc.open_file(pa.memory_map(caminho, "r")).read_all()
+    categorias = json.loads(tabela.schema.metadata[b"sinesp_categorias"])
+
+    colunas = {}
+    for nome in tabela.column_names:
+        coluna = tabela.column(nome)
+        if coluna.num_chunks == 1:
+            valores = coluna.chunk(0).to_numpy(zero_copy_only=True)
+        else:
+            valores = coluna.to_numpy()
+        if nome in categorias:
+            colunas[nome] = pd.Categorical.from_codes(valores, categories=categorias[nome], validate=False)
+        else:
+            colunas[nome] = valores
+
+    return pd.DataFrame(colunas, copy=False)
@@ -0,0 +1,63 @@
+import gzip
+import os
+import sys
+
+import pytest
+
+# Os módulos da API ficam na raiz do repositório (importados como `utils`, `routes.*`, ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CABECALHO = (
+    "uf,municipio,evento,data_referencia,agente,arma,faixa_etaria,feminino,masculino,"
+    "nao_informado,total_vitima,total,total_peso,abrangencia,formulario"
+)
+
+# Base mínima: duas UFs com dados nos dois anos, uma só em 2024, agentes/armas ausentes e repetidos
+LINHAS = {
+    "2023": [
+        "SP,São Paulo,Homicídio doloso,2023-01-01,Civil,Arma de fogo,Adulto,1,3,0,4,4,,Municipal,Formulário 1",
+        "SP,São Paulo,Homicídio doloso,2023-01-01,Civil,Arma de fogo,Adulto,0,1,0,1,1,,Municipal,Formulário 1",
+        "SP,Campinas,Homicídio doloso,2023-02-01,Civil,Arma branca,Jovem,0,2,0,2,2,,Municipal,Formulário 1",
+        "SP,Campinas,Tentativa de homicídio,2023-03-01,,,Jovem,1,1,1,3,3,,Municipal,Formulário 1",
+        "RJ,Niterói,Feminicídio,2023-03-01,Civil,Arma de fogo,Adulto,2,0,0,2,2,,Municipal,Formulário 1",
+        "RJ,Rio de Janeiro,Homicídio doloso,2023-07-01,Policial,Arma de fogo,Adulto,0,4,0,4,4,,Municipal,Formulário 1",
+        "MG,NÃO INFORMADO,Apreensão de Cocaína,2023-04-01,,,,,,,,,19.89,Estadual,Formulário 5",
+    ],
+    "2024": [
+        "RJ,Rio de Janeiro,Homicídio doloso,2024-01-01,Policial,Arma de fogo,Adulto,0,5,1,6,6,,Municipal,Formulário 1",
+        "RJ,Niterói,Tentativa de homicídio,2024-02-01,Civil,Arma branca,Jovem,1,0,0,1,1,,Municipal,Formulário 1",
+        "SP,São Paulo,Feminicídio,2024-05-01,Civil,Arma branca,Idoso,1,0,0,1,1,,Municipal,Formulário 1",
+        "SP,Santos,Homicídio doloso,2024-06-01,Policial,Arma de fogo,Adulto,0,2,0,2,2,,Municipal,Formulário 1",
+        "BA,Salvador,Homicídio doloso,2024-06-01,Civil,Arma de fogo,Jovem,0,7,0,7,7,,Municipal,Formulário 1",
+        "BA,Salvador,Feminicídio,2024-08-01,Civil,Outros,Adulto,3,0,0,3,3,,Municipal,Formulário 1",
+    ],
+}
+
+
+@pytest.fixture(scope="session")
+def pasta_dados(tmp_path_factory):
+    """Pasta de trabalho com a base de teste em dados/ (DATA_FOLDER e CACHE_FOLDER são relativos)"""
+    pasta = tmp_path_factory.mktemp("sinesp")
+    (pasta / "dados").mkdir()
+    for ano, linhas in LINHAS.items():
+        with gzip.open(pasta / "dados" / f"BancoVDE {ano}.csv.gz", "wt", encoding="utf-8") as f:
+            f.write("\n".join([CABECALHO, *linhas]) + "\n")
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(pasta)
+        mp.setenv("SINESP_INGEST_WORKERS", "1")
+        mp.delenv("SINESP_ARMAZENAMENTO", raising=False)
+        yield pasta
+
+
+@pytest.fixture
+def handler_dados(pasta_dados):
+    """Handler da base de teste colocado em uso pelas rotas"""
+    import data_handler
+    import utils
+    from cache_resultados import cache_resultados
+
+    handler = data_handler.SinespDataHandler()
+    utils.trocar_handler(handler)
+    cache_resultados.limpar()
+    return handler
@@ -0,0 +1,120 @@
+"""
+Paridade entre os backends de agregação (agregacao.py).
+
+As rotas de resumo, estatística, ranking e série são chamadas uma vez com
+SINESP_BACKEND_AGREGACAO=pandas e outra com duckdb, sobre uma base pequena
+gerada no teste, nos dois modos de armazenamento (no particionado, os filtros
+por município das séries somam as partições Parquet); o JSON das duas
+execuções deve ser idêntico (byte a byte, incluindo a ordem das chaves).
+"""
+import json
+
+import pytest
+
+CONSULTAS = [
+    "/resumo/vitimas",
+    "/resumo/vitimas?uf=SP",
+    "/resumo/vitimas?ano=2024&evento=homicidio",
+    "/resumo/faixa-etaria",
+    "/resumo/faixa-etaria?uf=RJ&ano=2023",
+    "/resumo/armas",
+    "/resumo/armas?uf=SP",
+    "/resumo/armas?ano=2024",
+    "/resumo/armas?uf=BA&ano=2023",
+    "/resumo/agentes",
+    "/resumo/agentes?uf=RJ",
+    "/resumo/agentes?ano=2023",
+    "/estatisticas/resumo",
+    "/estatisticas/por-uf?uf=SP",
+    "/estatisticas/por-uf?uf=MG",
+    "/estatisticas/por-ano?ano=2023",
+    "/estatisticas/por-ano?ano=2024",
+    "/estatisticas/por-ano?ano=2019",
+    "/ranking/ufs-violencia",
+    "/ranking/ufs-violencia?limit=2",
+    "/series/ocorrencias",
+    "/series/ocorrencias?uf=SP",
+    "/series/ocorrencias?municipio=niteroi",
+    "/series/ocorrencias?municipio=sao paulo",
+    "/series/ocorrencias?uf=RJ&municipio=rio",
+    "/series/ocorrencias?municipio=salvador&evento=feminicidio",
+    "/series/ocorrencias?municipio=inexistente",
+    "/series/ocorrencias?evento=feminicidio",
+]
+
+
+def _respostas(backend, armazenamento):
+    """{consulta: (status, corpo JSON)} com um handler novo usando o backend e o armazenamento pedidos"""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    import agregacao
+    import data_handler
+    import particoes
+    import utils
+    from cache_resultados import cache_resultados
+    from respostas import RespostaJSON
+    from routes import estatisticas, rankings, resumos, series
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("SINESP_BACKEND_AGREGACAO", backend)
+        mp.setattr(agregacao, "BACKEND_AGREGACAO", backend)
+        mp.setattr(agregacao, "_backend", None)
+        mp.setattr(data_handler, "INGEST_WORKERS", 1)
+        mp.setattr(particoes, "ARMAZENAMENTO", armazenamento)
+
+        handler = data_handler.SinespDataHandler()
+        assert handler.agregacao.nome == backend
+        assert (handler.particoes is not None) == (armazenamento == "particionado")
+        utils.trocar_handler(handler)
+        # Mesma versão dos dados nos dois backends: o cache de resultados não pode responder
+        cache_resultados.limpar()
+
+        app = FastAPI(default_response_class=RespostaJSON)
+        for modulo in (resumos, estatisticas, rankings, series):
+            app.include_router(modulo.router)
+        cliente = TestClient(app)
+        try:
+            return {consulta: _consultar(cliente, consulta) for consulta in CONSULTAS}
+        finally:
+            cache_resultados.limpar()
+
+
+def _consultar(cliente, consulta):
+    resposta = cliente.get(consulta)
+    return resposta.status_code, resposta.text
+
+
+@pytest.fixture(scope="module", params=["memoria", "particionado"])
+def armazenamento(pasta_dados, request):
+    return request.param
+
+
+@pytest.fixture(scope="module")
+def respostas_pandas(armazenamento):
+    return _respostas("pandas", armazenamento)
+
+
+@pytest.fixture(scope="module")
+def respostas_duckdb(armazenamento):
+    pytest.importorskip("duckdb")
+    return _respostas("duckdb", armazenamento)
+
+
+@pytest.mark.parametrize("consulta", CONSULTAS)
+def test_pandas_responde(respostas_pandas, consulta):
+    status, corpo = respostas_pandas[consulta]
+    assert status == 200, corpo
+    assert json.loads(corpo)["status"] in ("sucesso", "nenhum_resultado")
+
+
+def test_pandas_resumo_armas(respostas_pandas):
+    estatisticas = json.loads(respostas_pandas["/resumo/armas"][1])["estatisticas"]
+    assert list(estatisticas)[:2] == ["Arma de fogo", "Arma branca"]
+    assert estatisticas["Outros"]["total_vitimas"] == 3
+    assert estatisticas["Arma de fogo"] == {"total_vitimas": 26, "ufs_afetadas": 3, "municipios_afetados": 5}
+
+
+@pytest.mark.parametrize("consulta", CONSULTAS)
+def test_duckdb_igual_ao_pandas(respostas_pandas, respostas_duckdb, consulta):
+    assert respostas_duckdb[consulta] == respostas_pandas[consulta]
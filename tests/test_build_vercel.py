@@ -0,0 +1,30 @@
+"""Artefato da Vercel (build_vercel.py): versionado em artefato/ e conferido contra dados/"""
+import gzip
+import os
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_artefato_commitado_corresponde_aos_dados(monkeypatch):
+    from data_handler import verificar_artefato
+
+    monkeypatch.chdir(RAIZ)
+    assert verificar_artefato() is None
+
+
+def test_artefato_ausente_ou_desatualizado(handler_dados, tmp_path):
+    from conftest import CABECALHO
+    from data_handler import verificar_artefato
+
+    pasta = str(tmp_path / "artefato")
+    assert verificar_artefato(pasta).startswith("artefato incompleto")
+
+    handler_dados.save_artifact(pasta)
+    assert verificar_artefato(pasta) is None
+
+    with gzip.open("dados/BancoVDE 2025.csv.gz", "wt", encoding="utf-8") as f:
+        f.write(CABECALHO + "\nSP,Santos,Feminicídio,2025-01-01,Civil,Outros,Adulto,1,0,0,1,1,,Municipal,Formulário 1\n")
+    try:
+        assert verificar_artefato(pasta).startswith("artefato desatualizado")
+    finally:
+        os.remove("dados/BancoVDE 2025.csv.gz")
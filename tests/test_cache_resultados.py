@@ -0,0 +1,28 @@
+"""Chaves do cache de resultados (utils.resultado_em_cache)"""
+
+
+def _cliente():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from respostas import RespostaJSON
+    from routes import series
+
+    app = FastAPI(default_response_class=RespostaJSON)
+    app.include_router(series.router)
+    return TestClient(app)
+
+
+def test_filtros_sem_acento_ou_caixa_compartilham_a_entrada(handler_dados):
+    from cache_resultados import cache_resultados
+
+    cliente = _cliente()
+    primeira = cliente.get("/series/ocorrencias?uf=SP&municipio=São Paulo")
+    hits = cache_resultados.contadores["hits"]
+
+    for consulta in ("uf=sp&municipio=sao paulo", "uf=Sp&municipio=SÃO PAULO"):
+        resposta = cliente.get(f"/series/ocorrencias?{consulta}")
+        assert resposta.json()["serie_temporal"] == primeira.json()["serie_temporal"]
+
+    assert cache_resultados.contadores["hits"] == hits + 2
+    assert len(cache_resultados) == 1
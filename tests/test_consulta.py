@@ -0,0 +1,44 @@
+"""Registros brutos entregues pelas rotas (consulta.MotorConsultas.linhas)"""
+import pytest
+
+COLUNAS_PUBLICAS = [
+    "uf", "municipio", "evento", "data_referencia", "agente", "arma", "faixa_etaria",
+    "feminino", "masculino", "nao_informado", "total_vitima", "total", "total_peso",
+    "abrangencia", "formulario", "arquivo_origem",
+]
+
+
+@pytest.fixture(params=["memoria", "particionado"])
+def cliente(pasta_dados, monkeypatch, request):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    import data_handler
+    import particoes
+    import utils
+    from cache_resultados import cache_resultados
+    from respostas import RespostaJSON
+    from routes import downloads, ocorrencias
+
+    monkeypatch.setattr(particoes, "ARMAZENAMENTO", request.param)
+    utils.trocar_handler(data_handler.SinespDataHandler())
+    cache_resultados.limpar()
+
+    app = FastAPI(default_response_class=RespostaJSON)
+    app.include_router(ocorrencias.router)
+    app.include_router(downloads.router)
+    return TestClient(app)
+
+
+def test_ocorrencias_sem_colunas_derivadas(cliente):
+    ocorrencias = cliente.get("/ocorrencias?ano=2024").json()["ocorrencias"]
+    assert len(ocorrencias) == 6
+    assert all(list(registro) == COLUNAS_PUBLICAS for registro in ocorrencias)
+
+
+def test_exportacoes_sem_colunas_derivadas(cliente):
+    csv = cliente.get("/download/csv?uf=SP").text
+    assert csv.splitlines()[0].split(",") == COLUNAS_PUBLICAS
+
+    ndjson = cliente.get("/download/json?uf=SP&formato=ndjson").text
+    assert all('"ano"' not in linha and '"mes"' not in linha for linha in ndjson.splitlines())
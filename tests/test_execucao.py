@@ -0,0 +1,77 @@
+"""
+Admissão nos pools de consultas pesadas (execucao.py).
+
+As exportações em streaming mantêm a vaga do pool até o último bloco ser
+enviado; as requisições ASGI são feitas à mão para observar o pool no meio
+do envio do corpo.
+"""
+import asyncio
+
+import pytest
+
+
+def _app():
+    from fastapi import FastAPI
+
+    from respostas import RespostaJSON
+    from routes import downloads
+
+    app = FastAPI(default_response_class=RespostaJSON)
+    app.include_router(downloads.router)
+    return app
+
+
+async def _requisitar(app, caminho, query="", ao_receber_bloco=None):
+    """Status e corpo de um GET; `ao_receber_bloco` é aguardada a cada bloco do corpo"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": caminho, "raw_path": caminho.encode(), "root_path": "",
+        "query_string": query.encode(), "headers": [], "client": ("teste", 1), "server": ("teste", 80),
+    }
+    desconexao = asyncio.Event()
+    resposta = {"status": None, "corpo": b""}
+
+    async def receive():
+        # Cliente nunca desconecta
+        await desconexao.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(mensagem):
+        if mensagem["type"] == "http.response.start":
+            resposta["status"] = mensagem["status"]
+        elif mensagem["type"] == "http.response.body":
+            resposta["corpo"] += mensagem.get("body", b"")
+            if ao_receber_bloco is not None and mensagem.get("more_body"):
+                await ao_receber_bloco()
+
+    await app(scope, receive, send)
+    return resposta
+
+
+@pytest.mark.parametrize("caminho", ["/download/csv", "/download/json"])
+def test_exportacao_mantem_vaga_ate_o_fim_do_corpo(handler_dados, monkeypatch, caminho):
+    from execucao import POOLS
+    from routes import downloads
+
+    pool = POOLS["exportacao"]
+    monkeypatch.setattr(pool, "workers", 1)
+    monkeypatch.setattr(pool, "fila", 0)
+    monkeypatch.setattr(downloads, "TAMANHO_BLOCO", 2)
+    rejeitadas = pool.contadores["rejeitadas"]
+    app = _app()
+    durante = []
+
+    async def concorrente():
+        if not durante:
+            segunda = await _requisitar(app, caminho)
+            durante.append((pool.ocupados, segunda["status"]))
+
+    async def cenario():
+        return await _requisitar(app, caminho, ao_receber_bloco=concorrente)
+
+    primeira = asyncio.run(cenario())
+
+    assert primeira["status"] == 200
+    assert durante == [(1, 503)]
+    assert pool.contadores["rejeitadas"] == rejeitadas + 1
+    assert pool.ocupados == 0
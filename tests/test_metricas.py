@@ -0,0 +1,60 @@
+"""
+Rótulo de rota das métricas (metricas.py) para respostas dadas antes do roteador:
+304 do MiddlewareETag e respostas pré-comprimidas do MiddlewareCompressao.
+"""
+
+
+def _cliente():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from cache_http import MiddlewareETag
+    from cache_resultados import CacheResultados
+    from compressao import MiddlewareCompressao
+    from metricas import MiddlewareMetricas
+    from respostas import RespostaJSON
+    from routes import municipios
+
+    app = FastAPI(default_response_class=RespostaJSON)
+    app.add_middleware(MiddlewareETag)
+    app.add_middleware(MiddlewareCompressao, minimo=0, cache=CacheResultados(ttl=0))
+    app.add_middleware(MiddlewareMetricas)
+    app.include_router(municipios.router)
+    return TestClient(app)
+
+
+def _contagem(status):
+    from metricas import REQUISICOES
+
+    return {
+        rota: valor
+        for (rota, metodo, codigo), valor in REQUISICOES._valores.items()
+        if metodo == "GET" and codigo == status
+    }
+
+
+def _diferenca(antes, depois):
+    return {rota: depois[rota] - antes.get(rota, 0) for rota in depois if depois[rota] != antes.get(rota, 0)}
+
+
+def test_304_do_etag_tem_rota(handler_dados):
+    cliente = _cliente()
+    etag = cliente.get("/municipios?uf=SP", headers={"Accept-Encoding": "identity"}).headers["etag"]
+
+    antes = _contagem("304")
+    resposta = cliente.get("/municipios?uf=SP", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+
+    assert resposta.status_code == 304
+    assert _diferenca(antes, _contagem("304")) == {"/municipios": 1}
+
+
+def test_resposta_pre_comprimida_tem_rota(handler_dados):
+    cliente = _cliente()
+    primeira = cliente.get("/municipios", headers={"Accept-Encoding": "gzip"})
+    assert primeira.headers["content-encoding"] == "gzip"
+
+    antes = _contagem("200")
+    segunda = cliente.get("/municipios", headers={"Accept-Encoding": "gzip"})
+
+    assert segunda.content == primeira.content
+    assert _diferenca(antes, _contagem("200")) == {"/municipios": 1}
@@ -1,5 +1,6 @@
 import os
 import sys
+import functools
 from pathlib import Path
 from fastapi import HTTPException
 import logging
@@ -13,6 +14,12 @@ IS_VERCEL = os.environ.get('VERCEL') == '1' or os.environ.get('NOW_REGION') is n
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+from cache_resultados import cache_resultados
+from perfis import perfilando
+from cubo import DIMENSOES_CUBO
+from consulta import SEMANTICA_FILTROS
+from indice import normalizar_texto
+
 # Importar o handler de dados
 try:
     from data_handler import SinespDataHandler
@@ -55,6 +62,32 @@ if not IS_VERCEL:
         logger.error(f"Erro na inicialização: {e}")
         handler = None
 
+def trocar_handler(novo):
+    """Coloca um novo handler em uso; requisições em andamento seguem com o anterior"""
+    global handler, _global_handler
+    _global_handler = novo
+    handler = novo
+    cache_resultados.trocar_versao(novo.versao_dados)
+
+# Monitor da pasta de dados (recarga a quente), iniciado no startup da API
+monitor_dados = None
+
+def iniciar_recarga():
+    """Inicia a verificação periódica das fontes (fora da Vercel)"""
+    global monitor_dados
+    if IS_VERCEL or monitor_dados is not None:
+        return monitor_dados
+    import data_handler
+    from recarga import MonitorDados
+    monitor_dados = MonitorDados(
+        data_handler.DATA_FOLDER,
+        construir=lambda: SinespDataHandler(recarga=True),
+        atual=lambda: handler,
+        trocar=trocar_handler,
+    )
+    monitor_dados.iniciar()
+    return monitor_dados
+
 def check_handler():
     """Verifica se o handler está disponível"""
     global handler
@@ -73,26 +106,85 @@ def check_handler():
         logger.error(f"Erro em check_handler: {e}")
         raise HTTPException(status_code=503, detail="Sistema de dados não disponível.")
 
+def _valor_da_chave(nome, valor):
+    """Valor do parâmetro na chave do cache; filtros de texto sem acento/caixa, como o motor de consultas"""
+    if isinstance(valor, list):
+        return tuple(_valor_da_chave(nome, v) for v in valor)
+    if isinstance(valor, str) and nome in SEMANTICA_FILTROS:
+        return normalizar_texto(valor)
+    return valor
+
+def resultado_em_cache(func):
+    """
+    Guarda o retorno da rota no cache de resultados (endpoint + parâmetros + versão dos dados).
+    Filtros que diferem só em acento ou caixa (uf=sp e uf=SP) compartilham a entrada.
+    O wrapper expõe `buscar_em_cache(kwargs)` e `calcular_e_guardar(*args, **kwargs)`, para que
+    consulta_pesada responda os acertos antes de ocupar uma vaga do pool.
+    """
+    def chave(kwargs):
+        parametros = tuple(sorted(
+            (nome, _valor_da_chave(nome, valor))
+            for nome, valor in kwargs.items()
+            if nome != "request" and valor is not None
+        ))
+        return (func.__module__, func.__name__, parametros)
+
+    def calcular_e_guardar(*args, **kwargs):
+        current_handler = check_handler()
+        resultado = func(*args, **kwargs)
+        # Respostas prontas (ex.: JSONResponse de erro) não são guardadas
+        if isinstance(resultado, (dict, list)):
+            cache_resultados.guardar(current_handler.versao_dados, chave(kwargs), resultado)
+        return resultado
+
+    def buscar_em_cache(kwargs):
+        """(encontrado, resultado) sem calcular; não carrega o handler se ele ainda não existe"""
+        current_handler = handler if handler is not None else _global_handler
+        if current_handler is None or perfilando():
+            return False, None
+        return cache_resultados.obter(current_handler.versao_dados, chave(kwargs))
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # Requisição perfilada mede o cálculo, não a leitura do cache
+        if perfilando():
+            return func(*args, **kwargs)
+        current_handler = check_handler()
+        encontrado, resultado = cache_resultados.obter(current_handler.versao_dados, chave(kwargs))
+        if encontrado:
+            return resultado
+        return calcular_e_guardar(*args, **kwargs)
+
+    wrapper.buscar_em_cache = buscar_em_cache
+    wrapper.calcular_e_guardar = calcular_e_guardar
+    return wrapper
+
 def safe_get_unique_values(column_name: str, sort_values: bool = True):
     """Função auxiliar para obter valores únicos de uma coluna com segurança"""
     try:
         current_handler = check_handler()
-        df = current_handler.df
 
-        if column_name not in df.columns:
-            return []
+        # Dimensões do cubo respondem sem carregar o frame completo
+        unique_values = current_handler.get_categorias(column_name)
+        if unique_values is None:
+            df = current_handler.df
 
-        # Obter valores únicos removendo NaN e valores vazios
-        series = df[column_name].dropna()
+            if column_name not in df.columns:
+                return []
+
+            # Obter valores únicos removendo NaN e valores vazios
+            series = df[column_name].dropna()
+            if len(series) == 0:
+                return []
 
-        # Converter para string e limpar
-        if len(series) > 0:
             # Para colunas categóricas, converter para string
             if series.dtype.name == 'category':
                 unique_values = series.cat.categories.tolist()
             else:
                 unique_values = series.astype(str).unique()
 
+        # Converter para string e limpar
+        if len(unique_values) > 0:
             # Filtrar valores vazios/inválidos
             unique_values = [
                 v for v in unique_values
@@ -113,13 +205,21 @@ def safe_numeric_operation(column_name, operation="sum", default_value=0):
     """Operação numérica segura em uma coluna"""
     try:
         current_handler = check_handler()
-        df = current_handler.df
 
-        if column_name not in df.columns:
+        if column_name not in current_handler.colunas:
             logger.warning(f"Coluna '{column_name}' não encontrada")
             return default_value
 
-        series = df[column_name]
+        # Somas das medidas e distintos das dimensões saem do cubo, sem ler o frame completo
+        celulas, presenca = current_handler.cubo.celulas, current_handler.cubo.municipios
+        if operation == "sum" and column_name in celulas.columns and column_name not in DIMENSOES_CUBO:
+            series = celulas[column_name]
+        elif operation == "nunique" and column_name in presenca.columns:
+            series = presenca[column_name]
+        elif operation == "nunique" and column_name in celulas.columns:
+            series = celulas[column_name]
+        else:
+            series = current_handler.df[column_name]
 
         if series is None or len(series) == 0:
             return default_value